@@ -0,0 +1,173 @@
+"""
+End-to-end benchmark of a scheduler run: fetch every due doctor from a local
+mojtermin stand-in, diff and reconcile the slots, queue the notifications and
+drain the outbox into a local SMTP sink.
+
+Run 0 is a cold start (every slot is new). Each following run bumps the fake
+upstream's version so `--churn` of every doctor's terms change.
+
+Run from the backend directory:
+    python -m benchmarks.bench_pipeline --doctors 500 --subscribers 5 --latency 0.05
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+import numpy as np
+from benchmarks.fake_mojtermin import FakeMojTerminProcess
+from benchmarks.smtp_sink import SMTPSink
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--doctors", type=int, default=200)
+    parser.add_argument("--subscribers", type=int, default=5, help="subscribers per doctor")
+    parser.add_argument("--users", type=int, default=0, help="distinct users (default: 10 x subscribers)")
+    parser.add_argument("--slots", type=int, default=200, help="terms per doctor payload")
+    parser.add_argument("--available", type=float, default=0.3, help="share of terms that start out available")
+    parser.add_argument("--churn", type=float, default=0.02, help="share of terms flipped between runs")
+    parser.add_argument("--latency", type=float, default=0.05, help="upstream latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random upstream latency in seconds")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=3, help="runs after the cold start")
+    parser.add_argument("--tracemalloc", action="store_true", help="report peak Python allocations (slower)")
+    parser.add_argument("--json", help="also write the results to this file")
+    return parser.parse_args(argv)
+
+
+def percentile(values: list[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    upstream = FakeMojTerminProcess(args.doctors, slots=args.slots, available_ratio=args.available, churn=args.churn,
+                                    latency=args.latency, jitter=args.jitter).start()
+    sink = SMTPSink().start()
+    workdir = tempfile.mkdtemp(prefix="mojtermin-bench-")
+
+    # the app reads these at import time
+    os.environ["MOJTERMIN_RESOURCES_URL"] = upstream.base_url
+    os.environ["MOJTERMIN_FETCH_CONCURRENCY"] = str(args.concurrency)
+    os.environ["MOJTERMIN_UPSTREAM_RATE"] = "1000000"
+    os.environ["MOJTERMIN_UPSTREAM_BURST"] = "1000000"
+
+    from sqlalchemy import create_engine, update
+    from sqlalchemy.orm import sessionmaker
+    from model.models import Base, Doctor, User, DoctorSubscription, DoctorPollState
+    from scheduler import scheduler
+    from scheduler.leader import LeaderLease
+    from scheduler.poll_queue import PollQueue
+    from services import checker_service, fetcher_service, email_service
+    from services.smtp_pool import SMTPPool
+
+    engine = create_engine(f"sqlite:///{workdir}/bench.db")
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+    scheduler.SessionLocal = SessionLocal
+    scheduler.smtp_pool = SMTPPool("127.0.0.1", sink.port, size=email_service.SMTP_POOL_SIZE)
+    scheduler.leader = LeaderLease("scheduler", 24 * 3600, session_factory=SessionLocal)
+    scheduler.leader.renew()
+
+    fetch_latencies: list[float] = []
+    apply_latencies: list[float] = []
+    fetch_slots, apply_fetch_result = fetcher_service.fetch_slots, checker_service.apply_fetch_result
+
+    async def timed_fetch(*fetch_args, **fetch_kwargs):
+        result = await fetch_slots(*fetch_args, **fetch_kwargs)
+        if not result.skipped:
+            fetch_latencies.append(result.elapsed)
+        return result
+
+    def timed_apply(*apply_args, **apply_kwargs):
+        started = time.perf_counter()
+        try:
+            return apply_fetch_result(*apply_args, **apply_kwargs)
+        finally:
+            apply_latencies.append(time.perf_counter() - started)
+
+    fetcher_service.fetch_slots = timed_fetch
+    checker_service.apply_fetch_result = timed_apply
+
+    users = args.users or args.subscribers * 10
+    db = SessionLocal()
+    db.add_all(Doctor(id=i, full_name=f"doctor {i}") for i in range(1, args.doctors + 1))
+    db.add_all(User(id=i, email=f"user{i}@example.com", username=f"user{i}", password="x")
+               for i in range(1, users + 1))
+    db.add_all(DoctorSubscription(user_id=(doctor_id * args.subscribers + k) % users + 1, doctor_id=doctor_id)
+               for doctor_id in range(1, args.doctors + 1) for k in range(args.subscribers))
+    db.commit()
+    db.close()
+
+    print(f"{args.doctors} doctors x {args.subscribers} subscribers ({users} users), {args.slots} terms each, "
+          f"{args.latency * 1000:.0f}ms upstream latency, churn {args.churn:.0%}, concurrency {args.concurrency}")
+    print(f"{'run':>5} {'check s':>8} {'doctors/s':>10} {'fetch p50':>10} {'fetch p99':>10} {'apply p50':>10} "
+          f"{'apply p99':>10} {'outbox s':>9} {'emails':>7} {'peak RSS':>9}" + ("  py peak" if args.tracemalloc else ""))
+
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    results = []
+    try:
+        for run in range(args.runs + 1):
+            if run:
+                upstream.bump_version()
+            # make every doctor due again
+            scheduler.poll_queue = PollQueue()
+            with SessionLocal() as session:
+                session.execute(update(DoctorPollState).values(next_poll_at=datetime.now() - timedelta(seconds=1)))
+                session.commit()
+            fetch_latencies.clear()
+            apply_latencies.clear()
+            emails_before = sink.handler.messages
+            if args.tracemalloc:
+                tracemalloc.reset_peak()
+
+            started = time.perf_counter()
+            scheduler.job()
+            check_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            scheduler.send_outbox_job()
+            outbox_seconds = time.perf_counter() - started
+
+            result = {
+                "run": "cold" if run == 0 else run,
+                "check_seconds": check_seconds,
+                "doctors_per_second": args.doctors / check_seconds,
+                "fetch_p50": percentile(fetch_latencies, 50),
+                "fetch_p99": percentile(fetch_latencies, 99),
+                "apply_p50": percentile(apply_latencies, 50),
+                "apply_p99": percentile(apply_latencies, 99),
+                "outbox_seconds": outbox_seconds,
+                "emails": sink.handler.messages - emails_before,
+                "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            }
+            if args.tracemalloc:
+                result["python_peak_mb"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            results.append(result)
+
+            print(f"{result['run']:>5} {check_seconds:>8.2f} {result['doctors_per_second']:>10.1f} "
+                  f"{result['fetch_p50'] * 1000:>8.1f}ms {result['fetch_p99'] * 1000:>8.1f}ms "
+                  f"{result['apply_p50'] * 1000:>8.2f}ms {result['apply_p99'] * 1000:>8.2f}ms "
+                  f"{outbox_seconds:>9.2f} {result['emails']:>7} {result['peak_rss_mb']:>7.0f}MB"
+                  + (f" {result['python_peak_mb']:>6.1f}MB" if args.tracemalloc else ""))
+    finally:
+        scheduler.loop_runner.run(scheduler.smtp_pool.close())
+        scheduler.loop_runner.stop()
+        upstream.stop()
+        sink.stop()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "runs": results}, f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
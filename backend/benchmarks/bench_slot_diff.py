@@ -0,0 +1,60 @@
+"""
+Compares the set-of-datetime slot diff the checker used to do with the sorted
+epoch-minute array diff in services.slot_arrays.
+
+Run from the backend directory:
+    python -m benchmarks.bench_slot_diff
+"""
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta
+from services import slot_arrays
+
+START = datetime(2030, 1, 1, 8, 0)
+SIZES = (100, 1_000, 10_000, 50_000)
+CHURN = 0.05
+
+
+def make_calendars(size: int) -> tuple[set[datetime], set[datetime]]:
+    rng = random.Random(size)
+    old = {START + timedelta(minutes=15 * i) for i in range(size)}
+    changed = set(rng.sample(sorted(old), int(size * CHURN)))
+    new = (old - changed) | {slot + timedelta(minutes=5) for slot in changed}
+    return old, new
+
+
+def set_diff(old: set[datetime], new: set[datetime], now: datetime):
+    new = {slot for slot in new if slot >= now}
+    return new - old, old - new
+
+
+def array_diff(old, new, now_minute: int):
+    return slot_arrays.diff_sorted(old, slot_arrays.upcoming(new, now_minute))
+
+
+def set_bytes(slots: set[datetime]) -> int:
+    return sys.getsizeof(slots) + sum(sys.getsizeof(slot) for slot in slots)
+
+
+def run(number: int = 20):
+    print(f"{'slots':>8} {'set diff':>12} {'array diff':>12} {'speedup':>8} {'set mem':>10} {'array mem':>10}")
+    for size in SIZES:
+        old, new = make_calendars(size)
+        old_array, new_array = slot_arrays.to_array(old), slot_arrays.to_array(new)
+        now, now_minute = START, slot_arrays.to_minute(START)
+
+        added, removed = set_diff(old, new, now)
+        array_added, array_removed = array_diff(old_array, new_array, now_minute)
+        assert slot_arrays.to_datetimes(array_added) == sorted(added)
+        assert slot_arrays.to_datetimes(array_removed) == sorted(removed)
+
+        set_time = min(timeit.repeat(lambda: set_diff(old, new, now), number=number, repeat=3)) / number
+        array_time = min(timeit.repeat(lambda: array_diff(old_array, new_array, now_minute),
+                                       number=number, repeat=3)) / number
+        print(f"{size:>8} {set_time * 1e6:>10.1f}us {array_time * 1e6:>10.1f}us {set_time / array_time:>7.1f}x "
+              f"{set_bytes(old) / 1024:>8.1f}KB {old_array.nbytes / 1024:>8.1f}KB")
+
+
+if __name__ == "__main__":
+    run()
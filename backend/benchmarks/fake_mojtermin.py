@@ -0,0 +1,176 @@
+"""
+A local stand-in for the mojtermin.mk slots_availability API with configurable
+latency, payload size and churn, for benchmarks and load tests.
+"""
+import hashlib
+import json
+import multiprocessing
+import random
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+START = datetime(2030, 1, 7, 8, 0)
+SLOT_MINUTES = 20
+SLOTS_PER_DAY = 24
+
+
+class FakeMojTermin(ThreadingHTTPServer):
+    """
+    Serves /resources/{doctor_id}/slots_availability for doctors 1..doctors.
+    Every doctor has `slots` terms spread over consecutive working days, and
+    `available_ratio` of them start out available. Bumping `version` flips
+    `churn` of each doctor's terms, so the next poll sees that many changes.
+    """
+    daemon_threads = True
+    # the default backlog of 5 drops concurrent connects, which then stall for a 1s SYN retry
+    request_queue_size = 256
+
+    def __init__(self, doctors: int, slots: int = 200, available_ratio: float = 0.3, churn: float = 0.02,
+                 latency: float = 0.05, jitter: float = 0.0, send_etag: bool = True, port: int = 0,
+                 shared_version=None):
+        super().__init__(("127.0.0.1", port), FakeMojTerminHandler)
+        self.doctors = doctors
+        self.slots = slots
+        self.available_ratio = available_ratio
+        self.churn = churn
+        self.latency = latency
+        self.jitter = jitter
+        self.send_etag = send_etag
+        self.shared_version = shared_version or multiprocessing.Value("i", 0)
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._payloads: dict[tuple[int, int], tuple[bytes, str]] = {}
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/resources"
+
+    def start(self) -> "FakeMojTermin":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    @property
+    def version(self) -> int:
+        return self.shared_version.value
+
+    def bump_version(self):
+        with self.shared_version.get_lock():
+            self.shared_version.value += 1
+
+    def payload(self, doctor_id: int) -> tuple[bytes, str]:
+        version = self.version
+        with self._lock:
+            if any(key[1] != version for key in self._payloads):
+                self._payloads = {key: value for key, value in self._payloads.items() if key[1] == version}
+            key = (doctor_id, version)
+            cached = self._payloads.get(key)
+        if cached is None:
+            body = json.dumps(self.build_payload(doctor_id, key[1])).encode()
+            cached = body, f'"{hashlib.sha1(body).hexdigest()}"'
+            with self._lock:
+                self._payloads[key] = cached
+        return cached
+
+    def build_payload(self, doctor_id: int, version: int) -> dict:
+        rng = random.Random(doctor_id)
+        available = [rng.random() < self.available_ratio for _ in range(self.slots)]
+        for v in range(1, version + 1):
+            flips = random.Random(doctor_id * 1_000_003 + v).sample(range(self.slots), int(self.slots * self.churn))
+            for i in flips:
+                available[i] = not available[i]
+
+        timeslots: dict[str, list] = {}
+        for i, is_available in enumerate(available):
+            term = START + timedelta(days=i // SLOTS_PER_DAY, minutes=SLOT_MINUTES * (i % SLOTS_PER_DAY))
+            timeslots.setdefault(term.strftime("%Y-%m-01"), []).append(
+                {"term": term.isoformat(), "isAvailable": is_available, "timeslotType": 2}
+            )
+        return {"name": f"doctor {doctor_id}", "timeslots": timeslots}
+
+
+class FakeMojTerminProcess:
+    """
+    Runs FakeMojTermin in a child process, so its request handling doesn't
+    compete with the code under test for the GIL.
+    """
+
+    def __init__(self, doctors: int, **options):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        self.shared_version = multiprocessing.Value("i", 0)
+        self._process = multiprocessing.Process(target=serve, args=(doctors, self.port, self.shared_version, options),
+                                                daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/resources"
+
+    def start(self, timeout: float = 10) -> "FakeMojTerminProcess":
+        self._process.start()
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", self.port), timeout=1).close()
+                return self
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+
+    def bump_version(self):
+        with self.shared_version.get_lock():
+            self.shared_version.value += 1
+
+    def stop(self):
+        self._process.terminate()
+        self._process.join()
+
+
+def serve(doctors: int, port: int, shared_version, options: dict):
+    FakeMojTermin(doctors, port=port, shared_version=shared_version, **options).serve_forever()
+
+
+class FakeMojTerminHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server: FakeMojTermin = self.server
+        with server._lock:
+            server.requests += 1
+        if server.latency or server.jitter:
+            time.sleep(server.latency + random.uniform(0, server.jitter))
+
+        parts = self.path.strip("/").split("/")
+        if len(parts) != 3 or not parts[1].isdigit() or not 1 <= int(parts[1]) <= server.doctors:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body, etag = server.payload(int(parts[1]))
+        if server.send_etag and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        if server.send_etag:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,224 @@
+"""
+Load test for the REST API: seeds users, doctors and upcoming slots, then runs
+`--clients` virtual users that log in and issue a weighted mix of requests
+(/api/users/me, /api/doctors/all, /api/timeslots/doctor/{id}, subscribe +
+unsubscribe, and occasional re-logins) for `--duration` seconds. Reports
+requests/s and latency percentiles per route.
+
+By default the app is served in-process over httpx's ASGI transport against a
+temporary SQLite database. To measure a running server instead, point
+`--base-url` at it and `--database` at the database it uses, e.g. from the
+backend directory:
+    python -m benchmarks.load_api --clients 50 --duration 30
+    python -m benchmarks.load_api --base-url http://127.0.0.1:8000 --database sqlite:///./mojtermin.db
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+import httpx
+import numpy as np
+
+PASSWORD = "loadtest-password"
+# relative weight of each request a virtual user picks after logging in
+MIX = {"me": 3, "doctors_all": 2, "timeslots": 4, "subscribe": 1, "login": 1}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="a running app (default: serve the app in-process)")
+    parser.add_argument("--database", help="SQLAlchemy URL to seed (default: a temporary SQLite file)")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--doctors", type=int, default=300)
+    parser.add_argument("--slots", type=int, default=60, help="upcoming slots per doctor")
+    parser.add_argument("--subscriptions", type=int, default=3, help="existing subscriptions per user")
+    parser.add_argument("--clients", type=int, default=50, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=20, help="seconds of traffic after the warm-up")
+    parser.add_argument("--warmup", type=float, default=2, help="seconds of traffic not counted in the results")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write the results to this file")
+    return parser.parse_args(argv)
+
+
+def seed(database_url: str, users: int, doctors: int, slots: int, subscriptions: int, rng: random.Random):
+    """Adds loadtest users, doctors and slots unless an earlier run already did."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from model.models import Base, User, Doctor, DoctorTimeslot, DoctorSubscription
+    from services.user_service import pwd_context
+
+    engine = create_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as db:
+        if db.query(User).filter(User.username == "loadtest1").first() is None:
+            # hashing is deliberately slow, so every seeded user shares one hash
+            password = pwd_context.hash(PASSWORD)
+            db.add_all(User(email=f"loadtest{i}@example.com", username=f"loadtest{i}", password=password)
+                       for i in range(1, users + 1))
+        existing = {doctor_id for (doctor_id,) in db.query(Doctor.id)}
+        first_slot = (datetime.now() + timedelta(days=1)).replace(hour=8, minute=0, second=0, microsecond=0)
+        for doctor_id in range(1, doctors + 1):
+            if doctor_id in existing:
+                continue
+            db.add(Doctor(id=doctor_id, full_name=f"loadtest doctor {doctor_id}"))
+            db.add_all(DoctorTimeslot(doctor_id=doctor_id, free_slot=first_slot + timedelta(minutes=20 * i))
+                       for i in range(slots))
+        db.flush()
+        user_ids = [user_id for (user_id,) in db.query(User.id).filter(User.username.like("loadtest%"))]
+        subscribed = {user_id for (user_id,) in db.query(DoctorSubscription.user_id)}
+        db.add_all(DoctorSubscription(user_id=user_id, doctor_id=doctor_id)
+                   for user_id in user_ids if user_id not in subscribed
+                   for doctor_id in rng.sample(range(1, doctors + 1), min(subscriptions, doctors)))
+        db.commit()
+    engine.dispose()
+
+
+def in_process_client(database_url: str) -> httpx.AsyncClient:
+    # keep the app from polling the real upstream while we measure the API
+    os.environ.setdefault("MOJTERMIN_API_POLLING", "0")
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from database.database import get_db
+    from main import app
+
+    SessionLocal = sessionmaker(bind=create_engine(database_url, connect_args={"check_same_thread": False}),
+                                autoflush=False, autocommit=False)
+
+    def override_get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest")
+
+
+class Recorder:
+    def __init__(self):
+        self.recording = False
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+
+    async def request(self, client: httpx.AsyncClient, route: str, method: str, url: str, **kwargs) -> httpx.Response:
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            if self.recording:
+                self.errors[route] += 1
+            raise
+        if self.recording:
+            self.latencies[route].append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                self.errors[route] += 1
+        return response
+
+
+async def virtual_user(client: httpx.AsyncClient, recorder: Recorder, user: int, doctors: int, deadline: float,
+                       rng: random.Random):
+    routes, weights = list(MIX), list(MIX.values())
+    token = None
+    while time.perf_counter() < deadline:
+        route = "login" if token is None else rng.choices(routes, weights)[0]
+        try:
+            if route == "login":
+                response = await recorder.request(client, "login", "POST", "/api/users/login",
+                                                  data={"username": f"loadtest{user}", "password": PASSWORD})
+                token = response.json()["token"] if response.status_code == 200 else None
+                if token is None:
+                    await asyncio.sleep(0.1)
+                continue
+            headers = {"Authorization": f"Bearer {token}"}
+            if route == "me":
+                await recorder.request(client, "me", "GET", "/api/users/me", headers=headers)
+            elif route == "doctors_all":
+                await recorder.request(client, "doctors_all", "GET", "/api/doctors/all")
+            elif route == "timeslots":
+                await recorder.request(client, "timeslots", "GET",
+                                       f"/api/timeslots/doctor/{rng.randint(1, doctors)}")
+            else:
+                response = await recorder.request(client, "subscribe", "POST",
+                                                  f"/api/subscriptions/subscribe/{rng.randint(1, doctors)}",
+                                                  headers=headers)
+                if response.status_code == 200:
+                    await recorder.request(client, "unsubscribe", "DELETE",
+                                           f"/api/subscriptions/unsubscribe/{response.json()['id']}")
+        except httpx.HTTPError:
+            await asyncio.sleep(0.1)
+
+
+def summarize(recorder: Recorder, seconds: float) -> dict[str, dict]:
+    summary = {}
+    for route in sorted(set(recorder.latencies) | set(recorder.errors)):
+        latencies = np.array(recorder.latencies[route]) * 1000
+        summary[route] = {
+            "requests": int(latencies.size),
+            "errors": recorder.errors[route],
+            "rps": latencies.size / seconds,
+            **({f"p{q}_ms": float(np.percentile(latencies, q)) for q in (50, 95, 99)} if latencies.size else {}),
+            "max_ms": float(latencies.max()) if latencies.size else 0.0,
+        }
+    total = sum(len(values) for values in recorder.latencies.values())
+    summary["total"] = {"requests": total, "errors": sum(recorder.errors.values()), "rps": total / seconds}
+    return summary
+
+
+async def run(args) -> dict[str, dict]:
+    rng = random.Random(args.seed)
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=30,
+                                   limits=httpx.Limits(max_connections=args.clients))
+    else:
+        client = in_process_client(args.database)
+
+    recorder = Recorder()
+    started = time.perf_counter()
+    deadline = started + args.warmup + args.duration
+    async with client:
+        tasks = [asyncio.create_task(virtual_user(client, recorder, rng.randint(1, args.users), args.doctors, deadline,
+                                                  random.Random(rng.random())))
+                 for _ in range(args.clients)]
+        await asyncio.sleep(args.warmup)
+        recorder.recording = True
+        measured_from = time.perf_counter()
+        await asyncio.gather(*tasks)
+        measured = time.perf_counter() - measured_from
+    return summarize(recorder, measured)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.base_url is None and args.database is None:
+        args.database = f"sqlite:///{tempfile.mkdtemp(prefix='mojtermin-load-')}/load.db"
+    if args.database:
+        seed(args.database, args.users, args.doctors, args.slots, args.subscriptions, random.Random(args.seed))
+
+    print(f"{args.clients} clients for {args.duration:.0f}s against {args.base_url or 'the in-process app'}: "
+          f"{args.users} users, {args.doctors} doctors, {args.slots} slots each")
+    summary = asyncio.run(run(args))
+
+    print(f"{'route':<12} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for route, stats in summary.items():
+        if route == "total":
+            continue
+        print(f"{route:<12} {stats['requests']:>9} {stats['errors']:>7} {stats['rps']:>8.1f} "
+              + " ".join(f"{stats.get(key, 0.0):>7.1f}ms" for key in ("p50_ms", "p95_ms", "p99_ms", "max_ms")))
+    total = summary["total"]
+    print(f"{'total':<12} {total['requests']:>9} {total['errors']:>7} {total['rps']:>8.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "routes": summary}, f, indent=2)
+    return summary
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,40 @@
+"""A local SMTP server that accepts and counts every message, for benchmarks and load tests."""
+import socket
+import threading
+from aiosmtpd.controller import Controller
+
+
+class CountingHandler:
+    def __init__(self):
+        self.messages = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        with self._lock:
+            self.connections += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        with self._lock:
+            self.messages += 1
+        return "250 Message accepted for delivery"
+
+
+class SMTPSink:
+    def __init__(self, port: int = 0):
+        if not port:
+            with socket.socket() as sock:
+                sock.bind(("127.0.0.1", 0))
+                port = sock.getsockname()[1]
+        self.port = port
+        self.handler = CountingHandler()
+        self._controller = Controller(self.handler, hostname="127.0.0.1", port=port)
+
+    def start(self) -> "SMTPSink":
+        self._controller.start()
+        return self
+
+    def stop(self):
+        self._controller.stop()
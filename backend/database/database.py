@@ -1,3 +1,6 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
@@ -7,9 +10,26 @@ engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+def create_tables():
+    from model.models import Base, DoctorTimeslot
+    Base.metadata.create_all(bind=engine)
+    # create_all skips tables that already exist, so add indexes introduced later to existing databases
+    for index in DoctorTimeslot.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+# Sync SQLAlchemy work issued from coroutines goes through this single thread, so it never
+# blocks the event loop and a session is never used by two threads at the same time.
+db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+
+
+async def run_db(fn, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(db_executor, partial(fn, *args, **kwargs))
@@ -0,0 +1,25 @@
+import time
+from functools import wraps
+from prometheus_client import Histogram
+
+DB_SECONDS = Histogram(
+    "mojtermin_db_seconds",
+    "Time spent in each repository function, including commits.",
+    ["function"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+
+def db_timed(fn):
+    """Record how long a repository function takes under mojtermin_db_seconds{function="<repo>.<name>"}."""
+    histogram = DB_SECONDS.labels(function=f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__name__}")
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - started)
+
+    return wrapper
@@ -1,15 +1,33 @@
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from starlette.middleware.cors import CORSMiddleware
-from database.database import engine
-from model.models import Base
-from routes import user_router, doctor_router, timeslot_router, subscription_router
+from database.database import create_tables
+from routes import user_router, doctor_router, timeslot_router, subscription_router, metrics_router, event_router
 from scheduler.scheduler import start_scheduler
+from services.change_tailer import change_tailer
 
-Base.metadata.create_all(bind=engine)
+# set to 0 when polling runs in its own process (python -m scheduler.worker), which then
+# serves the polling metrics on its own --metrics-port instead of this app's /metrics
+API_POLLING = os.getenv("MOJTERMIN_API_POLLING", "1") == "1"
 
-app = FastAPI()
+create_tables()
 
-start_scheduler()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # feeds the SSE streams and long polls with the slot changes of every process
+    await change_tailer.start()
+    try:
+        yield
+    finally:
+        await change_tailer.stop()
+
+
+app = FastAPI(lifespan=lifespan)
+
+if API_POLLING:
+    start_scheduler()
 
 origins = [
     "http://localhost:5173",
@@ -30,3 +48,5 @@ app.include_router(user_router.router)
 app.include_router(doctor_router.router)
 app.include_router(timeslot_router.router)
 app.include_router(subscription_router.router)
+app.include_router(event_router.router)
+app.include_router(metrics_router.router)
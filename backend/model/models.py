@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Index
 from sqlalchemy.orm import relationship, declarative_base
 
 Base = declarative_base()
@@ -24,6 +24,11 @@ class DoctorTimeslot(Base):
     free_slot = Column(DateTime, nullable=False)
     doctor_id = Column(Integer, ForeignKey("doctors.id"))
 
+    __table_args__ = (
+        Index("ix_free_slots_free_slot", "free_slot"),
+        Index("ix_free_slots_doctor_id_free_slot", "doctor_id", "free_slot"),
+    )
+
     doctor = relationship("Doctor", backref="free_slots")
 
 
@@ -35,3 +40,61 @@ class DoctorSubscription(Base):
 
     user = relationship("User", backref="subscriptions")
     doctor = relationship("Doctor", backref="subscriptions")
+
+
+class DoctorPollState(Base):
+    __tablename__ = 'doctor_poll_states'
+    doctor_id = Column(Integer, ForeignKey("doctors.id"), primary_key=True)
+    interval_seconds = Column(Integer, nullable=False)
+    next_poll_at = Column(DateTime, nullable=False)
+    last_checked_at = Column(DateTime, nullable=True)
+    last_changed_at = Column(DateTime, nullable=True)
+    content_hash = Column(String, nullable=True)
+    etag = Column(String, nullable=True)
+    last_modified = Column(String, nullable=True)
+    failure_count = Column(Integer, nullable=False, default=0)
+
+
+class EmailOutbox(Base):
+    __tablename__ = 'email_outbox'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    to_email = Column(String, nullable=False)
+    doctor_id = Column(Integer, ForeignKey("doctors.id"))
+    doctor_name = Column(String, nullable=False)
+    slots = Column(Text, nullable=False)  # JSON list of ISO datetimes
+    status = Column(String, nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    sent_at = Column(DateTime, nullable=True)
+    last_error = Column(String, nullable=True)
+
+    __table_args__ = (Index("ix_email_outbox_status_next_attempt", "status", "next_attempt_at"),)
+
+
+class SchedulerLease(Base):
+    """A named lease in the database; whoever holds an unexpired one runs that part of the scheduler."""
+    __tablename__ = 'scheduler_leases'
+    name = Column(String, primary_key=True)
+    holder = Column(String, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+
+class SlotChange(Base):
+    """
+    Append-only log of slot changes, written in the same transaction as the slots.
+    The id doubles as the change version clients sync from: AUTOINCREMENT keeps ids
+    increasing even after the newest rows are pruned.
+    """
+    __tablename__ = 'slot_changes'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    doctor_id = Column(Integer, ForeignKey("doctors.id"), nullable=False)
+    free_slot = Column(DateTime, nullable=False)
+    kind = Column(String, nullable=False)  # "added" or "removed"
+    created_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_slot_changes_doctor_id_id", "doctor_id", "id"),
+        Index("ix_slot_changes_created_at", "created_at"),
+        {"sqlite_autoincrement": True},
+    )
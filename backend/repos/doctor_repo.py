@@ -1,21 +1,49 @@
+from datetime import datetime
+from sqlalchemy import func, insert
 from sqlalchemy.orm import Session
-from model.models import Doctor
+from model.models import Doctor, DoctorTimeslot
+from database.metrics import db_timed
 
 
+@db_timed
 def get_by_id(db: Session, doctor_id: int):
     return db.query(Doctor).filter(Doctor.id == doctor_id).first()
 
 
+@db_timed
 def check_existence(db: Session, doctor_id: int):
     return db.query(db.query(Doctor).filter(Doctor.id == doctor_id).exists()).scalar()
 
 
+@db_timed
 def get_all(db: Session):
     return db.query(Doctor).all()
 
 
+@db_timed
+def count(db: Session) -> int:
+    return db.query(func.count(Doctor.id)).scalar()
+
+
+@db_timed
 def create(db: Session, doctor: Doctor):
     db.add(doctor)
     db.commit()
     db.refresh(doctor)
     return doctor
+
+
+@db_timed
+def create_with_timeslots(db: Session, doctor: Doctor, free_slots: set[datetime]):
+    """Insert the doctor and all of its slots in a single transaction."""
+    try:
+        db.add(doctor)
+        db.flush()
+        if free_slots:
+            db.execute(insert(DoctorTimeslot), [{"doctor_id": doctor.id, "free_slot": slot} for slot in free_slots])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    db.refresh(doctor)
+    return doctor
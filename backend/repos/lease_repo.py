@@ -0,0 +1,54 @@
+from datetime import datetime
+from sqlalchemy import update, delete, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from model.models import SchedulerLease
+from database.metrics import db_timed
+
+
+@db_timed
+def try_acquire(db: Session, name: str, holder: str, now: datetime, expires_at: datetime) -> bool:
+    """
+    Take or renew the lease in one conditional UPDATE, so two processes racing for
+    an expired lease can't both win. Returns whether `holder` now holds it.
+    """
+    result = db.execute(
+        update(SchedulerLease)
+        .where(SchedulerLease.name == name, or_(SchedulerLease.holder == holder, SchedulerLease.expires_at < now))
+        .values(holder=holder, expires_at=expires_at)
+    )
+    if result.rowcount:
+        db.commit()
+        return True
+
+    if db.get(SchedulerLease, name) is not None:
+        db.rollback()
+        return False
+
+    db.add(SchedulerLease(name=name, holder=holder, expires_at=expires_at))
+    try:
+        db.commit()
+    except IntegrityError:
+        # another process created the lease first
+        db.rollback()
+        return False
+    return True
+
+
+@db_timed
+def release(db: Session, name: str, holder: str):
+    db.execute(delete(SchedulerLease).where(SchedulerLease.name == name, SchedulerLease.holder == holder))
+    db.commit()
+
+
+@db_timed
+def get_by_name(db: Session, name: str) -> SchedulerLease | None:
+    return db.get(SchedulerLease, name)
+
+
+@db_timed
+def get_active_holders(db: Session, prefix: str, now: datetime) -> list[str]:
+    rows = (db.query(SchedulerLease.holder)
+            .filter(SchedulerLease.name.startswith(prefix), SchedulerLease.expires_at >= now)
+            .order_by(SchedulerLease.holder).all())
+    return [row.holder for row in rows]
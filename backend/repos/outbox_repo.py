@@ -0,0 +1,54 @@
+from datetime import datetime
+from sqlalchemy import update, func
+from sqlalchemy.orm import Session
+from model.models import EmailOutbox
+from database.metrics import db_timed
+
+
+@db_timed
+def add_many(db: Session, messages: list[EmailOutbox]):
+    # no commit: the messages are written together with the caller's transaction
+    db.add_all(messages)
+
+
+@db_timed
+def get_due_recipients(db: Session, now: datetime, limit: int) -> list[str]:
+    rows = (db.query(EmailOutbox.to_email)
+            .filter(EmailOutbox.status == "pending", EmailOutbox.next_attempt_at <= now)
+            .group_by(EmailOutbox.to_email)
+            .order_by(func.min(EmailOutbox.id))
+            .limit(limit).all())
+    return [row.to_email for row in rows]
+
+
+@db_timed
+def get_due_for_recipients(db: Session, emails: list[str], now: datetime) -> list[EmailOutbox]:
+    return (db.query(EmailOutbox)
+            .filter(EmailOutbox.status == "pending", EmailOutbox.next_attempt_at <= now,
+                    EmailOutbox.to_email.in_(emails))
+            .order_by(EmailOutbox.id).all())
+
+
+@db_timed
+def count_pending(db: Session) -> int:
+    return db.query(EmailOutbox).filter(EmailOutbox.status == "pending").count()
+
+
+@db_timed
+def mark_sent(db: Session, message_ids: list[int], now: datetime):
+    db.execute(update(EmailOutbox).where(EmailOutbox.id.in_(message_ids))
+               .values(status="sent", sent_at=now, last_error=None))
+    db.commit()
+
+
+@db_timed
+def mark_failed(db: Session, messages: list[EmailOutbox], error: str, next_attempt_at: datetime, max_attempts: int):
+    """Schedule a retry at `next_attempt_at`, giving up on messages that ran out of attempts."""
+    for message in messages:
+        message.attempts += 1
+        message.last_error = error
+        if message.attempts >= max_attempts:
+            message.status = "failed"
+        else:
+            message.next_attempt_at = next_attempt_at
+    db.commit()
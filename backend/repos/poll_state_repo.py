@@ -0,0 +1,59 @@
+from datetime import datetime
+from sqlalchemy import update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from model.models import DoctorPollState
+from database.metrics import db_timed
+
+
+@db_timed
+def get_by_doctor(db: Session, doctor_id: int) -> DoctorPollState | None:
+    return db.query(DoctorPollState).filter(DoctorPollState.doctor_id == doctor_id).first()
+
+
+@db_timed
+def get_by_doctors(db: Session, doctor_ids: list[int]) -> list[DoctorPollState]:
+    return db.query(DoctorPollState).filter(DoctorPollState.doctor_id.in_(doctor_ids)).all()
+
+
+@db_timed
+def save(db: Session, state: DoctorPollState) -> DoctorPollState:
+    db.add(state)
+    db.commit()
+    return state
+
+
+@db_timed
+def add_missing(db: Session, states: list[dict]):
+    """Insert poll states for doctors that don't have one yet, leaving existing rows (and concurrent inserts) alone."""
+    if states:
+        db.execute(insert(DoctorPollState).values(states).on_conflict_do_nothing(index_elements=["doctor_id"]))
+        db.commit()
+
+
+@db_timed
+def claim_due(db: Session, doctor_ids: list[int], now: datetime, until: datetime) -> list[int]:
+    """
+    Atomically move next_poll_at of the doctors still due to `until`, so no other
+    worker sees them as due, and return the ones this call claimed.
+    """
+    if not doctor_ids:
+        return []
+    claimed = db.execute(
+        update(DoctorPollState)
+        .where(DoctorPollState.doctor_id.in_(doctor_ids), DoctorPollState.next_poll_at <= now)
+        .values(next_poll_at=until)
+        .returning(DoctorPollState.doctor_id)
+    ).scalars().all()
+    db.commit()
+    return list(claimed)
+
+
+@db_timed
+def release_claims(db: Session, doctor_ids: list[int], until: datetime, now: datetime):
+    """Make claimed doctors that were never polled due again, unless their poll was recorded meanwhile."""
+    if doctor_ids:
+        db.execute(update(DoctorPollState)
+                   .where(DoctorPollState.doctor_id.in_(doctor_ids), DoctorPollState.next_poll_at == until)
+                   .values(next_poll_at=now))
+        db.commit()
@@ -0,0 +1,50 @@
+from datetime import datetime
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+from model.models import SlotChange
+from database.metrics import db_timed
+
+
+@db_timed
+def add_many(db: Session, changes: list[dict]):
+    # no commit: the changes are written together with the slots they describe
+    if changes:
+        db.execute(insert(SlotChange), changes)
+
+
+@db_timed
+def get_version(db: Session, doctor_id: int | None = None) -> int:
+    query = db.query(func.max(SlotChange.id))
+    if doctor_id is not None:
+        query = query.filter(SlotChange.doctor_id == doctor_id)
+    return query.scalar() or 0
+
+
+@db_timed
+def get_oldest_id(db: Session) -> int | None:
+    return db.query(func.min(SlotChange.id)).scalar()
+
+
+@db_timed
+def get_since(db: Session, since: int, doctor_id: int | None = None, limit: int | None = None) -> list[SlotChange]:
+    query = db.query(SlotChange).filter(SlotChange.id > since)
+    if doctor_id is not None:
+        query = query.filter(SlotChange.doctor_id == doctor_id)
+    return query.order_by(SlotChange.id).limit(limit).all()
+
+
+def is_stale_cursor(db: Session, since: int, version: int) -> bool:
+    """Changes after `since` may have been pruned, or the cursor comes from a different database."""
+    if since > version:
+        return True
+    oldest = get_oldest_id(db)
+    return oldest is not None and since < oldest - 1
+
+
+@db_timed
+def prune(db: Session, before: datetime) -> int:
+    """Delete changes older than `before`, always keeping the newest one so the current version stays known."""
+    newest = select(func.max(SlotChange.id)).scalar_subquery()
+    result = db.execute(delete(SlotChange).where(SlotChange.created_at < before, SlotChange.id < newest))
+    db.commit()
+    return result.rowcount
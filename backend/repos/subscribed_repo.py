@@ -1,15 +1,19 @@
 from sqlalchemy.orm import Session
 from model.models import DoctorSubscription
+from database.metrics import db_timed
 
 
+@db_timed
 def get_by_id(db: Session, subscription_id: int):
     return db.query(DoctorSubscription).filter(DoctorSubscription.id == subscription_id).first()
 
 
+@db_timed
 def get_by_user(db: Session, user_id: int) -> list[DoctorSubscription]:
     return db.query(DoctorSubscription).filter(DoctorSubscription.user_id == user_id).all()
 
 
+@db_timed
 def create(db: Session, sub: DoctorSubscription):
     db.add(sub)
     db.commit()
@@ -17,6 +21,7 @@ def create(db: Session, sub: DoctorSubscription):
     return sub
 
 
+@db_timed
 def delete(db: Session, sub: DoctorSubscription):
     db.delete(sub)
     db.commit()
@@ -1,17 +1,54 @@
+from datetime import datetime
 from sqlalchemy.orm import Session
 from model.models import DoctorTimeslot
-from sqlalchemy import asc
+from sqlalchemy import asc, insert, cast, func, Integer
+from database.metrics import db_timed
 
+# keeps IN (...) lists well under SQLite's bound-parameter limit
+BULK_CHUNK_SIZE = 500
 
+# minutes since the epoch, computed by SQLite so no datetime objects are built for the diff
+slot_minute = cast(func.strftime("%s", DoctorTimeslot.free_slot), Integer) // 60
+
+
+@db_timed
 def get_by_id(db: Session, slot_id: int) -> DoctorTimeslot:
     return (db.query(DoctorTimeslot)
             .filter(DoctorTimeslot.id == slot_id).first())
 
 
-def get_by_doctor(db: Session, doctor_id: int) -> list[DoctorTimeslot]:
-    return db.query(DoctorTimeslot).filter(DoctorTimeslot.doctor_id == doctor_id).order_by(asc(DoctorTimeslot.free_slot)).all()
+@db_timed
+def get_by_doctor(db: Session, doctor_id: int, now: datetime | None = None) -> list[DoctorTimeslot]:
+    now = now or datetime.now()
+    return (db.query(DoctorTimeslot)
+            .filter(DoctorTimeslot.doctor_id == doctor_id, DoctorTimeslot.free_slot >= now)
+            .order_by(asc(DoctorTimeslot.free_slot)).all())
+
+
+@db_timed
+def get_slot_minutes(db: Session, doctor_id: int, now: datetime) -> list[int]:
+    """The upcoming slots of a doctor as sorted epoch minutes."""
+    rows = (db.query(slot_minute)
+            .filter(DoctorTimeslot.doctor_id == doctor_id, DoctorTimeslot.free_slot >= now)
+            .order_by(DoctorTimeslot.free_slot).all())
+    return [row[0] for row in rows]
+
+
+@db_timed
+def get_slot_minutes_by_doctors(db: Session, doctor_ids: list[int], now: datetime) -> dict[int, list[int]]:
+    """Like get_slot_minutes for many doctors at once. Doctors without upcoming slots map to []."""
+    minutes = {doctor_id: [] for doctor_id in doctor_ids}
+    for i in range(0, len(doctor_ids), BULK_CHUNK_SIZE):
+        chunk = doctor_ids[i:i + BULK_CHUNK_SIZE]
+        rows = (db.query(DoctorTimeslot.doctor_id, slot_minute)
+                .filter(DoctorTimeslot.doctor_id.in_(chunk), DoctorTimeslot.free_slot >= now)
+                .order_by(DoctorTimeslot.doctor_id, DoctorTimeslot.free_slot).all())
+        for doctor_id, minute in rows:
+            minutes[doctor_id].append(minute)
+    return minutes
 
 
+@db_timed
 def create(db: Session, timeslot: DoctorTimeslot) -> DoctorTimeslot:
     db.add(timeslot)
     db.commit()
@@ -19,6 +56,43 @@ def create(db: Session, timeslot: DoctorTimeslot) -> DoctorTimeslot:
     return timeslot
 
 
+@db_timed
 def delete(db: Session, timeslot: DoctorTimeslot):
     db.delete(timeslot)
     db.commit()
+
+
+@db_timed
+def delete_expired(db: Session, now: datetime) -> int:
+    """Delete the past slots of every doctor with one indexed statement."""
+    try:
+        deleted = (db.query(DoctorTimeslot).filter(DoctorTimeslot.free_slot < now)
+                   .delete(synchronize_session=False))
+        db.commit()
+        return deleted
+    except Exception:
+        db.rollback()
+        raise
+
+
+@db_timed
+def reconcile(db: Session, doctor_id: int, removed: set[datetime], added: set[datetime]):
+    """
+    Delete the removed slots of a doctor and insert the added ones
+    with bulk statements, committed as a single transaction.
+    """
+    try:
+        removed = sorted(removed)
+        for i in range(0, len(removed), BULK_CHUNK_SIZE):
+            chunk = removed[i:i + BULK_CHUNK_SIZE]
+            (db.query(DoctorTimeslot)
+             .filter(DoctorTimeslot.doctor_id == doctor_id, DoctorTimeslot.free_slot.in_(chunk))
+             .delete(synchronize_session=False))
+
+        if added:
+            db.execute(insert(DoctorTimeslot), [{"doctor_id": doctor_id, "free_slot": slot} for slot in added])
+
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
@@ -1,19 +1,24 @@
 from sqlalchemy.orm import Session
 from model.models import User
+from database.metrics import db_timed
 
 
+@db_timed
 def get_by_id(db: Session, user_id: int):
     return db.query(User).filter(User.id == user_id).first()
 
 
+@db_timed
 def get_all(db: Session):
     return db.query(User).all()
 
 
+@db_timed
 def get_by_email(db: Session, email: str):
     return db.query(User).filter(User.email == email).first()
 
 
+@db_timed
 def create(db: Session, user: User):
     db.add(user)
     db.commit()
@@ -21,11 +26,13 @@ def create(db: Session, user: User):
     return user
 
 
+@db_timed
 def delete(db: Session, user: User):
     db.delete(user)
     db.commit()
 
 
+@db_timed
 def update(db: Session, user: User, updates: dict):
     for key, value in updates.items():
         setattr(user, key, value)
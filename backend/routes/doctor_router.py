@@ -1,14 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 from model.schemas import DoctorCreate
 from services import doctor_service
+from services.version_registry import version_registry, etag_matches, cache_headers, not_modified
 from database.database import get_db
 
 router = APIRouter(prefix="/api/doctors", tags=["Doctors"])
 
 
 @router.get("/all")
-def get_all_doctors(db: Session = Depends(get_db)):
+def get_all_doctors(request: Request, response: Response, db: Session = Depends(get_db)):
+    etag = version_registry.doctors_etag(db)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers.update(cache_headers(etag))
     return doctor_service.get_all_doctors(db)
 
 
@@ -19,8 +24,16 @@ def add_doctor(doc: DoctorCreate, db: Session = Depends(get_db)):
 
 
 @router.get("/{doctor_id}")
-def get_doctor(doctor_id: int, db: Session = Depends(get_db)):
+def get_doctor(doctor_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
+    etag = version_registry.doctor_etag(db, doctor_id)
+    if etag and etag_matches(request, etag):
+        return not_modified(etag)
     doctor = doctor_service.get_doctor_by_id(db, doctor_id)
     if not doctor:
         raise HTTPException(status_code=404, detail="Doctor not found")
+    etag = version_registry.remember_doctor(db, doctor_id)
+    # the client may have the tag from another worker
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers.update(cache_headers(etag))
     return doctor
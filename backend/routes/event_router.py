@@ -0,0 +1,97 @@
+import os
+import time
+from functools import partial
+from typing import Callable
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.orm import Session
+from starlette.responses import StreamingResponse
+from security.get_current_user import get_user_from_token
+from services import doctor_service, subscription_service
+from services.event_hub import event_hub, format_sse
+from database.database import get_db, SessionLocal, run_db
+
+# idle streams get a comment this often so proxies don't time them out and dead clients are noticed
+HEARTBEAT_SECONDS = float(os.getenv("MOJTERMIN_SSE_HEARTBEAT_SECONDS", "15"))
+# how often a user's stream looks up their subscriptions again, to follow doctors subscribed to since it opened
+SUBSCRIPTION_REFRESH_SECONDS = float(os.getenv("MOJTERMIN_SSE_SUBSCRIPTION_REFRESH_SECONDS", "30"))
+
+router = APIRouter(prefix="/api/events", tags=["Events"])
+
+
+def subscribed_doctor_ids(user_id: int) -> set[int]:
+    db = SessionLocal()
+    try:
+        return {subscription.doctor_id for subscription in subscription_service.get_subscriptions_by_user(db, user_id)}
+    finally:
+        db.close()
+
+
+async def slot_events(request: Request, doctor_ids: set[int], refresh: Callable[[], set[int]] | None = None):
+    """
+    Server-Sent Events for the doctors' slot changes. The change tailer publishes
+    every change to the event hub, whichever process wrote it, so the stream only
+    forwards hub messages and never queries the database itself. The `ready` event
+    is sent once the subscription is live, so a client that refetches the slots on
+    it can't miss a change in between. With `refresh`, the doctors are looked up
+    again every SUBSCRIPTION_REFRESH_SECONDS and on a resync; when they differ, a
+    new `ready` event lists them.
+    """
+    subscription = event_hub.subscribe(doctor_ids)
+    try:
+        yield "retry: 3000\n\n"
+        yield format_sse("ready", {"doctor_ids": sorted(doctor_ids)})
+        last_sent = time.monotonic()
+        next_refresh = last_sent + SUBSCRIPTION_REFRESH_SECONDS
+        while not await request.is_disconnected():
+            timeout = HEARTBEAT_SECONDS - (time.monotonic() - last_sent)
+            if refresh is not None:
+                timeout = min(timeout, next_refresh - time.monotonic())
+            message = await subscription.next_message(max(timeout, 0))
+            if refresh is not None and (time.monotonic() >= next_refresh
+                                        or message is not None and message.startswith("event: resync\n")):
+                next_refresh = time.monotonic() + SUBSCRIPTION_REFRESH_SECONDS
+                current = await run_db(refresh)
+                if current != doctor_ids:
+                    doctor_ids = current
+                    event_hub.resubscribe(subscription, doctor_ids)
+                    # reloading on ready covers the resync as well
+                    message = format_sse("ready", {"doctor_ids": sorted(doctor_ids)})
+            if message is not None:
+                yield message
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= HEARTBEAT_SECONDS:
+                yield ": ping\n\n"
+                last_sent = time.monotonic()
+    finally:
+        event_hub.unsubscribe(subscription)
+
+
+def event_stream(request: Request, doctor_ids: set[int],
+                 refresh: Callable[[], set[int]] | None = None) -> StreamingResponse:
+    return StreamingResponse(slot_events(request, doctor_ids, refresh), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# the session is only needed to set a stream up, so both endpoints close it instead of
+# holding a connection for as long as the client stays connected
+@router.get("/doctor/{doctor_id}")
+def stream_doctor_events(doctor_id: int, request: Request, db: Session = Depends(get_db)):
+    try:
+        doctor = doctor_service.get_doctor_by_id(db, doctor_id)
+    finally:
+        db.close()
+    if not doctor:
+        raise HTTPException(status_code=404, detail="Doctor not found")
+    return event_stream(request, {doctor_id})
+
+
+# EventSource can't send an Authorization header, so the token comes as a query parameter
+@router.get("/me")
+def stream_my_events(token: str, request: Request, db: Session = Depends(get_db)):
+    try:
+        user = get_user_from_token(db, token)
+        subscriptions = subscription_service.get_subscriptions_by_user(db, user.id)
+        doctor_ids = {subscription.doctor_id for subscription in subscriptions}
+    finally:
+        db.close()
+    return event_stream(request, doctor_ids, partial(subscribed_doctor_ids, user.id))
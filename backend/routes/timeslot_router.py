@@ -1,7 +1,8 @@
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
-from services import timeslot_service
+from services import timeslot_service, sync_service
+from services.version_registry import version_registry, etag_matches, cache_headers, not_modified
 from database.database import get_db
 
 router = APIRouter(prefix="/api/timeslots", tags=["Timeslots"])
@@ -14,8 +15,31 @@ def create_timeslot(doctor_id: int, free_slot: datetime, db: Session = Depends(g
 
 
 @router.get("/doctor/{doctor_id}")
-def get_timeslots_by_doctor(doctor_id: int, db: Session = Depends(get_db)):
-    return timeslot_service.get_timeslots_by_doctor(db, doctor_id)
+def get_timeslots_by_doctor(doctor_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
+    version = version_registry.slot_version(db, doctor_id)
+    etag = version_registry.served_slots_etag(doctor_id, version)
+    if etag and etag_matches(request, etag):
+        return not_modified(etag)
+    slots = timeslot_service.get_timeslots_by_doctor(db, doctor_id)
+    etag = version_registry.remember_slots(doctor_id, version, slots)
+    # the client may have the tag from another worker
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers.update(cache_headers(etag))
+    return slots
+
+
+@router.get("/doctor/{doctor_id}/changes")
+async def get_timeslot_changes_by_doctor(doctor_id: int, since: int | None = Query(None, ge=0),
+                                         wait: float = Query(0, ge=0), db: Session = Depends(get_db)):
+    return await sync_service.long_poll(db, sync_service.doctor_changes, doctor_id, since,
+                                        doctor_ids={doctor_id}, wait=wait)
+
+
+@router.get("/changes")
+async def get_timeslot_changes(since: int = Query(..., ge=0), limit: int = Query(sync_service.FEED_LIMIT, ge=1),
+                               wait: float = Query(0, ge=0), db: Session = Depends(get_db)):
+    return await sync_service.long_poll(db, sync_service.changes_since, since, limit, doctor_ids=None, wait=wait)
 
 
 @router.delete("/delete/{timeslot_id}")
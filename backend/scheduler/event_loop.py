@@ -0,0 +1,45 @@
+import asyncio
+import threading
+from typing import Any, Coroutine
+
+
+class LoopRunner:
+    """
+    Owns one event loop running forever on a daemon thread. Scheduler jobs hand
+    their coroutines to it instead of building and tearing down a loop with
+    asyncio.run on every run, so connections and pools tied to the loop survive
+    between runs and concurrent jobs overlap their I/O on the same loop.
+    """
+
+    def __init__(self, name: str = "scheduler-loop"):
+        self.name = name
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if not self.running:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name=self.name, daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def run(self, coro: Coroutine, timeout: float | None = None) -> Any:
+        """Run `coro` on the loop and block the calling thread until it finishes."""
+        loop = self.start()
+        return asyncio.run_coroutine_threadsafe(coro, loop).result(timeout)
+
+    def stop(self):
+        with self._lock:
+            if not self.running:
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = None
+            self._thread = None
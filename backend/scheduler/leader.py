@@ -0,0 +1,70 @@
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from repos import lease_repo
+from database.database import SessionLocal
+
+
+class LeaderLease:
+    """
+    Leader election over a lease row, so that when the API runs in several worker
+    processes only one of them polls the upstream and sends emails. Every process
+    calls renew() periodically; the holder extends its lease and the others take
+    over once it has expired because the leader died or stopped renewing.
+
+    Leadership is also bounded locally: is_leader turns false once the lease
+    would have expired without a successful renewal, even if the database can't
+    be reached to find out.
+    """
+
+    def __init__(self, name: str, ttl_seconds: int, holder: str | None = None, session_factory=None):
+        self.name = name
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.holder = holder or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        # each time this process becomes leader the term goes up, so callers can drop state from an earlier term
+        self.term = 0
+        self._session_factory = session_factory or SessionLocal
+        self._valid_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def is_leader(self) -> bool:
+        return time.monotonic() < self._valid_until
+
+    def renew(self) -> bool:
+        with self._lock:
+            # measured before the round trip, so the local deadline never outlives the stored one
+            started = time.monotonic()
+            now = datetime.now()
+            db = self._session_factory()
+            try:
+                acquired = lease_repo.try_acquire(db, self.name, self.holder, now, now + self.ttl)
+            except Exception as e:
+                print(f"Could not renew the {self.name} lease: {e}")
+                return self.is_leader
+            finally:
+                db.close()
+
+            if acquired and not self.is_leader:
+                self.term += 1
+                print(f"{self.holder} is now the {self.name} leader.")
+            elif not acquired and self.is_leader:
+                print(f"{self.holder} lost the {self.name} lease.")
+            self._valid_until = started + self.ttl.total_seconds() if acquired else 0.0
+            return acquired
+
+    def release(self):
+        with self._lock:
+            if not self.is_leader:
+                return
+            self._valid_until = 0.0
+            db = self._session_factory()
+            try:
+                lease_repo.release(db, self.name, self.holder)
+            except Exception as e:
+                print(f"Could not release the {self.name} lease: {e}")
+            finally:
+                db.close()
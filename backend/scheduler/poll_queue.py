@@ -0,0 +1,51 @@
+import heapq
+from datetime import datetime
+
+
+class PollQueue:
+    """
+    Min-heap of (next_poll_at, doctor_id). Rescheduling or removing a doctor
+    leaves its old heap entry behind; stale entries are skipped when popped.
+    """
+
+    def __init__(self):
+        self._heap: list[tuple[datetime, int]] = []
+        self._scheduled: dict[int, datetime] = {}
+
+    def __len__(self):
+        return len(self._scheduled)
+
+    def __contains__(self, doctor_id: int):
+        return doctor_id in self._scheduled
+
+    def doctor_ids(self) -> set[int]:
+        return set(self._scheduled)
+
+    def schedule(self, doctor_id: int, when: datetime):
+        self._scheduled[doctor_id] = when
+        heapq.heappush(self._heap, (when, doctor_id))
+
+    def remove(self, doctor_id: int):
+        self._scheduled.pop(doctor_id, None)
+
+    def clear(self):
+        self._heap.clear()
+        self._scheduled.clear()
+
+    def pop_due(self, now: datetime, limit: int | None = None) -> list[int]:
+        due = []
+        while limit is None or len(due) < limit:
+            self._drop_stale()
+            if not self._heap or self._heap[0][0] > now:
+                break
+            _, doctor_id = heapq.heappop(self._heap)
+            del self._scheduled[doctor_id]
+            due.append(doctor_id)
+        return due
+
+    def _drop_stale(self):
+        while self._heap:
+            when, doctor_id = self._heap[0]
+            if self._scheduled.get(doctor_id) == when:
+                return
+            heapq.heappop(self._heap)
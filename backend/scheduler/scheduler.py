@@ -1,30 +1,237 @@
+import atexit
+import os
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from functools import partial, wraps
 from apscheduler.schedulers.background import BackgroundScheduler
 from sqlalchemy.orm import Session
-from services.checker_service import check_new_dates
+from repos import poll_state_repo, outbox_repo
+from scheduler.event_loop import LoopRunner
+from scheduler.leader import LeaderLease
+from scheduler.poll_queue import PollQueue
+from scheduler.shards import ShardMembership
+from services import polling_service, upstream_guard, outbox_service, email_service, timeslot_service, metrics, \
+    sync_service
+from services.checker_service import check_doctors
 from database.database import SessionLocal
 from model.models import DoctorSubscription
 
+# how often the scheduler wakes up to poll the doctors that are due
+TICK_SECONDS = int(os.getenv("MOJTERMIN_TICK_SECONDS", "30"))
+# how often the email outbox is drained
+OUTBOX_SECONDS = int(os.getenv("MOJTERMIN_OUTBOX_SECONDS", "15"))
+# how long the leader's lease lasts without renewal, i.e. how fast another worker takes over from a dead one
+LEASE_SECONDS = int(os.getenv("MOJTERMIN_LEADER_LEASE_SECONDS", "30"))
+# when 1, every worker polls its own consistent-hash share of the doctors instead of only the leader polling all
+SHARDED = os.getenv("MOJTERMIN_SHARDED", "0") == "1"
+# how long a sharded worker's claim on a due doctor lasts if it dies before recording the poll
+CLAIM_SECONDS = int(os.getenv("MOJTERMIN_CLAIM_SECONDS", "600"))
 
-def job():
-    db: Session = SessionLocal()
-    subs = db.query(DoctorSubscription).all()
+poll_queue = PollQueue()
+# every job runs its coroutines on this one loop, so the SMTP pool's connections outlive a single run
+loop_runner = LoopRunner()
+smtp_pool = email_service.smtp_pool()
+# every worker process runs the scheduler, but only the lease holder polls and sends emails
+leader = LeaderLease("scheduler", LEASE_SECONDS)
+# the leader (or shard membership) term the poll queue and slot cache were built in
+queue_term = 0
+shards = ShardMembership(leader.holder, LEASE_SECONDS)
+
+
+def leader_only(fn):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not leader.is_leader:
+            return None
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+def poller_only(fn):
+    """Run only in the leader or, when sharded, in any worker that is a live shard member."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not (shards.is_member if SHARDED else leader.is_leader):
+            return None
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+def single_run(name: str):
+    """
+    Skip a job run while the previous run of the same job is still going, whoever
+    started it. APScheduler's max_instances covers the scheduler's own triggers,
+    this also covers runs started by hand or from a second scheduler in the process.
+    """
+    lock = threading.Lock()
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not lock.acquire(blocking=False):
+                print(f"Previous {name} run is still going, skipping this one.")
+                metrics.SCHEDULER_RUNS_SKIPPED.labels(job=name).inc()
+                return None
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                lock.release()
+        return wrapper
+    return decorator
+
+
+def group_subscribers_by_doctor(subs: list[DoctorSubscription]) -> dict[int, list[str]]:
+    subscribers = defaultdict(list)
     for sub in subs:
         user = sub.user
         doctor = sub.doctor
+        if user is None:
+            print(f"User with ID {sub.user_id} not found.")
+            continue
+        if doctor is None:
+            print(f"Doctor with ID {sub.doctor_id} not found.")
+            continue
+        if user.email not in subscribers[doctor.id]:
+            subscribers[doctor.id].append(user.email)
+    return subscribers
+
+
+def sync_poll_queue(db: Session, subscribers: dict[int, list[str]], now: datetime):
+    """
+    Add newly subscribed doctors to the queue at their persisted next poll time
+    (or right away if they've never been polled) and drop doctors without subscribers.
+    Newly added doctors also get their slots loaded into the slot cache.
+    """
+    for doctor_id in poll_queue.doctor_ids() - subscribers.keys():
+        poll_queue.remove(doctor_id)
+        # another worker may own the doctor now, so this cache entry would go stale
+        timeslot_service.slot_cache.invalidate(doctor_id)
+
+    new_doctor_ids = [doctor_id for doctor_id in subscribers if doctor_id not in poll_queue]
+    if not new_doctor_ids:
+        return
+
+    # at startup every doctor is new, so this also fills the slot cache in a few bulk queries
+    timeslot_service.warm_slot_cache(db, new_doctor_ids, now)
+    states = {state.doctor_id: state for state in poll_state_repo.get_by_doctors(db, new_doctor_ids)}
+    for doctor_id in new_doctor_ids:
+        state = states.get(doctor_id)
+        poll_queue.schedule(doctor_id, state.next_poll_at if state else now)
+
+
+def claim(db: Session, due: list[int], now: datetime) -> tuple[list[int], datetime]:
+    """
+    Claim the due doctors in the database before polling them. Right after a
+    rebalance two workers can briefly both think they own a doctor; only one
+    claim wins and the other worker requeues the doctor at its persisted time.
+    """
+    polling_service.ensure_states(db, due, now)
+    until = now + timedelta(seconds=CLAIM_SECONDS)
+    claimed = set(poll_state_repo.claim_due(db, due, now, until))
+    lost = [doctor_id for doctor_id in due if doctor_id not in claimed]
+    for state in poll_state_repo.get_by_doctors(db, lost):
+        poll_queue.schedule(state.doctor_id, state.next_poll_at)
+        # the winner is about to change the doctor's slots behind this worker's cache
+        timeslot_service.slot_cache.invalidate(state.doctor_id)
+    return [doctor_id for doctor_id in due if doctor_id in claimed], until
+
+
+def checkpoint(db: Session, subscribers: dict[int, list[str]], checked: set[int], doctor_id: int,
+               no_changes: bool | None):
+    """
+    Persist one doctor's poll as soon as it's done, so a run that dies halfway
+    resumes from the doctors it hadn't reached instead of sweeping everyone again.
+    """
+    changed = None if no_changes is None else not no_changes
+    state = polling_service.record_poll(db, doctor_id, changed, len(subscribers[doctor_id]), datetime.now())
+    poll_queue.schedule(doctor_id, state.next_poll_at)
+    checked.add(doctor_id)
+
+
+@poller_only
+@single_run("check")
+@metrics.SCHEDULER_RUN_FAILURES.labels(job="check").count_exceptions()
+@metrics.SCHEDULER_RUN_SECONDS.labels(job="check").time()
+def job():
+    global queue_term
+    term = shards.term if SHARDED else leader.term
+    if term != queue_term:
+        # other workers may have polled while this one wasn't leader or a shard member, so rebuild the queue
+        # from the persisted state and reload the cached slots, or the next diff would re-add slots it already stored
+        poll_queue.clear()
+        timeslot_service.slot_cache.clear()
+        queue_term = term
+
+    if upstream_guard.circuit_breaker.is_open:
+        print("Upstream circuit is open, skipping this run.")
+        return
+
+    db: Session = SessionLocal()
+    try:
+        now = datetime.now()
+        expired = timeslot_service.expire_slots(db, now)
+        if expired:
+            print(f"Deleted {expired} expired slots.")
+        sync_service.prune_changes(db, now)
+
+        subs = db.query(DoctorSubscription).all()
+        subscribers = group_subscribers_by_doctor(subs)
+        if SHARDED:
+            subscribers = {doctor_id: emails for doctor_id, emails in subscribers.items() if shards.owns(doctor_id)}
+        sync_poll_queue(db, subscribers, now)
+
+        due = poll_queue.pop_due(now)
+        if SHARDED:
+            due, claimed_until = claim(db, due, now)
+        if not due:
+            return
+
+        checked = set()
         try:
-            if user is None:
-                print(f"User with ID {sub.user_id} not found.")
-                continue
-            if doctor is None:
-                print(f"Doctor with ID {sub.doctor_id} not found.")
-                continue
-            check_new_dates(db, doctor_id=doctor.id, user_email=user.email)
-        except Exception as e:
-            print(f"Failed for doctor {doctor.id}: {e}")
-    db.close()
+            loop_runner.run(check_doctors(db, {doctor_id: subscribers[doctor_id] for doctor_id in due},
+                                          on_checked=partial(checkpoint, db, subscribers, checked)))
+        finally:
+            # skipped because the circuit opened mid-run or the run failed, retry on the next tick
+            unchecked = [doctor_id for doctor_id in due if doctor_id not in checked]
+            for doctor_id in unchecked:
+                poll_queue.schedule(doctor_id, now)
+            if SHARDED and unchecked:
+                poll_state_repo.release_claims(db, unchecked, claimed_until, now)
+    finally:
+        db.close()
+
+
+@leader_only
+@single_run("outbox")
+@metrics.SCHEDULER_RUN_FAILURES.labels(job="outbox").count_exceptions()
+@metrics.SCHEDULER_RUN_SECONDS.labels(job="outbox").time()
+def send_outbox_job():
+    db: Session = SessionLocal()
+    try:
+        sent, failed = loop_runner.run(outbox_service.drain_outbox(db, pool=smtp_pool))
+        if sent or failed:
+            print(f"Outbox: sent {sent} emails, {failed} failed.")
+        metrics.OUTBOX_PENDING.set(outbox_repo.count_pending(db))
+    finally:
+        db.close()
 
 
 def start_scheduler():
     scheduler = BackgroundScheduler()
-    scheduler.add_job(job, "interval", seconds=3600)
+    scheduler.add_job(leader.renew, "interval", seconds=max(1, LEASE_SECONDS // 3), next_run_time=datetime.now(),
+                      max_instances=1, coalesce=True)
+    if SHARDED:
+        scheduler.add_job(shards.heartbeat, "interval", seconds=max(1, LEASE_SECONDS // 3),
+                          next_run_time=datetime.now(), max_instances=1, coalesce=True)
+        atexit.register(shards.leave)
+    # a run that outlasts its interval delays the next one rather than overlapping it,
+    # and ticks missed meanwhile collapse into a single catch-up run
+    scheduler.add_job(job, "interval", seconds=TICK_SECONDS, max_instances=1, coalesce=True,
+                      misfire_grace_time=TICK_SECONDS)
+    scheduler.add_job(send_outbox_job, "interval", seconds=OUTBOX_SECONDS, max_instances=1, coalesce=True,
+                      misfire_grace_time=OUTBOX_SECONDS)
     scheduler.start()
+    # let another worker take over right away instead of waiting for the lease to expire
+    atexit.register(leader.release)
+    return scheduler
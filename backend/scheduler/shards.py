@@ -0,0 +1,91 @@
+import bisect
+import hashlib
+import threading
+import time
+from datetime import datetime, timedelta
+from repos import lease_repo
+from database.database import SessionLocal
+
+MEMBER_PREFIX = "member:"
+
+
+def ring_hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Consistent hashing of doctors onto workers. Each worker is placed at
+    `replicas` points on the ring and owns the doctors hashing up to its points,
+    so a worker joining or leaving only moves about 1/N of the doctors.
+    """
+
+    def __init__(self, members: list[str], replicas: int = 64):
+        self.members = sorted(members)
+        points = sorted((ring_hash(f"{member}#{i}"), member) for member in self.members for i in range(replicas))
+        self._hashes = [point for point, _ in points]
+        self._owners = [member for _, member in points]
+
+    def owner(self, doctor_id: int) -> str | None:
+        if not self._hashes:
+            return None
+        i = bisect.bisect(self._hashes, ring_hash(str(doctor_id))) % len(self._hashes)
+        return self._owners[i]
+
+
+class ShardMembership:
+    """
+    Keeps this worker registered as a member (a lease named member:<holder> that it
+    renews on every heartbeat) and rebuilds the ring from the unexpired members,
+    so doctors are rebalanced when a worker joins or its lease runs out.
+    """
+
+    def __init__(self, holder: str, ttl_seconds: int, session_factory=None):
+        self.holder = holder
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.ring = HashRing([])
+        # goes up each time this worker (re)joins, since others polled its doctors while it was out
+        self.term = 0
+        self._session_factory = session_factory or SessionLocal
+        self._valid_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def is_member(self) -> bool:
+        return time.monotonic() < self._valid_until
+
+    def owns(self, doctor_id: int) -> bool:
+        return self.is_member and self.ring.owner(doctor_id) == self.holder
+
+    def heartbeat(self) -> bool:
+        with self._lock:
+            started = time.monotonic()
+            now = datetime.now()
+            db = self._session_factory()
+            try:
+                lease_repo.try_acquire(db, MEMBER_PREFIX + self.holder, self.holder, now, now + self.ttl)
+                members = lease_repo.get_active_holders(db, MEMBER_PREFIX, now)
+            except Exception as e:
+                print(f"Could not renew shard membership: {e}")
+                return self.is_member
+            finally:
+                db.close()
+
+            if members != self.ring.members:
+                print(f"Shard members changed to {members}.")
+                self.ring = HashRing(members)
+            if not self.is_member:
+                self.term += 1
+            self._valid_until = started + self.ttl.total_seconds()
+            return True
+
+    def leave(self):
+        with self._lock:
+            self._valid_until = 0.0
+            db = self._session_factory()
+            try:
+                lease_repo.release(db, MEMBER_PREFIX + self.holder, self.holder)
+            except Exception as e:
+                print(f"Could not leave the shard: {e}")
+            finally:
+                db.close()
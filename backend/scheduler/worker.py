@@ -0,0 +1,77 @@
+"""
+Runs only the polling and notification pipeline, without the API:
+    python -m scheduler.worker --concurrency 50 --metrics-port 9100
+
+Start the API with MOJTERMIN_API_POLLING=0 so the two can be scaled separately.
+The API's /metrics then no longer has the scheduler, fetch and outbox metrics,
+they're served by the worker on --metrics-port (MOJTERMIN_WORKER_METRICS_PORT,
+9100 by default); give each worker on the same host its own port.
+Several workers can run side by side; the scheduler lease keeps only one of them
+polling, unless they run with --sharded and split the doctors between them.
+"""
+import argparse
+import os
+import signal
+import sys
+import threading
+from prometheus_client import start_http_server
+from database.database import create_tables, db_executor
+from scheduler import scheduler
+from services import fetcher_service
+
+METRICS_PORT = int(os.getenv("MOJTERMIN_WORKER_METRICS_PORT", "9100"))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=fetcher_service.FETCH_CONCURRENCY,
+                        help="upstream requests in flight per run")
+    parser.add_argument("--tick", type=int, default=scheduler.TICK_SECONDS,
+                        help="seconds between polling runs")
+    parser.add_argument("--outbox", type=int, default=scheduler.OUTBOX_SECONDS,
+                        help="seconds between outbox drains")
+    parser.add_argument("--sharded", action="store_true", default=scheduler.SHARDED,
+                        help="poll only this worker's share of the doctors (MOJTERMIN_SHARDED=1)")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help="serve Prometheus metrics on this port (MOJTERMIN_WORKER_METRICS_PORT, 0 to disable)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None, stop: threading.Event | None = None):
+    args = parse_args(argv)
+    stop = stop or threading.Event()
+    fetcher_service.FETCH_CONCURRENCY = args.concurrency
+    scheduler.TICK_SECONDS = args.tick
+    scheduler.OUTBOX_SECONDS = args.outbox
+    scheduler.SHARDED = args.sharded
+
+    create_tables()
+    if args.metrics_port:
+        start_http_server(args.metrics_port)
+        print(f"Serving worker metrics on port {args.metrics_port}.")
+    else:
+        print("Worker metrics are disabled, polling and outbox metrics won't be exposed anywhere.")
+
+    if threading.current_thread() is threading.main_thread():
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
+
+    print(f"Polling worker {scheduler.leader.holder} started: concurrency {args.concurrency}, "
+          f"tick {args.tick}s, outbox {args.outbox}s{', sharded' if args.sharded else ''}.")
+    background = scheduler.start_scheduler()
+    try:
+        stop.wait()
+    finally:
+        print("Polling worker stopping.")
+        background.shutdown(wait=True)
+        scheduler.leader.release()
+        if args.sharded:
+            scheduler.shards.leave()
+        if scheduler.loop_runner.running:
+            scheduler.loop_runner.run(scheduler.smtp_pool.close())
+            scheduler.loop_runner.stop()
+        db_executor.shutdown(wait=True)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
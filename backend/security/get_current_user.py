@@ -11,7 +11,10 @@ security = HTTPBearer()
 def get_current_user(
         credentials: HTTPAuthorizationCredentials = Depends(security),
         db: Session = Depends(get_db)):
-    token = credentials.credentials
+    return get_user_from_token(db, credentials.credentials)
+
+
+def get_user_from_token(db: Session, token: str):
     payload = verify_access_token(token)
     if payload is None:
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
@@ -0,0 +1,107 @@
+import asyncio
+import os
+from collections import defaultdict
+from contextlib import suppress
+from datetime import datetime
+from repos import slot_change_repo
+from services.event_hub import event_hub
+from database.database import SessionLocal, run_db
+
+# how often the change log is read for changes written by another process (the polling worker)
+TAIL_SECONDS = float(os.getenv("MOJTERMIN_CHANGE_TAIL_SECONDS", "1"))
+TAIL_BATCH = 500
+
+
+class ChangeTailer:
+    """
+    The one reader of the slot_changes log in an API process. It reads the changes after
+    its cursor every `interval` seconds and publishes them to the event hub, so open SSE
+    streams and long polls run no queries of their own however many there are, and
+    changes written by the polling worker reach them like those made here. Writes made
+    in this process call wake() to have them read right away.
+    """
+
+    def __init__(self, interval: float = TAIL_SECONDS, session_factory=SessionLocal):
+        self.interval = interval
+        self.session_factory = session_factory
+        self.cursor: int | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    async def start(self):
+        """Tail the log on the running event loop, from its current end."""
+        self.cursor = None
+        await run_db(self.read)
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._loop = None
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    def wake(self):
+        """Read the log now instead of at the next interval. Thread-safe, and a no-op while not tailing."""
+        loop = self._loop
+        if loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(self._wake.set)
+        except RuntimeError:
+            # the loop closed meanwhile
+            pass
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                while await run_db(self.read):
+                    pass
+            except Exception as e:
+                print(f"Reading the slot change log failed: {e}")
+
+    def read(self) -> bool:
+        """Publish the next batch of changes after the cursor; True when there may be more right away."""
+        db = self.session_factory()
+        try:
+            version = slot_change_repo.get_version(db)
+            if self.cursor is None:
+                self.cursor = version
+                return False
+            if slot_change_repo.is_stale_cursor(db, self.cursor, version):
+                # changes were pruned before they were read, or the database was replaced
+                self.cursor = version
+                event_hub.publish_resync()
+                return False
+            changes = slot_change_repo.get_since(db, self.cursor, limit=TAIL_BATCH)
+            if not changes:
+                return False
+            publish_changes(changes)
+            self.cursor = changes[-1].id
+            return len(changes) == TAIL_BATCH
+        finally:
+            db.close()
+
+
+def publish_changes(changes: list):
+    # the last change of each slot wins, so a slot added and removed again isn't reported as added
+    latest: dict[int, dict[datetime, str]] = defaultdict(dict)
+    for change in changes:
+        latest[change.doctor_id][change.free_slot] = change.kind
+    for doctor_id, slots in latest.items():
+        event_hub.publish_slots(doctor_id,
+                                sorted(slot for slot, kind in slots.items() if kind == "added"),
+                                sorted(slot for slot, kind in slots.items() if kind == "removed"))
+
+
+change_tailer = ChangeTailer()
@@ -1,45 +1,80 @@
 from datetime import datetime
-import requests
-from fastapi import HTTPException
-from services import timeslot_service, email_service
+from typing import Callable
+from services import timeslot_service, fetcher_service, polling_service, outbox_service, metrics
 from sqlalchemy.orm import Session
+from database.database import run_db
 
 
-def check_new_dates(db: Session, doctor_id: int, user_email: str):
-    url = f"https://mojtermin.mk/api/pp/resources/{doctor_id}/slots_availability"
-    r = requests.get(url)
+def update_doctor_slots(db: Session, doctor_id: int, content: bytes,
+                        user_emails: list[str]) -> timeslot_service.SlotDiff:
+    """
+    Reconcile the doctor's stored slots with the raw upstream payload and queue a
+    notification for every subscriber in the same transaction.
+    """
+    now = datetime.now()
+    doctor_name, new_minutes = timeslot_service.parse_slot_minutes(content)
+    diff = timeslot_service.diff_timeslots(db, doctor_id, new_minutes, now)
+    metrics.SLOT_DIFF_SIZE.labels(kind="added").observe(diff.added.size)
+    metrics.SLOT_DIFF_SIZE.labels(kind="removed").observe(diff.removed.size)
+    if diff.added.size:
+        outbox_service.stage_notifications(db, doctor_id, doctor_name, diff.added_slots, user_emails, now)
+    if diff.changed:
+        timeslot_service.apply_diff(db, doctor_id, diff)
+    return diff
 
-    if r.status_code != 200:
-        raise HTTPException(status_code=404, detail="Doctor not found or API blocked!")
 
-    doctor_data = r.json()
-    old_slots = timeslot_service.get_timeslots_by_doctor(db, doctor_id)
-    old_dates = {slot.free_slot for slot in old_slots}
-    new_dates = timeslot_service.get_timeslots_from_api(doctor_data["timeslots"])
+def apply_fetch_result(db: Session, result: fetcher_service.FetchResult,
+                       user_emails: list[str]) -> timeslot_service.SlotDiff:
+    diff = update_doctor_slots(db, result.doctor_id, result.content, user_emails)
+    polling_service.store_fingerprint(db, result.doctor_id, result, datetime.now())
+    return diff
 
-    now = datetime.now()
 
-    for old_slot in old_slots:
-        if old_slot.free_slot < now or old_slot.free_slot not in new_dates:
-            timeslot_service.delete_timeslot(db, old_slot.id)
-
-    new_free_slots = new_dates - old_dates
-
-    if new_free_slots:
-        doc_name = doctor_data["name"]
-        formatted = set()
-
-        for new_free_slot in new_free_slots:
-            timeslot_service.create_timeslot(db, doctor_id, new_free_slot)
-            formatted.add(new_free_slot.strftime("%H:%M, %d %b %Y"))
-
-        import asyncio
-        asyncio.run(
-            email_service.send_email_notification(
-                to_email=user_email,
-                subject="New Available Appointment Slot!",
-                body=f"Doctor {doc_name} has new slots available on: {formatted}"
-            )
-        )
-        return False
-    return True
+async def check_doctors(db: Session, subscribers: dict[int, list[str]], concurrency: int | None = None,
+                        base_url: str | None = None,
+                        on_checked: Callable[[int, bool | None], None] | None = None) -> dict[int, bool | None]:
+    """
+    Fetch all doctors concurrently and diff each one as soon as its
+    payload arrives. The DB work runs on the DB executor so fetches keep
+    flowing while a payload is being reconciled. Payloads identical to the last reconciled one are skipped
+    without parsing or touching the slots table. New slots are queued in the
+    email outbox, the sender job delivers them as one digest per user.
+    Returns doctor_id -> True when nothing new was found, False when new slots
+    were found and None when the check failed. Doctors that were skipped because
+    the upstream circuit is open are left out.
+    `on_checked(doctor_id, outcome)` runs on the DB executor right after each
+    doctor is done, so callers can checkpoint progress before the whole run finishes.
+    """
+    outcomes = {}
+    fingerprints = await run_db(polling_service.get_fingerprints, db, list(subscribers))
+    headers = {doctor_id: fetcher_service.conditional_headers(fingerprint.etag, fingerprint.last_modified)
+               for doctor_id, fingerprint in fingerprints.items()}
+
+    async for result in fetcher_service.fetch_all(subscribers.keys(), concurrency=concurrency, base_url=base_url,
+                                                  headers=headers):
+        doctor_id = result.doctor_id
+        if result.skipped:
+            metrics.DOCTOR_CHECKS.labels(outcome="skipped").inc()
+            continue
+
+        if polling_service.payload_unchanged(fingerprints.get(doctor_id), result):
+            metrics.DOCTOR_CHECKS.labels(outcome="not_modified").inc()
+            outcomes[doctor_id] = True
+        elif not result.ok:
+            print(f"Failed for doctor {doctor_id}: {result.error or f'status {result.status_code}'}")
+            metrics.DOCTOR_CHECKS.labels(outcome="failed").inc()
+            outcomes[doctor_id] = None
+        else:
+            try:
+                diff = await run_db(apply_fetch_result, db, result, subscribers[doctor_id])
+                metrics.DOCTOR_CHECKS.labels(outcome="changed" if diff.changed else "unchanged").inc()
+                outcomes[doctor_id] = diff.added.size == 0
+            except Exception as e:
+                print(f"Failed for doctor {doctor_id}: {e}")
+                metrics.DOCTOR_CHECKS.labels(outcome="failed").inc()
+                outcomes[doctor_id] = None
+
+        if on_checked is not None:
+            await run_db(on_checked, doctor_id, outcomes[doctor_id])
+
+    return outcomes
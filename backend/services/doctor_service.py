@@ -2,8 +2,10 @@ from fastapi import HTTPException, status
 from sqlalchemy.orm import Session
 from model.models import Doctor
 from repos import doctor_repo
-from services import timeslot_service
+from services import timeslot_service, fetcher_service, upstream_guard, metrics
+from services.version_registry import version_registry
 import requests
+import time
 
 
 def add_doctor(db: Session, doctor_id: int):
@@ -13,8 +15,33 @@ def add_doctor(db: Session, doctor_id: int):
             detail="Doctor already exists!"
         )
 
-    url = f"https://mojtermin.mk/api/pp/resources/{doctor_id}/slots_availability"
-    r = requests.get(url)
+    if not upstream_guard.circuit_breaker.allow_request():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="mojtermin.mk is temporarily unavailable, try again later"
+        )
+
+    # this request may hold the breaker's only half-open probe, see fetcher_service.fetch_slots
+    recorded = False
+    try:
+        upstream_guard.rate_limiter.acquire()
+        started = time.perf_counter()
+        try:
+            r = requests.get(fetcher_service.slots_url(doctor_id), timeout=fetcher_service.FETCH_TIMEOUT)
+        except requests.RequestException:
+            upstream_guard.record_outcome(None)
+            recorded = True
+            metrics.observe_upstream(None, time.perf_counter() - started)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="mojtermin.mk is temporarily unavailable, try again later"
+            )
+        upstream_guard.record_outcome(r.status_code)
+        recorded = True
+        metrics.observe_upstream(r.status_code, time.perf_counter() - started)
+    finally:
+        if not recorded:
+            upstream_guard.circuit_breaker.release_probe()
 
     if r.status_code != 200:
         raise HTTPException(
@@ -22,15 +49,12 @@ def add_doctor(db: Session, doctor_id: int):
             detail="Doctor not found or API blocked"
         )
 
-    doctor_data = r.json()
-    name = doctor_data["name"]
-
-    available_dates = timeslot_service.get_timeslots_from_api(doctor_data["timeslots"])
-
-    for date in available_dates:
-        timeslot_service.create_timeslot(db, doctor_id, date)
+    name, available_dates = timeslot_service.parse_slots_payload(r.content)
 
-    return doctor_repo.create(db, Doctor(id=doctor_id, full_name=name))
+    timeslot_service.log_changes(db, doctor_id, sorted(available_dates), [])
+    doctor = doctor_repo.create_with_timeslots(db, Doctor(id=doctor_id, full_name=name), available_dates)
+    version_registry.mark_stale()
+    return doctor
 
 
 def get_doctor_by_id(db: Session, doctor_id: int):
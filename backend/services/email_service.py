@@ -1,9 +1,25 @@
+import os
+import time
 import aiosmtplib
 from email.message import EmailMessage
 from fastapi import HTTPException, status
+from services import metrics
+from services.smtp_pool import SMTPPool
 
+SMTP_HOSTNAME = os.getenv("MOJTERMIN_SMTP_HOSTNAME", "smtp.mailtrap.io")
+SMTP_PORT = int(os.getenv("MOJTERMIN_SMTP_PORT", "2525"))
+SMTP_USERNAME = os.getenv("MOJTERMIN_SMTP_USERNAME", "97f1da217a3c5b")  # Mailtrap username
+SMTP_PASSWORD = os.getenv("MOJTERMIN_SMTP_PASSWORD", "ef9f0d289ed868")  # Mailtrap password
+# how many connections a pool keeps open to the SMTP server
+SMTP_POOL_SIZE = int(os.getenv("MOJTERMIN_SMTP_POOL_SIZE", "2"))
 
-async def send_email_notification(to_email: str, subject: str, body: str):
+
+def smtp_pool() -> SMTPPool:
+    return SMTPPool(hostname=SMTP_HOSTNAME, port=SMTP_PORT, username=SMTP_USERNAME, password=SMTP_PASSWORD,
+                    start_tls=False, size=SMTP_POOL_SIZE)
+
+
+async def send_email_notification(to_email: str, subject: str, body: str, pool: SMTPPool | None = None):
 
     if not to_email or not subject or not body:
         raise HTTPException(
@@ -17,18 +33,25 @@ async def send_email_notification(to_email: str, subject: str, body: str):
     message["Subject"] = subject
     message.set_content(body)
 
+    started = time.perf_counter()
     try:
-        await aiosmtplib.send(
-            message,
-            hostname="smtp.mailtrap.io",
-            port=2525,
-            username="97f1da217a3c5b",  # Mailtrap username
-            password="ef9f0d289ed868",  # Mailtrap password
-            start_tls=False,
-        )
+        if pool is not None:
+            await pool.send(message)
+        else:
+            await aiosmtplib.send(
+                message,
+                hostname=SMTP_HOSTNAME,
+                port=SMTP_PORT,
+                username=SMTP_USERNAME,
+                password=SMTP_PASSWORD,
+                start_tls=False,
+            )
+        metrics.EMAIL_SEND_SECONDS.labels(result="sent").observe(time.perf_counter() - started)
         return {"message": "Email sent successfully"}
 
     except Exception as e:
+        metrics.EMAIL_SEND_SECONDS.labels(result="failed").observe(time.perf_counter() - started)
+        metrics.EMAIL_FAILURES.inc()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to send email: {str(e)}"
@@ -0,0 +1,138 @@
+import asyncio
+import json
+import os
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Iterable
+from services import metrics
+
+# how many undelivered events a slow client may have before it's told to resync instead
+EVENT_QUEUE_SIZE = int(os.getenv("MOJTERMIN_EVENT_QUEUE_SIZE", "100"))
+
+
+def format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class Subscription:
+    def __init__(self, doctor_ids: set[int] | None, loop: asyncio.AbstractEventLoop, max_queue: int):
+        # None means every doctor
+        self.doctor_ids = doctor_ids
+        self.loop = loop
+        self.queue: asyncio.Queue[str] = asyncio.Queue(max_queue)
+        self.overflowed = False
+        self.active = True
+
+    def deliver(self, message: str):
+        # runs on the subscriber's loop
+        if self.queue.full():
+            self.overflowed = True
+            return
+        self.queue.put_nowait(message)
+
+    async def next_message(self, timeout: float) -> str | None:
+        """The next event to send, a resync event if some were dropped, or None after `timeout` idle seconds."""
+        try:
+            message = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if self.overflowed:
+            self.overflowed = False
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            return format_sse("resync", {"doctor_ids": None if self.doctor_ids is None else sorted(self.doctor_ids)})
+        return message
+
+
+class EventHub:
+    """
+    In-process fan-out of slot changes to waiting SSE streams and long polls. The change
+    tailer is its only publisher, so changes written by any process reach the waiters
+    without each of them querying the log. publish() is thread-safe and never blocks,
+    so the tailer can call it from the DB executor; each message is handed to the
+    subscriber's own event loop.
+    """
+
+    def __init__(self, max_queue: int = EVENT_QUEUE_SIZE):
+        self.max_queue = max_queue
+        self._by_doctor: dict[int, set[Subscription]] = defaultdict(set)
+        self._every_doctor: set[Subscription] = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, doctor_ids: Iterable[int] | None) -> Subscription:
+        """Subscribe the running event loop to the given doctors' changes, or to every doctor's for None."""
+        subscription = Subscription(None if doctor_ids is None else set(doctor_ids), asyncio.get_running_loop(),
+                                    self.max_queue)
+        with self._lock:
+            if subscription.doctor_ids is None:
+                self._every_doctor.add(subscription)
+            else:
+                for doctor_id in subscription.doctor_ids:
+                    self._by_doctor[doctor_id].add(subscription)
+        metrics.EVENT_SUBSCRIBERS.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if not subscription.active:
+                return
+            subscription.active = False
+            self._remove(subscription)
+        metrics.EVENT_SUBSCRIBERS.dec()
+
+    def resubscribe(self, subscription: Subscription, doctor_ids: Iterable[int]):
+        """Switch an active subscription to another set of doctors."""
+        with self._lock:
+            if not subscription.active:
+                return
+            self._remove(subscription)
+            subscription.doctor_ids = set(doctor_ids)
+            for doctor_id in subscription.doctor_ids:
+                self._by_doctor[doctor_id].add(subscription)
+
+    def _remove(self, subscription: Subscription):
+        self._every_doctor.discard(subscription)
+        for doctor_id in subscription.doctor_ids or ():
+            subscribers = self._by_doctor.get(doctor_id)
+            if subscribers is None:
+                continue
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._by_doctor[doctor_id]
+
+    def publish(self, doctor_id: int, event: str, data: dict):
+        with self._lock:
+            subscribers = [*self._by_doctor.get(doctor_id, ()), *self._every_doctor]
+        if not subscribers:
+            return
+        message = format_sse(event, data)
+        for subscription in subscribers:
+            self._deliver(subscription, message)
+
+    def publish_resync(self):
+        """Tell every subscriber to reload, e.g. when changes were lost before they could be published."""
+        with self._lock:
+            subscribers = {*self._every_doctor, *(subscription for by_doctor in self._by_doctor.values()
+                                                  for subscription in by_doctor)}
+        for subscription in subscribers:
+            doctor_ids = None if subscription.doctor_ids is None else sorted(subscription.doctor_ids)
+            self._deliver(subscription, format_sse("resync", {"doctor_ids": doctor_ids}))
+
+    def _deliver(self, subscription: Subscription, message: str):
+        try:
+            subscription.loop.call_soon_threadsafe(subscription.deliver, message)
+        except RuntimeError:
+            # the client's loop is gone, it will never read this
+            self.unsubscribe(subscription)
+
+    def publish_slots(self, doctor_id: int, added: list[datetime], removed: list[datetime]):
+        if added:
+            self.publish(doctor_id, "slots_added",
+                         {"doctor_id": doctor_id, "slots": [slot.isoformat() for slot in added]})
+        if removed:
+            self.publish(doctor_id, "slots_removed",
+                         {"doctor_id": doctor_id, "slots": [slot.isoformat() for slot in removed]})
+
+
+event_hub = EventHub()
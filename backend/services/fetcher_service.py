@@ -0,0 +1,132 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass
+from functools import cached_property
+from typing import AsyncIterator, Iterable
+import httpx
+from services import upstream_guard, metrics
+
+MOJTERMIN_RESOURCES_URL = os.getenv("MOJTERMIN_RESOURCES_URL", "https://mojtermin.mk/api/pp/resources")
+FETCH_CONCURRENCY = int(os.getenv("MOJTERMIN_FETCH_CONCURRENCY", "20"))
+FETCH_TIMEOUT = float(os.getenv("MOJTERMIN_FETCH_TIMEOUT", "10"))
+
+
+@dataclass
+class FetchResult:
+    doctor_id: int
+    status_code: int | None
+    content: bytes | None = None
+    error: str | None = None
+    elapsed: float = 0.0
+    etag: str | None = None
+    last_modified: str | None = None
+    # the request was never sent because the upstream circuit is open
+    skipped: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code == 200 and self.content is not None
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status_code == 304
+
+    @cached_property
+    def content_hash(self) -> str | None:
+        if self.content is None:
+            return None
+        return hashlib.sha256(self.content).hexdigest()
+
+    def json(self):
+        return json.loads(self.content)
+
+
+def conditional_headers(etag: str | None, last_modified: str | None) -> dict[str, str]:
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    return headers
+
+
+def slots_url(doctor_id: int, base_url: str | None = None) -> str:
+    return f"{base_url or MOJTERMIN_RESOURCES_URL}/{doctor_id}/slots_availability"
+
+
+async def fetch_slots(client: httpx.AsyncClient, doctor_id: int, base_url: str | None = None,
+                      headers: dict[str, str] | None = None) -> FetchResult:
+    if not upstream_guard.circuit_breaker.allow_request():
+        return FetchResult(doctor_id, None, error="Upstream circuit is open", skipped=True)
+    # this call may hold the breaker's only half-open probe, which must be given back
+    # even if it's cancelled or fails in an unexpected way, or the circuit never closes
+    recorded = False
+    try:
+        await upstream_guard.rate_limiter.acquire_async()
+        started = time.perf_counter()
+        try:
+            r = await client.get(slots_url(doctor_id, base_url), headers=headers)
+        except httpx.HTTPError as e:
+            elapsed = time.perf_counter() - started
+            upstream_guard.record_outcome(None)
+            recorded = True
+            metrics.observe_upstream(None, elapsed)
+            return FetchResult(doctor_id, None, error=f"{type(e).__name__}: {e}", elapsed=elapsed)
+
+        elapsed = time.perf_counter() - started
+        upstream_guard.record_outcome(r.status_code)
+        recorded = True
+        metrics.observe_upstream(r.status_code, elapsed)
+        return FetchResult(doctor_id, r.status_code, content=r.content if r.status_code == 200 else None,
+                           elapsed=elapsed,
+                           etag=r.headers.get("ETag"), last_modified=r.headers.get("Last-Modified"))
+    finally:
+        if not recorded:
+            upstream_guard.circuit_breaker.release_probe()
+
+
+async def fetch_all(doctor_ids: Iterable[int], concurrency: int | None = None, timeout: float | None = None,
+                    base_url: str | None = None,
+                    headers: dict[int, dict[str, str]] | None = None) -> AsyncIterator[FetchResult]:
+    """
+    Fetch the slots_availability payload of every doctor with at most
+    `concurrency` requests in flight, yielding results as soon as they arrive.
+    `headers` holds optional per-doctor request headers (e.g. conditional ones).
+    """
+    headers = headers or {}
+    concurrency = concurrency or FETCH_CONCURRENCY
+    pending: asyncio.Queue = asyncio.Queue()
+    results: asyncio.Queue = asyncio.Queue()
+
+    total = 0
+    for doctor_id in doctor_ids:
+        pending.put_nowait(doctor_id)
+        total += 1
+    if total == 0:
+        return
+
+    async def worker(client: httpx.AsyncClient):
+        while True:
+            try:
+                doctor_id = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                result = await fetch_slots(client, doctor_id, base_url, headers.get(doctor_id))
+            except Exception as e:
+                result = FetchResult(doctor_id, None, error=f"{type(e).__name__}: {e}")
+            await results.put(result)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=timeout or FETCH_TIMEOUT, limits=limits) as client:
+        workers = [asyncio.create_task(worker(client)) for _ in range(min(concurrency, total))]
+        try:
+            for _ in range(total):
+                yield await results.get()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
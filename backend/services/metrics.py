@@ -0,0 +1,66 @@
+from prometheus_client import Counter, Gauge, Histogram
+from services import upstream_guard
+
+UPSTREAM_FETCH_SECONDS = Histogram(
+    "mojtermin_upstream_fetch_seconds",
+    "Latency of slots_availability requests to mojtermin.mk by response status.",
+    ["status"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+)
+UPSTREAM_FAILURES = Counter(
+    "mojtermin_upstream_failures_total",
+    "Upstream requests that failed, by status code or 'error' for transport errors.",
+    ["reason"],
+)
+DOCTOR_CHECKS = Counter(
+    "mojtermin_doctor_checks_total",
+    "Doctor checks by outcome: changed, unchanged, not_modified, failed or skipped.",
+    ["outcome"],
+)
+SLOT_DIFF_SIZE = Histogram(
+    "mojtermin_slot_diff_size",
+    "Number of slots added or removed per reconciled doctor.",
+    ["kind"],
+    buckets=(0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000),
+)
+SCHEDULER_RUN_SECONDS = Histogram(
+    "mojtermin_scheduler_run_seconds",
+    "Duration of each scheduler job run.",
+    ["job"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+SCHEDULER_RUN_FAILURES = Counter(
+    "mojtermin_scheduler_run_failures_total",
+    "Scheduler job runs that raised.",
+    ["job"],
+)
+SCHEDULER_RUNS_SKIPPED = Counter(
+    "mojtermin_scheduler_runs_skipped_total",
+    "Scheduler job runs skipped because the previous run of the same job was still going.",
+    ["job"],
+)
+EMAIL_SEND_SECONDS = Histogram(
+    "mojtermin_email_send_seconds",
+    "Latency of sending one email, by result.",
+    ["result"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+EMAIL_FAILURES = Counter(
+    "mojtermin_email_failures_total",
+    "Emails that could not be sent.",
+)
+OUTBOX_PENDING = Gauge(
+    "mojtermin_outbox_pending",
+    "Outbox messages still waiting to be sent.",
+)
+EVENT_SUBSCRIBERS = Gauge(
+    "mojtermin_event_subscribers",
+    "Clients waiting on slot events, SSE streams and long polls.",
+)
+
+
+def observe_upstream(status_code: int | None, seconds: float):
+    status = "error" if status_code is None else str(status_code)
+    UPSTREAM_FETCH_SECONDS.labels(status=status).observe(seconds)
+    if upstream_guard.is_upstream_failure(status_code):
+        UPSTREAM_FAILURES.labels(reason=status).inc()
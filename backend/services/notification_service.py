@@ -0,0 +1,27 @@
+from dataclasses import dataclass
+from datetime import datetime
+
+
+@dataclass
+class DoctorUpdate:
+    doctor_id: int
+    doctor_name: str
+    new_slots: set[datetime]
+
+
+def format_digest(updates: list[DoctorUpdate]) -> tuple[str, str]:
+    updates = sorted(updates, key=lambda update: min(update.new_slots))
+
+    if len(updates) == 1:
+        subject = "New Available Appointment Slot!"
+    else:
+        subject = f"New Available Appointment Slots at {len(updates)} doctors!"
+
+    lines = ["New appointment slots are available:"]
+    for update in updates:
+        lines.append("")
+        lines.append(f"Doctor {update.doctor_name}")
+        lines.extend(f"  - {slot.strftime('%H:%M, %d %b %Y')}" for slot in sorted(update.new_slots))
+
+    return subject, "\n".join(lines)
+
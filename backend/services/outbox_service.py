@@ -0,0 +1,112 @@
+import asyncio
+import json
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Iterable
+from sqlalchemy.orm import Session
+from database.database import run_db
+from model.models import EmailOutbox
+from repos import outbox_repo
+from services import email_service, notification_service, upstream_guard
+from services.notification_service import DoctorUpdate
+from services.smtp_pool import SMTPPool
+
+OUTBOX_BATCH_SIZE = int(os.getenv("MOJTERMIN_OUTBOX_BATCH_SIZE", "50"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("MOJTERMIN_OUTBOX_MAX_ATTEMPTS", "8"))
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+
+
+def stage_notifications(db: Session, doctor_id: int, doctor_name: str, new_slots: Iterable[datetime],
+                        user_emails: list[str], now: datetime):
+    """
+    Queue one outbox row per subscriber. Nothing is committed here, so the rows
+    land in the same transaction as the slot changes they describe.
+    """
+    slots = json.dumps(sorted(slot.isoformat() for slot in new_slots))
+    outbox_repo.add_many(db, [
+        EmailOutbox(to_email=user_email, doctor_id=doctor_id, doctor_name=doctor_name, slots=slots,
+                    status="pending", attempts=0, next_attempt_at=now, created_at=now)
+        for user_email in user_emails
+    ])
+
+
+def retry_delay(attempts: int) -> float:
+    return upstream_guard.backoff_delay(attempts, RETRY_BASE_SECONDS, RETRY_MAX_SECONDS)
+
+
+def to_doctor_updates(messages: list[EmailOutbox]) -> list[DoctorUpdate]:
+    updates: dict[int, DoctorUpdate] = {}
+    for message in messages:
+        slots = {datetime.fromisoformat(slot) for slot in json.loads(message.slots)}
+        if message.doctor_id in updates:
+            updates[message.doctor_id].new_slots |= slots
+        else:
+            updates[message.doctor_id] = DoctorUpdate(message.doctor_id, message.doctor_name, slots)
+    return list(updates.values())
+
+
+def load_due_batch(db: Session, now: datetime, batch_size: int) -> dict[str, list[EmailOutbox]]:
+    by_recipient = defaultdict(list)
+    recipients = outbox_repo.get_due_recipients(db, now, batch_size)
+    if recipients:
+        for message in outbox_repo.get_due_for_recipients(db, recipients, now):
+            by_recipient[message.to_email].append(message)
+    return by_recipient
+
+
+def record_results(db: Session, by_recipient: dict[str, list[EmailOutbox]], errors: list[BaseException | None],
+                   now: datetime) -> tuple[int, int]:
+    sent = failed = 0
+    for (user_email, messages), error in zip(by_recipient.items(), errors):
+        if error is None:
+            outbox_repo.mark_sent(db, [message.id for message in messages], datetime.now())
+            sent += 1
+            continue
+        attempts = max(message.attempts for message in messages) + 1
+        next_attempt_at = now + timedelta(seconds=retry_delay(attempts))
+        outbox_repo.mark_failed(db, messages, str(getattr(error, "detail", error)), next_attempt_at,
+                                OUTBOX_MAX_ATTEMPTS)
+        failed += 1
+        print(f"Failed to notify {user_email}: {error}")
+    return sent, failed
+
+
+async def drain_outbox(db: Session, batch_size: int | None = None, now: datetime | None = None,
+                       pool: SMTPPool | None = None) -> tuple[int, int]:
+    """
+    Send every due outbox message, one digest email per recipient, batch by batch.
+    The emails of a batch go out concurrently over a shared SMTP connection pool
+    while the DB work runs on the DB executor.
+    Failed recipients are retried later with exponential backoff.
+    Returns (emails sent, emails failed).
+    """
+    batch_size = batch_size or OUTBOX_BATCH_SIZE
+    now = now or datetime.now()
+    owns_pool = pool is None
+    pool = pool or email_service.smtp_pool()
+    sent = failed = 0
+
+    try:
+        # sent rows leave the pending state and failed ones are pushed past `now`, so this terminates
+        while True:
+            by_recipient = await run_db(load_due_batch, db, now, batch_size)
+            if not by_recipient:
+                return sent, failed
+
+            digests = [notification_service.format_digest(to_doctor_updates(messages))
+                       for messages in by_recipient.values()]
+            errors = await asyncio.gather(
+                *(email_service.send_email_notification(to_email=user_email, subject=subject, body=body, pool=pool)
+                  for user_email, (subject, body) in zip(by_recipient, digests)),
+                return_exceptions=True,
+            )
+            errors = [error if isinstance(error, BaseException) else None for error in errors]
+
+            batch_sent, batch_failed = await run_db(record_results, db, by_recipient, errors, now)
+            sent += batch_sent
+            failed += batch_failed
+    finally:
+        if owns_pool:
+            await pool.close()
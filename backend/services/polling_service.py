@@ -0,0 +1,121 @@
+import math
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from sqlalchemy.orm import Session
+from model.models import DoctorPollState
+from repos import poll_state_repo
+from services import upstream_guard
+
+DEFAULT_POLL_INTERVAL = int(os.getenv("MOJTERMIN_DEFAULT_POLL_INTERVAL", "3600"))
+MIN_POLL_INTERVAL = int(os.getenv("MOJTERMIN_MIN_POLL_INTERVAL", "120"))
+MAX_POLL_INTERVAL = int(os.getenv("MOJTERMIN_MAX_POLL_INTERVAL", str(6 * 3600)))
+
+# a doctor whose slots haven't changed for this long is considered static
+STATIC_AFTER = timedelta(days=1)
+SPEEDUP_FACTOR = 0.5
+RECOVERY_FACTOR = 1.25
+SLOWDOWN_FACTOR = 1.5
+
+
+def clamp_interval(seconds: float) -> int:
+    return int(min(MAX_POLL_INTERVAL, max(MIN_POLL_INTERVAL, seconds)))
+
+
+def next_base_interval(interval: int, changed: bool, last_changed_at: datetime | None, now: datetime) -> int:
+    """
+    Halve the interval when the doctor's slots just changed, drift back towards the
+    default while it's quiet and only back off past the default once it has been static for days.
+    """
+    if changed:
+        return clamp_interval(interval * SPEEDUP_FACTOR)
+
+    if last_changed_at is None or now - last_changed_at < STATIC_AFTER:
+        if interval >= DEFAULT_POLL_INTERVAL:
+            return clamp_interval(interval)
+        return clamp_interval(min(DEFAULT_POLL_INTERVAL, interval * RECOVERY_FACTOR))
+
+    return clamp_interval(interval * SLOWDOWN_FACTOR)
+
+
+def effective_interval(interval: int, subscriber_count: int) -> int:
+    # doctors followed by many users are polled more often, logarithmically in the subscriber count
+    weight = max(1.0, math.log2(subscriber_count)) if subscriber_count > 0 else 1.0
+    return clamp_interval(interval / weight)
+
+
+def get_or_create_state(db: Session, doctor_id: int, now: datetime) -> DoctorPollState:
+    state = poll_state_repo.get_by_doctor(db, doctor_id)
+    if state is None:
+        state = poll_state_repo.save(db, DoctorPollState(
+            doctor_id=doctor_id,
+            interval_seconds=DEFAULT_POLL_INTERVAL,
+            next_poll_at=now,
+            last_changed_at=now,
+            failure_count=0
+        ))
+    return state
+
+
+def ensure_states(db: Session, doctor_ids: list[int], now: datetime):
+    """Give every doctor a poll state, due right away for doctors that never had one."""
+    poll_state_repo.add_missing(db, [
+        {"doctor_id": doctor_id, "interval_seconds": DEFAULT_POLL_INTERVAL, "next_poll_at": now,
+         "last_changed_at": now, "failure_count": 0}
+        for doctor_id in doctor_ids
+    ])
+
+
+def record_poll(db: Session, doctor_id: int, changed: bool | None, subscriber_count: int,
+                now: datetime) -> DoctorPollState:
+    """
+    Store the result of a poll and schedule the doctor's next one.
+    `changed` is None when the poll failed, which keeps the current interval
+    and backs the doctor off exponentially (with jitter) on repeated failures.
+    """
+    state = get_or_create_state(db, doctor_id, now)
+    interval = effective_interval(state.interval_seconds, subscriber_count)
+
+    if changed is None:
+        state.failure_count = (state.failure_count or 0) + 1
+        delay = upstream_guard.backoff_delay(state.failure_count, interval, MAX_POLL_INTERVAL)
+        state.next_poll_at = now + timedelta(seconds=delay)
+        return poll_state_repo.save(db, state)
+
+    state.failure_count = 0
+    state.interval_seconds = next_base_interval(state.interval_seconds, changed, state.last_changed_at, now)
+    state.last_checked_at = now
+    if changed:
+        state.last_changed_at = now
+
+    state.next_poll_at = now + timedelta(seconds=effective_interval(state.interval_seconds, subscriber_count))
+    return poll_state_repo.save(db, state)
+
+
+@dataclass(frozen=True)
+class Fingerprint:
+    """The validators of a doctor's last reconciled payload, copied out of its poll state."""
+    content_hash: str | None
+    etag: str | None
+    last_modified: str | None
+
+
+def get_fingerprints(db: Session, doctor_ids: list[int]) -> dict[int, Fingerprint]:
+    # plain copies, so reading them doesn't reload the ORM states after a commit on another thread
+    return {state.doctor_id: Fingerprint(state.content_hash, state.etag, state.last_modified)
+            for state in poll_state_repo.get_by_doctors(db, doctor_ids)}
+
+
+def payload_unchanged(fingerprint: Fingerprint | None, result) -> bool:
+    if result.not_modified:
+        return True
+    return fingerprint is not None and result.ok and fingerprint.content_hash is not None \
+        and result.content_hash == fingerprint.content_hash
+
+
+def store_fingerprint(db: Session, doctor_id: int, result, now: datetime) -> DoctorPollState:
+    state = get_or_create_state(db, doctor_id, now)
+    state.content_hash = result.content_hash
+    state.etag = result.etag
+    state.last_modified = result.last_modified
+    return poll_state_repo.save(db, state)
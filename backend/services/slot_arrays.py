@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta
+from typing import Iterable
+import numpy as np
+
+# Slots are whole minutes, so a doctor's calendar is kept as a sorted, duplicate-free
+# int64 array of minutes since the epoch (naive local time, like the stored slots).
+EPOCH = datetime(1970, 1, 1)
+MINUTE = timedelta(minutes=1)
+EMPTY = np.empty(0, dtype=np.int64)
+
+
+def to_minute(slot: datetime) -> int:
+    return (slot.replace(tzinfo=None) - EPOCH) // MINUTE
+
+
+def from_minute(minute: int) -> datetime:
+    return EPOCH + timedelta(minutes=int(minute))
+
+
+def to_array(slots: Iterable[datetime]) -> np.ndarray:
+    return from_minutes_iter(to_minute(slot) for slot in slots)
+
+
+def from_minutes_iter(minutes: Iterable[int]) -> np.ndarray:
+    return np.unique(np.fromiter(minutes, dtype=np.int64))
+
+
+def to_datetimes(minutes: np.ndarray) -> list[datetime]:
+    return [from_minute(minute) for minute in minutes.tolist()]
+
+
+def upcoming(minutes: np.ndarray, now_minute: int) -> np.ndarray:
+    """The part of a sorted array at or after `now_minute`, as a view."""
+    return minutes[np.searchsorted(minutes, now_minute, side="left"):]
+
+
+def isin_sorted(values: np.ndarray, sorted_minutes: np.ndarray) -> np.ndarray:
+    """Boolean mask of which `values` occur in `sorted_minutes`, by binary search."""
+    if sorted_minutes.size == 0:
+        return np.zeros(values.size, dtype=bool)
+    idx = np.searchsorted(sorted_minutes, values)
+    idx[idx == sorted_minutes.size] = 0
+    return sorted_minutes[idx] == values
+
+
+def diff_sorted(old: np.ndarray, new: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """(added, removed) between two sorted, duplicate-free minute arrays."""
+    return new[~isin_sorted(new, old)], old[~isin_sorted(old, new)]
@@ -0,0 +1,57 @@
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+
+SLOT_CACHE_SIZE = int(os.getenv("MOJTERMIN_SLOT_CACHE_SIZE", "10000"))
+
+
+class SlotCache:
+    """
+    Size-bounded LRU of each doctor's last-known slots as sorted epoch-minute arrays.
+    The checker diffs against it and only falls back to the database on a miss.
+    Entries may still hold slots that have since expired; readers slice them off.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[int, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, doctor_id: int) -> np.ndarray | None:
+        with self._lock:
+            minutes = self._entries.get(doctor_id)
+            if minutes is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(doctor_id)
+            self.hits += 1
+            return minutes
+
+    def put(self, doctor_id: int, minutes: np.ndarray):
+        # callers must not mutate the array afterwards, it's shared with every reader
+        minutes.flags.writeable = False
+        with self._lock:
+            self._entries[doctor_id] = minutes
+            self._entries.move_to_end(doctor_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, doctor_id: int):
+        with self._lock:
+            self._entries.pop(doctor_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, doctor_id: int) -> bool:
+        return doctor_id in self._entries
+
+
+slot_cache = SlotCache(SLOT_CACHE_SIZE)
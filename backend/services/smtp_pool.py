@@ -0,0 +1,96 @@
+import asyncio
+import aiosmtplib
+from email.message import EmailMessage
+
+
+class SMTPPool:
+    """
+    Keeps up to `size` authenticated SMTP connections open and sends many messages
+    over each one instead of paying for connect/EHLO/login on every email.
+    A connection that drops is replaced transparently and the message is retried once.
+
+    The pool is bound to the event loop it's used on; close it before that loop goes away.
+    """
+
+    def __init__(self, hostname: str, port: int, username: str | None = None, password: str | None = None,
+                 start_tls: bool | None = False, size: int = 2, timeout: float = 30):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.start_tls = start_tls
+        self.size = size
+        self.timeout = timeout
+        self.connections_opened = 0
+        self._idle: list[aiosmtplib.SMTP] = []
+        self._all: set[aiosmtplib.SMTP] = set()
+        self._semaphore = asyncio.Semaphore(size)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        client = aiosmtplib.SMTP(hostname=self.hostname, port=self.port, username=self.username,
+                                 password=self.password, start_tls=self.start_tls, timeout=self.timeout)
+        await client.connect()
+        self.connections_opened += 1
+        self._all.add(client)
+        return client
+
+    async def _discard(self, client: aiosmtplib.SMTP):
+        self._all.discard(client)
+        try:
+            client.close()
+        except Exception:
+            pass
+
+    async def _checkout(self) -> aiosmtplib.SMTP:
+        while self._idle:
+            client = self._idle.pop()
+            if client.is_connected:
+                return client
+            await self._discard(client)
+        return await self._connect()
+
+    async def send(self, message: EmailMessage):
+        async with self._semaphore:
+            client = await self._checkout()
+            try:
+                await client.send_message(message)
+            except (aiosmtplib.SMTPServerDisconnected, ConnectionError):
+                # the server closed an idle connection, try once more on a fresh one
+                await self._discard(client)
+                client = await self._connect()
+                try:
+                    await client.send_message(message)
+                except Exception:
+                    await self._discard(client)
+                    raise
+            except aiosmtplib.SMTPResponseException:
+                # the server rejected this message but the connection is still usable
+                await self._reset(client)
+                raise
+            except Exception:
+                await self._discard(client)
+                raise
+            self._idle.append(client)
+
+    async def _reset(self, client: aiosmtplib.SMTP):
+        try:
+            await client.rset()
+        except Exception:
+            await self._discard(client)
+            return
+        self._idle.append(client)
+
+    async def close(self):
+        for client in list(self._all):
+            try:
+                await client.quit()
+            except Exception:
+                pass
+            await self._discard(client)
+        self._idle.clear()
@@ -0,0 +1,124 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+from repos import slot_change_repo, doctor_repo
+from services import timeslot_service
+from services.event_hub import event_hub
+from database.database import SessionLocal
+
+# longest a client may ask a sync request to wait for changes
+LONG_POLL_MAX_SECONDS = float(os.getenv("MOJTERMIN_LONG_POLL_MAX_SECONDS", "30"))
+# changes older than this are pruned; clients with an older cursor get a full snapshot
+CHANGE_LOG_RETENTION = timedelta(days=int(os.getenv("MOJTERMIN_CHANGE_LOG_DAYS", "7")))
+FEED_LIMIT = 500
+
+
+def doctor_changes(db: Session, doctor_id: int, since: int | None) -> dict:
+    """
+    The doctor's slots added and removed after the `since` cursor, last change winning,
+    or a full snapshot of the upcoming slots when there's no usable cursor. The returned
+    `version` is the cursor for the next call. Past slots are never reported as removed,
+    clients drop them on their own.
+    """
+    if not doctor_repo.check_existence(db, doctor_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Doctor with id {doctor_id} not found.")
+
+    # read before the data, so a change committed in between is sent again rather than skipped
+    version = slot_change_repo.get_version(db)
+    if since is None or slot_change_repo.is_stale_cursor(db, since, version):
+        slots = timeslot_service.get_timeslots_by_doctor(db, doctor_id)
+        return {
+            "doctor_id": doctor_id,
+            "version": version,
+            "doctor_version": slot_change_repo.get_version(db, doctor_id),
+            "reset": True,
+            "slots": [slot.free_slot.isoformat() for slot in slots],
+            "added": [],
+            "removed": [],
+        }
+
+    latest: dict[datetime, str] = {}
+    doctor_version = 0
+    for change in slot_change_repo.get_since(db, since, doctor_id):
+        latest[change.free_slot] = change.kind
+        doctor_version = change.id
+    now = datetime.now()
+    return {
+        "doctor_id": doctor_id,
+        "version": version,
+        "doctor_version": doctor_version or slot_change_repo.get_version(db, doctor_id),
+        "reset": False,
+        "slots": [],
+        "added": [slot.isoformat() for slot, kind in sorted(latest.items()) if kind == "added" and slot >= now],
+        "removed": [slot.isoformat() for slot, kind in sorted(latest.items()) if kind == "removed"],
+    }
+
+
+def changes_since(db: Session, since: int, limit: int = FEED_LIMIT) -> dict:
+    """
+    Every doctor's changes after `since` in version order, at most `limit` of them;
+    `more` says whether to call again right away with the returned version.
+    """
+    version = slot_change_repo.get_version(db)
+    if slot_change_repo.is_stale_cursor(db, since, version):
+        return {"version": version, "reset": True, "more": False, "changes": []}
+
+    changes = slot_change_repo.get_since(db, since, limit=limit + 1)
+    more = len(changes) > limit
+    changes = changes[:limit]
+    return {
+        "version": changes[-1].id if more else max(version, changes[-1].id if changes else 0),
+        "reset": False,
+        "more": more,
+        "changes": [{"version": change.id, "doctor_id": change.doctor_id, "kind": change.kind,
+                     "free_slot": change.free_slot.isoformat()} for change in changes],
+    }
+
+
+def has_news(result: dict) -> bool:
+    return result["reset"] or bool(result.get("added") or result.get("removed") or result.get("changes"))
+
+
+def fresh_query(query, *args):
+    # a short-lived session, so a waiting request holds no pooled connection between rechecks
+    db = SessionLocal()
+    try:
+        return query(db, *args)
+    finally:
+        db.close()
+
+
+async def long_poll(db: Session, query, *args, doctor_ids: set[int] | None, wait: float) -> dict:
+    """
+    Run the blocking `query(db, *args)` and, while it finds nothing new, hold the request
+    for up to `wait` seconds. The request's session is closed before waiting. The change
+    tailer publishes every process's changes to the event hub, and each one for the
+    doctors reruns the query in a session of its own.
+    """
+    wait = min(max(wait, 0.0), LONG_POLL_MAX_SECONDS)
+    if not wait:
+        return await asyncio.to_thread(query, db, *args)
+
+    # subscribed before the first query, so a change committed right after it still wakes us
+    subscription = event_hub.subscribe(doctor_ids)
+    try:
+        deadline = time.monotonic() + wait
+        try:
+            result = await asyncio.to_thread(query, db, *args)
+        finally:
+            db.close()
+        while not has_news(result):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or await subscription.next_message(remaining) is None:
+                break
+            result = await asyncio.to_thread(fresh_query, query, *args)
+        return result
+    finally:
+        event_hub.unsubscribe(subscription)
+
+
+def prune_changes(db: Session, now: datetime) -> int:
+    return slot_change_repo.prune(db, now - CHANGE_LOG_RETENTION)
@@ -1,10 +1,41 @@
+from dataclasses import dataclass, field
 from datetime import datetime
+from functools import lru_cache
+import msgspec
+import numpy as np
 from sqlalchemy.orm import Session
 from model.models import DoctorTimeslot
-from repos import timeslot_repo, doctor_repo
+from repos import timeslot_repo, doctor_repo, slot_change_repo
+from services import slot_arrays
+from services.slot_cache import slot_cache
+from services.change_tailer import change_tailer
+from services.version_registry import version_registry
 from fastapi import HTTPException, status
 
 
+@dataclass
+class SlotDiff:
+    """
+    Added and removed slots of a doctor as sorted epoch-minute arrays (see slot_arrays),
+    plus the doctor's full upcoming calendar once the diff is applied.
+    """
+    added: np.ndarray = field(default_factory=lambda: slot_arrays.EMPTY)
+    removed: np.ndarray = field(default_factory=lambda: slot_arrays.EMPTY)
+    current: np.ndarray = field(default_factory=lambda: slot_arrays.EMPTY)
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.added.size or self.removed.size)
+
+    @property
+    def added_slots(self) -> list[datetime]:
+        return slot_arrays.to_datetimes(self.added)
+
+    @property
+    def removed_slots(self) -> list[datetime]:
+        return slot_arrays.to_datetimes(self.removed)
+
+
 def create_timeslot(db: Session, doctor_id: int, free_slot: datetime):
     doctor = doctor_repo.get_by_id(db, doctor_id)
     if not doctor:
@@ -14,18 +45,76 @@ def create_timeslot(db: Session, doctor_id: int, free_slot: datetime):
         )
 
     slot = DoctorTimeslot(doctor_id=doctor_id, free_slot=free_slot)
-    return timeslot_repo.create(db, slot)
+    log_changes(db, doctor_id, [free_slot], [])
+    created = timeslot_repo.create(db, slot)
+    slot_cache.invalidate(doctor_id)
+    version_registry.mark_stale()
+    change_tailer.wake()
+    return created
+
+
+def log_changes(db: Session, doctor_id: int, added: list[datetime], removed: list[datetime]):
+    """Append the changes to the sync log; they're committed with the caller's slot write."""
+    now = datetime.now()
+    slot_change_repo.add_many(db, [
+        {"doctor_id": doctor_id, "free_slot": slot, "kind": kind, "created_at": now}
+        for kind, slots in (("removed", removed), ("added", added)) for slot in slots
+    ])
+
+
+class ApiTimeslot(msgspec.Struct):
+    term: str
+    isAvailable: bool = False
+
+
+class SlotsAvailability(msgspec.Struct):
+    name: str
+    timeslots: dict[str, list[ApiTimeslot]] = {}
+
+
+# unknown fields such as timeslotType are skipped by the decoder without being materialized
+slots_decoder = msgspec.json.Decoder(SlotsAvailability)
+
 
+@lru_cache(maxsize=65536)
+def parse_term(term: str) -> datetime:
+    # the same terms come back on every poll of a doctor, so each string is parsed once
+    return datetime.fromisoformat(term)
 
-def get_timeslots_from_api(timeslots):
-    available_dates = set()
 
-    for key, slots in timeslots.items():
-        for slot in slots:
-            if slot.get("isAvailable"):
-                available_dates.add(datetime.fromisoformat(slot["term"]))
+@lru_cache(maxsize=65536)
+def parse_term_minute(term: str) -> int:
+    return slot_arrays.to_minute(datetime.fromisoformat(term))
 
-    return available_dates
+
+def parse_slot_minutes(content: bytes) -> tuple[str, np.ndarray]:
+    """
+    Like parse_slots_payload, but returns the available slots as a sorted
+    epoch-minute array, which is what the checker diffs with.
+    """
+    payload = slots_decoder.decode(content)
+    minutes = slot_arrays.from_minutes_iter(
+        parse_term_minute(slot.term)
+        for slots in payload.timeslots.values()
+        for slot in slots
+        if slot.isAvailable
+    )
+    return payload.name, minutes
+
+
+def parse_slots_payload(content: bytes) -> tuple[str, set[datetime]]:
+    """
+    Decode a raw slots_availability response into the doctor's name and the set of
+    available slot times. Raises msgspec.DecodeError for malformed payloads.
+    """
+    payload = slots_decoder.decode(content)
+    available_dates = {
+        parse_term(slot.term)
+        for slots in payload.timeslots.values()
+        for slot in slots
+        if slot.isAvailable
+    }
+    return payload.name, available_dates
 
 
 def get_timeslots_by_doctor(db: Session, doctor_id: int):
@@ -39,9 +128,67 @@ def get_timeslots_by_doctor(db: Session, doctor_id: int):
     return timeslot_repo.get_by_doctor(db, doctor_id)
 
 
+def expire_slots(db: Session, now: datetime) -> int:
+    return timeslot_repo.delete_expired(db, now)
+
+
 def delete_timeslot(db: Session, slot_id: int):
     slot = timeslot_repo.get_by_id(db, slot_id)
     if slot:
+        doctor_id, free_slot = slot.doctor_id, slot.free_slot
+        log_changes(db, doctor_id, [], [free_slot])
         timeslot_repo.delete(db, slot)
+        slot_cache.invalidate(doctor_id)
+        version_registry.mark_stale()
+        change_tailer.wake()
         return True
     return False
+
+
+def diff_timeslots(db: Session, doctor_id: int, new_minutes: np.ndarray, now: datetime) -> SlotDiff:
+    """
+    Compare the sorted epoch-minute array `new_minutes` with the stored upcoming slots.
+    Past slots on either side are dropped here and left to `expire_slots`.
+    """
+    now_minute = slot_arrays.to_minute(now)
+    new_minutes = slot_arrays.upcoming(new_minutes, now_minute)
+    old_minutes = slot_arrays.upcoming(get_known_slot_minutes(db, doctor_id, now), now_minute)
+    added, removed = slot_arrays.diff_sorted(old_minutes, new_minutes)
+    return SlotDiff(added=added, removed=removed, current=new_minutes)
+
+
+def get_known_slot_minutes(db: Session, doctor_id: int, now: datetime) -> np.ndarray:
+    """The doctor's last-known slots from the cache, loaded from the database on a miss."""
+    minutes = slot_cache.get(doctor_id)
+    if minutes is None:
+        minutes = np.array(timeslot_repo.get_slot_minutes(db, doctor_id, now), dtype=np.int64)
+        slot_cache.put(doctor_id, minutes)
+    return minutes
+
+
+def warm_slot_cache(db: Session, doctor_ids: list[int], now: datetime):
+    """Load the slots of the doctors that aren't cached yet with one query per chunk."""
+    missing = [doctor_id for doctor_id in doctor_ids if doctor_id not in slot_cache]
+    if not missing:
+        return
+    for doctor_id, minutes in timeslot_repo.get_slot_minutes_by_doctors(db, missing, now).items():
+        slot_cache.put(doctor_id, np.array(minutes, dtype=np.int64))
+
+
+def apply_diff(db: Session, doctor_id: int, diff: SlotDiff):
+    """
+    Write the diff (plus anything else pending in the session) in one transaction
+    and remember the result. A failed write drops the cached slots so the next
+    check reloads them. Once committed, the change tailer is woken to push it
+    to connected clients.
+    """
+    added, removed = diff.added_slots, diff.removed_slots
+    try:
+        log_changes(db, doctor_id, added, removed)
+        timeslot_repo.reconcile(db, doctor_id, removed, added)
+    except Exception:
+        slot_cache.invalidate(doctor_id)
+        raise
+    slot_cache.put(doctor_id, diff.current)
+    version_registry.mark_stale()
+    change_tailer.wake()
@@ -0,0 +1,139 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+
+UPSTREAM_RATE = float(os.getenv("MOJTERMIN_UPSTREAM_RATE", "5"))
+UPSTREAM_BURST = int(os.getenv("MOJTERMIN_UPSTREAM_BURST", "10"))
+
+BREAKER_ERROR_RATE = float(os.getenv("MOJTERMIN_BREAKER_ERROR_RATE", "0.5"))
+BREAKER_MIN_REQUESTS = int(os.getenv("MOJTERMIN_BREAKER_MIN_REQUESTS", "10"))
+BREAKER_WINDOW_SECONDS = float(os.getenv("MOJTERMIN_BREAKER_WINDOW_SECONDS", "60"))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv("MOJTERMIN_BREAKER_COOLDOWN_SECONDS", "300"))
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by every outbound call to mojtermin.mk.
+    Callers reserve a token and wait until it becomes available.
+    """
+
+    def __init__(self, rate: float, capacity: int, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = float(capacity)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token and return how many seconds the caller has to wait before using it."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class CircuitBreaker:
+    """
+    Opens when the error rate over the last `window` seconds crosses `error_rate`
+    (after at least `min_requests` calls). While open every call is rejected;
+    after `cooldown` a single probe is let through to decide whether to close again.
+    """
+
+    def __init__(self, error_rate: float, min_requests: int, window: float, cooldown: float,
+                 clock=time.monotonic):
+        self.error_rate = error_rate
+        self.min_requests = min_requests
+        self.window = window
+        self.cooldown = cooldown
+        self._clock = clock
+        self._outcomes: deque[tuple[float, bool]] = deque()
+        self._opened_at: float | None = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._opened_at is not None and self._clock() - self._opened_at < self.cooldown
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._clock() - self._opened_at < self.cooldown or self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def release_probe(self):
+        """Give the probe back without an outcome, e.g. when its request was cancelled before finishing."""
+        with self._lock:
+            if self._opened_at is not None:
+                self._probe_in_flight = False
+
+    def record_success(self):
+        self._record(True)
+
+    def record_failure(self):
+        self._record(False)
+
+    def _record(self, ok: bool):
+        with self._lock:
+            now = self._clock()
+            if self._opened_at is not None:
+                if not self._probe_in_flight:
+                    return
+                self._probe_in_flight = False
+                self._outcomes.clear()
+                self._opened_at = None if ok else now
+                return
+
+            self._outcomes.append((now, ok))
+            while self._outcomes and now - self._outcomes[0][0] > self.window:
+                self._outcomes.popleft()
+
+            failures = sum(1 for _, outcome in self._outcomes if not outcome)
+            if len(self._outcomes) >= self.min_requests and failures / len(self._outcomes) >= self.error_rate:
+                self._opened_at = now
+                print(f"Upstream circuit opened: {failures}/{len(self._outcomes)} recent calls failed.")
+
+
+def is_upstream_failure(status_code: int | None) -> bool:
+    # 404 only means the doctor doesn't exist, it says nothing about the upstream's health
+    return status_code is None or status_code in (403, 429) or status_code >= 500
+
+
+def record_outcome(status_code: int | None):
+    if is_upstream_failure(status_code):
+        circuit_breaker.record_failure()
+    else:
+        circuit_breaker.record_success()
+
+
+def backoff_delay(failure_count: int, base: float, cap: float) -> float:
+    """Exponential backoff with equal jitter for a doctor that failed `failure_count` times in a row."""
+    delay = min(cap, base * 2 ** max(0, failure_count - 1))
+    return random.uniform(delay / 2, delay)
+
+
+rate_limiter = TokenBucket(UPSTREAM_RATE, UPSTREAM_BURST)
+circuit_breaker = CircuitBreaker(BREAKER_ERROR_RATE, BREAKER_MIN_REQUESTS, BREAKER_WINDOW_SECONDS,
+                                 BREAKER_COOLDOWN_SECONDS)
@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+from datetime import datetime
+from sqlalchemy.orm import Session
+from starlette.requests import Request
+from starlette.responses import Response
+from repos import slot_change_repo, doctor_repo
+
+# how stale the versions may get when the data is written by another process (the polling worker)
+VERSION_SYNC_SECONDS = float(os.getenv("MOJTERMIN_VERSION_SYNC_SECONDS", "1"))
+
+
+class VersionRegistry:
+    """
+    Version counters behind the ETags of the read endpoints, so a conditional GET
+    is answered without running its query. A doctor's slot version is the id of its
+    latest entry in the slot_changes log (0 if it has none), read once and then kept
+    up to date from the log. Doctors are only ever added, so the number of doctors
+    versions the doctor list. Both come from the database, so every API worker
+    hands out the same tags. The counters follow the database at most every
+    `sync_seconds`, and on the next request after a write in this process.
+    """
+
+    def __init__(self, sync_seconds: float = VERSION_SYNC_SECONDS):
+        self.sync_seconds = sync_seconds
+        self._cursor: int | None = None
+        self._slots: dict[int, int] = {}
+        self._doctors = 0
+        # doctors this process has found, so a 304 is never given for one that doesn't exist
+        self._known_doctors: set[int] = set()
+        # version and first upcoming slot of the slots last served per doctor
+        self._served: dict[int, tuple[int, datetime | None]] = {}
+        self._stale = True
+        self._next_sync = 0.0
+        self._lock = threading.Lock()
+
+    def mark_stale(self):
+        """Called after a commit, so the next request picks the change up."""
+        self._stale = True
+
+    def sync(self, db: Session):
+        with self._lock:
+            if not self._stale and time.monotonic() < self._next_sync:
+                return
+            # cleared first, so a write committed while syncing marks it stale again
+            self._stale = False
+            if self._cursor is None:
+                self._cursor = slot_change_repo.get_version(db)
+            else:
+                for change in slot_change_repo.get_since(db, self._cursor):
+                    self._slots[change.doctor_id] = change.id
+                    self._cursor = change.id
+            self._doctors = doctor_repo.count(db)
+            self._next_sync = time.monotonic() + self.sync_seconds
+
+    def doctors_etag(self, db: Session) -> str:
+        self.sync(db)
+        return f'"doctors-{self._doctors}"'
+
+    def doctor_etag(self, db: Session, doctor_id: int) -> str | None:
+        """The doctor's ETag, or None if this process hasn't seen the doctor yet and has to look it up."""
+        if doctor_id not in self._known_doctors:
+            return None
+        # doctors aren't edited once added, so the list's version covers each of them as well
+        self.sync(db)
+        return f'"doctor-{doctor_id}-{self._doctors}"'
+
+    def remember_doctor(self, db: Session, doctor_id: int) -> str:
+        # doctors are never deleted, so one found once exists from then on
+        self._known_doctors.add(doctor_id)
+        return self.doctor_etag(db, doctor_id)
+
+    def slot_version(self, db: Session, doctor_id: int) -> int:
+        """Read before querying the slots, so a change committed in between only costs a cache miss."""
+        self.sync(db)
+        with self._lock:
+            version = self._slots.get(doctor_id)
+        if version is None:
+            # a change the sync applies meanwhile is newer than this read, so the max keeps it
+            version = slot_change_repo.get_version(db, doctor_id)
+            with self._lock:
+                version = self._slots[doctor_id] = max(version, self._slots.get(doctor_id, 0))
+        return version
+
+    def served_slots_etag(self, doctor_id: int, version: int) -> str | None:
+        """
+        The ETag of the doctor's upcoming slots at `version`, if they were served before
+        and none of them has passed since; past slots drop out of the list without a change.
+        """
+        with self._lock:
+            served = self._served.get(doctor_id)
+        if served is None or served[0] != version:
+            return None
+        first = served[1]
+        if first is not None and datetime.now() > first:
+            return None
+        return slots_etag(doctor_id, version, first)
+
+    def remember_slots(self, doctor_id: int, version: int, slots: list) -> str:
+        first = slots[0].free_slot if slots else None
+        with self._lock:
+            self._served[doctor_id] = (version, first)
+        return slots_etag(doctor_id, version, first)
+
+
+def slots_etag(doctor_id: int, version: int, first: datetime | None) -> str:
+    # the upcoming slots are fully determined by the version and the first slot still to come
+    return f'"slots-{doctor_id}-{version}-{int(first.timestamp()) if first else 0}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+
+def cache_headers(etag: str) -> dict[str, str]:
+    # no-cache lets browsers keep the response but makes them revalidate it every time
+    return {"ETag": etag, "Cache-Control": "no-cache"}
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag))
+
+
+version_registry = VersionRegistry()
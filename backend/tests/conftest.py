@@ -1,10 +1,27 @@
+import asyncio
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import pytest
-from sqlalchemy import create_engine
+from aiosmtpd.controller import Controller
+from unittest.mock import patch
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 from model.models import Base
 from database.database import get_db
 from fastapi.testclient import TestClient
+
+# importing main would otherwise start the real scheduler, polling mojtermin.mk into ./mojtermin.db
+os.environ["MOJTERMIN_API_POLLING"] = "0"
 from main import app
+from services import upstream_guard
+from services.change_tailer import ChangeTailer
+from services.slot_cache import SlotCache
+from services.version_registry import VersionRegistry
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 
@@ -30,13 +47,58 @@ def clean_database():
     """
     Truncate all tables before each test function.
     Keeps schema but removes data so tests don’t leak state.
+    AUTOINCREMENT counters are reset too, so change versions start from 1.
     """
     with engine.begin() as connection:
         for table in reversed(Base.metadata.sorted_tables):
             connection.execute(table.delete())
+        connection.execute(text("DELETE FROM sqlite_sequence"))
     yield
 
 
+@pytest.fixture(autouse=True)
+def fresh_upstream_guard():
+    """
+    Gives every test its own rate limiter and circuit breaker so upstream
+    failures simulated in one test can't throttle or trip the next one.
+    """
+    rate_limiter = upstream_guard.TokenBucket(rate=1000, capacity=1000)
+    circuit_breaker = upstream_guard.CircuitBreaker(error_rate=0.5, min_requests=10, window=60, cooldown=300)
+    with patch("services.upstream_guard.rate_limiter", rate_limiter), \
+            patch("services.upstream_guard.circuit_breaker", circuit_breaker):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def fresh_slot_cache():
+    """The database is emptied between tests, so the slot cache has to start empty too."""
+    cache = SlotCache(maxsize=1000)
+    with patch("services.timeslot_service.slot_cache", cache):
+        yield cache
+
+
+@pytest.fixture(autouse=True)
+def fresh_version_registry():
+    """Change ids restart with every test, so versions remembered by an earlier test must go."""
+    registry = VersionRegistry()
+    with patch("services.timeslot_service.version_registry", registry), \
+            patch("services.doctor_service.version_registry", registry), \
+            patch("routes.timeslot_router.version_registry", registry), \
+            patch("routes.doctor_router.version_registry", registry):
+        yield registry
+
+
+@pytest.fixture(autouse=True)
+def fresh_change_tailer():
+    """
+    A change tailer reading the test database. The app starts it with the TestClient;
+    tests driving streams directly start it on their own loop.
+    """
+    tailer = ChangeTailer(interval=0.05, session_factory=TestingSessionLocal)
+    with patch("main.change_tailer", tailer), patch("services.timeslot_service.change_tailer", tailer):
+        yield tailer
+
+
 @pytest.fixture()
 def db_session():
     """
@@ -69,3 +131,106 @@ def client(db_session):
         finally:
             app.dependency_overrides.pop(get_db, None)
 
+
+
+class FakeMojTerminHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            server.requests.append(self.path)
+            server.request_headers.append(dict(self.headers))
+        try:
+            time.sleep(server.delay)
+            parts = self.path.strip("/").split("/")
+            doctor_id = int(parts[1]) if len(parts) == 3 and parts[1].isdigit() else None
+            payload = server.doctors.get(doctor_id)
+            if payload is None:
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = json.dumps(payload).encode()
+            etag = f'"{hashlib.sha1(body).hexdigest()}"'
+            if server.send_etag and self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            if server.send_etag:
+                self.send_header("ETag", etag)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture()
+def fake_mojtermin():
+    """
+    Runs a local stand-in for the mojtermin.mk slots_availability API.
+    Register payloads in `server.doctors[doctor_id]` and point fetches at `server.base_url`.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeMojTerminHandler)
+    server.daemon_threads = True
+    server.doctors = {}
+    server.delay = 0.0
+    server.send_etag = False
+    server.lock = threading.Lock()
+    server.in_flight = 0
+    server.max_in_flight = 0
+    server.requests = []
+    server.request_headers = []
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}/resources"
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class FakeSMTPHandler:
+    def __init__(self):
+        self.messages = []
+        self.connections = 0
+        self.drop_after_data = False
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.connections += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        if self.drop_after_data:
+            # hang up right after acknowledging, like a server closing an idle connection
+            asyncio.get_running_loop().call_later(0.01, server.transport.close)
+        return "250 Message accepted for delivery"
+
+
+@pytest.fixture()
+def fake_smtp():
+    """
+    Runs a local SMTP stand-in. `handler.messages` holds every accepted envelope and
+    `handler.connections` counts the EHLO handshakes (one per connection).
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    handler = FakeSMTPHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    try:
+        yield handler, port
+    finally:
+        controller.stop()
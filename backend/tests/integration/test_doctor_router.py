@@ -1,16 +1,18 @@
+import json
 import pytest
+from datetime import datetime
 from unittest.mock import patch, MagicMock
-from model.models import Doctor
+from model.models import Doctor, DoctorTimeslot, SlotChange
 from fastapi import status
 
 
 @patch("services.doctor_service.requests.get")
-@patch("services.doctor_service.timeslot_service.get_timeslots_from_api", return_value=[])
-@patch("services.doctor_service.timeslot_service.create_timeslot")
-def test_add_doctor_success(mock_create, mock_timeslots, mock_get, client, db_session):
-    mock_response = MagicMock(status_code=200)
-    mock_response.json.return_value = {"name": "doctor iva", "timeslots": []}
-    mock_get.return_value = mock_response
+def test_add_doctor_success(mock_get, client, db_session):
+    content = json.dumps({"name": "doctor iva", "timeslots": {"2030-11-01": [
+        {"term": "2030-11-01T09:00:00", "isAvailable": True},
+        {"term": "2030-11-01T09:30:00", "isAvailable": False},
+    ]}}).encode()
+    mock_get.return_value = MagicMock(status_code=200, content=content)
 
     payload = {"doctor_id": 960614932}
     response = client.post("/api/doctors/add", json=payload)
@@ -22,6 +24,10 @@ def test_add_doctor_success(mock_create, mock_timeslots, mock_get, client, db_se
 
     doctor = db_session.query(Doctor).filter(Doctor.id == 960614932).first()
     assert doctor is not None
+    slots = db_session.query(DoctorTimeslot).filter(DoctorTimeslot.doctor_id == 960614932).all()
+    assert [slot.free_slot for slot in slots] == [datetime(2030, 11, 1, 9, 0)]
+    changes = db_session.query(SlotChange).filter(SlotChange.doctor_id == 960614932).all()
+    assert [(change.free_slot, change.kind) for change in changes] == [(datetime(2030, 11, 1, 9, 0), "added")]
 
 
 @pytest.mark.parametrize("doctor_ids", [
@@ -63,9 +69,7 @@ def test_add_doctor_api_code_422(mock_get, client, invalid_doctor_ids):
 
 
 @patch("services.doctor_service.requests.get")
-@patch("services.doctor_service.timeslot_service.get_timeslots_from_api", return_value=[])
-@patch("services.doctor_service.timeslot_service.create_timeslot")
-def test_add_doctor_already_exists_409(mock_create, mock_timeslots, mock_get, client, db_session):
+def test_add_doctor_already_exists_409(mock_get, client, db_session):
     doc = Doctor(id=960614932, full_name="doctor iva")
     db_session.add(doc)
     db_session.commit()
@@ -79,6 +83,8 @@ def test_add_doctor_already_exists_409(mock_create, mock_timeslots, mock_get, cl
 
     assert response.status_code == status.HTTP_409_CONFLICT
     assert response.json()["detail"] == "Doctor already exists!"
+    mock_get.assert_not_called()
+    assert db_session.query(SlotChange).count() == 0
 
 
 def test_get_all_doctors_empty(client):
@@ -128,3 +134,44 @@ def test_get_doctor_by_id_nonexistent(client):
     response = client.get("/api/doctors/999")
     assert response.status_code == 404
     assert response.json()["detail"] == "Doctor not found"
+
+
+def test_get_all_doctors_answers_a_matching_etag_with_304(client, db_session):
+    db_session.add(Doctor(id=960614932, full_name="doctor iva"))
+    db_session.commit()
+
+    first = client.get("/api/doctors/all")
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"] == "no-cache"
+
+    with patch("services.doctor_service.get_all_doctors") as mock_get_all:
+        response = client.get("/api/doctors/all", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    mock_get_all.assert_not_called()
+
+
+@patch("services.doctor_service.requests.get")
+def test_adding_a_doctor_changes_the_list_etag(mock_get, client):
+    etag = client.get("/api/doctors/all").headers["etag"]
+    mock_get.return_value = MagicMock(status_code=200, content=b'{"name": "doctor iva", "timeslots": {}}')
+    client.post("/api/doctors/add", json={"doctor_id": 960614932})
+
+    response = client.get("/api/doctors/all", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert len(response.json()) == 1
+
+
+def test_get_doctor_by_id_answers_a_matching_etag_with_304(client, db_session):
+    db_session.add(Doctor(id=960614932, full_name="doctor iva"))
+    db_session.commit()
+
+    etag = client.get("/api/doctors/960614932").headers["etag"]
+    assert client.get("/api/doctors/960614932", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/api/doctors/960614932", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_get_doctor_by_id_nonexistent_ignores_if_none_match(client):
+    assert client.get("/api/doctors/999", headers={"If-None-Match": "*"}).status_code == 404
+    assert client.get("/api/doctors/999", headers={"If-None-Match": '"doctor-999-0"'}).status_code == 404
@@ -0,0 +1,162 @@
+import asyncio
+import json
+from datetime import datetime
+import pytest
+from model.models import Doctor, DoctorSubscription, SlotChange, User
+from repos import slot_change_repo
+from routes import event_router
+from services import change_tailer as change_tailer_module, event_hub as event_hub_module, timeslot_service
+from services.event_hub import EventHub
+from tests.conftest import TestingSessionLocal
+
+
+class FakeRequest:
+    def __init__(self):
+        self.disconnected = False
+
+    async def is_disconnected(self):
+        return self.disconnected
+
+
+@pytest.fixture(autouse=True)
+def stream_database(monkeypatch):
+    monkeypatch.setattr(event_router, "SessionLocal", TestingSessionLocal)
+
+
+@pytest.fixture()
+def sample_doctor(db_session):
+    doctor = Doctor(id=1, full_name="doctor iva")
+    db_session.add(doctor)
+    db_session.commit()
+    return doctor
+
+
+@pytest.fixture()
+def hub(monkeypatch):
+    hub = EventHub()
+    monkeypatch.setattr(event_router, "event_hub", hub)
+    monkeypatch.setattr(event_hub_module, "event_hub", hub)
+    monkeypatch.setattr(change_tailer_module, "event_hub", hub)
+    return hub
+
+
+def parse(message: str) -> tuple[str, dict]:
+    event, data = message.strip().split("\n")
+    return event.removeprefix("event: "), json.loads(data.removeprefix("data: "))
+
+
+def test_doctor_stream_for_unknown_doctor_is_404(client):
+    assert client.get("/api/events/doctor/999").status_code == 404
+
+
+def test_my_stream_rejects_invalid_token(client):
+    assert client.get("/api/events/me", params={"token": "not-a-token"}).status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_stream_announces_ready_then_pushes_changes(hub, db_session, sample_doctor, fresh_change_tailer):
+    # slow reads, so only the wake-up from the write can deliver this in time
+    fresh_change_tailer.interval = 30
+    await fresh_change_tailer.start()
+    request = FakeRequest()
+    stream = event_router.slot_events(request, {1})
+
+    assert await anext(stream) == "retry: 3000\n\n"
+    assert parse(await anext(stream)) == ("ready", {"doctor_ids": [1]})
+
+    next_message = asyncio.create_task(anext(stream))
+    await asyncio.sleep(0.05)
+    await asyncio.to_thread(timeslot_service.create_timeslot, db_session, 1, datetime(2030, 1, 7, 8, 0))
+    message = await asyncio.wait_for(next_message, 5)
+    assert parse(message) == ("slots_added", {"doctor_id": 1, "slots": ["2030-01-07T08:00:00"]})
+
+    request.disconnected = True
+    await stream.aclose()
+    await fresh_change_tailer.stop()
+    assert not hub._by_doctor
+
+
+@pytest.mark.asyncio
+async def test_stream_picks_up_changes_written_by_another_process(hub, db_session, sample_doctor,
+                                                                   fresh_change_tailer):
+    await fresh_change_tailer.start()
+    stream = event_router.slot_events(FakeRequest(), {1})
+    await anext(stream)
+    await anext(stream)
+
+    # straight to the database, as the polling worker would, without waking this process
+    slot_change_repo.add_many(db_session, [
+        {"doctor_id": 1, "free_slot": datetime(2030, 1, 7, 8, 0), "kind": "added", "created_at": datetime.now()},
+        {"doctor_id": 1, "free_slot": datetime(2030, 1, 8, 8, 0), "kind": "removed", "created_at": datetime.now()},
+    ])
+    db_session.commit()
+
+    added, removed = await asyncio.wait_for(anext(stream), 5), await asyncio.wait_for(anext(stream), 5)
+    assert parse(added) == ("slots_added", {"doctor_id": 1, "slots": ["2030-01-07T08:00:00"]})
+    assert parse(removed) == ("slots_removed", {"doctor_id": 1, "slots": ["2030-01-08T08:00:00"]})
+    await stream.aclose()
+    await fresh_change_tailer.stop()
+
+
+@pytest.mark.asyncio
+async def test_many_streams_share_one_reader_of_the_change_log(hub, db_session, sample_doctor, fresh_change_tailer,
+                                                               monkeypatch):
+    reads = []
+    monkeypatch.setattr(slot_change_repo, "get_since", lambda *args, **kwargs: reads.append(args) or [])
+    streams = [event_router.slot_events(FakeRequest(), {1}) for _ in range(20)]
+    for stream in streams:
+        await anext(stream)
+        await anext(stream)
+    pending = [asyncio.create_task(anext(stream)) for stream in streams]
+
+    await fresh_change_tailer.start()
+    await asyncio.sleep(0.3)
+    await fresh_change_tailer.stop()
+
+    # one read per tailer interval, not one per stream
+    assert 0 < len(reads) <= 10
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    assert not hub._by_doctor
+
+
+@pytest.mark.asyncio
+async def test_idle_stream_sends_heartbeats(hub, monkeypatch):
+    monkeypatch.setattr(event_router, "HEARTBEAT_SECONDS", 0.01)
+    stream = event_router.slot_events(FakeRequest(), {1})
+    await anext(stream)
+    await anext(stream)
+
+    assert await anext(stream) == ": ping\n\n"
+    await stream.aclose()
+
+
+@pytest.mark.asyncio
+async def test_my_stream_follows_doctors_subscribed_after_it_opened(hub, db_session, sample_doctor, monkeypatch):
+    monkeypatch.setattr(event_router, "SUBSCRIPTION_REFRESH_SECONDS", 0.05)
+    db_session.add(User(id=1, email="a@mail.com", username="ana", password="secret"))
+    db_session.commit()
+    stream = event_router.slot_events(FakeRequest(), set(), lambda: event_router.subscribed_doctor_ids(1))
+    await anext(stream)
+    assert parse(await anext(stream)) == ("ready", {"doctor_ids": []})
+
+    db_session.add(DoctorSubscription(user_id=1, doctor_id=1))
+    db_session.commit()
+
+    assert parse(await asyncio.wait_for(anext(stream), 5)) == ("ready", {"doctor_ids": [1]})
+    hub.publish_slots(1, [datetime(2030, 1, 7, 8, 0)], [])
+    assert parse(await asyncio.wait_for(anext(stream), 5))[0] == "slots_added"
+    await stream.aclose()
+
+
+@pytest.mark.asyncio
+async def test_creating_a_slot_through_the_api_notifies_the_doctor_stream(hub, client, db_session):
+    db_session.add(Doctor(id=960614932, full_name="doctor iva"))
+    db_session.commit()
+    subscription = hub.subscribe({960614932})
+
+    await asyncio.to_thread(client.post, "/api/timeslots/add/960614932/2030-01-07T08:00:00")
+
+    message = await subscription.next_message(5)
+    assert message.startswith("event: slots_added\n")
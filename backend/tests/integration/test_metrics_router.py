@@ -0,0 +1,21 @@
+from model.models import Doctor
+
+
+def test_metrics_endpoint_exposes_prometheus_text(client):
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    for name in ("mojtermin_upstream_fetch_seconds", "mojtermin_slot_diff_size", "mojtermin_scheduler_run_seconds",
+                 "mojtermin_db_seconds", "mojtermin_email_send_seconds", "mojtermin_outbox_pending"):
+        assert name in response.text
+
+
+def test_metrics_include_db_time_of_repo_calls(client, db_session):
+    db_session.add(Doctor(id=960614932, full_name="doctor iva"))
+    db_session.commit()
+
+    client.get("/api/timeslots/doctor/960614932")
+    response = client.get("/metrics")
+
+    assert 'mojtermin_db_seconds_count{function="timeslot_repo.get_by_doctor"}' in response.text
@@ -1,7 +1,9 @@
 import pytest
+from unittest.mock import patch
 from datetime import datetime
 from sqlalchemy.orm import Session
 from model.models import Doctor, DoctorTimeslot
+from services.version_registry import VersionRegistry
 
 
 @pytest.fixture
@@ -36,8 +38,8 @@ def test_create_timeslot_doctor_not_found(client, db_session):
 
 
 def test_get_timeslots_by_doctor_existing(client, db_session, sample_doctor):
-    slot1 = DoctorTimeslot(doctor_id=sample_doctor.id, free_slot=datetime(2025, 10, 27, 8, 0, 0))
-    slot2 = DoctorTimeslot(doctor_id=sample_doctor.id, free_slot=datetime(2025, 10, 28, 14, 0, 0))
+    slot1 = DoctorTimeslot(doctor_id=sample_doctor.id, free_slot=datetime(2030, 10, 27, 8, 0, 0))
+    slot2 = DoctorTimeslot(doctor_id=sample_doctor.id, free_slot=datetime(2030, 10, 28, 14, 0, 0))
     db_session.add_all([slot1, slot2])
     db_session.commit()
 
@@ -85,3 +87,70 @@ def test_delete_timeslot_nonexistent(client):
     response = client.delete("/api/timeslots/delete/999")
     assert response.status_code == 404
     assert response.json()["detail"] == "Timeslot not found"
+
+
+def test_get_timeslot_changes_by_doctor_returns_a_snapshot_then_deltas(client, sample_doctor):
+    first = datetime(2030, 10, 27, 8, 0, 0).isoformat()
+    second = datetime(2030, 10, 28, 8, 0, 0).isoformat()
+    client.post(f"/api/timeslots/add/{sample_doctor.id}/{first}")
+
+    snapshot = client.get(f"/api/timeslots/doctor/{sample_doctor.id}/changes").json()
+    assert snapshot["reset"] and snapshot["slots"] == [first]
+
+    client.post(f"/api/timeslots/add/{sample_doctor.id}/{second}")
+    delta = client.get(f"/api/timeslots/doctor/{sample_doctor.id}/changes",
+                       params={"since": snapshot["version"]}).json()
+    assert not delta["reset"]
+    assert delta["added"] == [second]
+
+
+def test_get_timeslot_changes_by_doctor_not_found(client):
+    assert client.get("/api/timeslots/doctor/999/changes").status_code == 404
+
+
+def test_get_timeslot_changes_feed(client, sample_doctor):
+    since = client.get(f"/api/timeslots/doctor/{sample_doctor.id}/changes").json()["version"]
+    free_slot = datetime(2030, 10, 27, 8, 0, 0).isoformat()
+    client.post(f"/api/timeslots/add/{sample_doctor.id}/{free_slot}")
+
+    response = client.get("/api/timeslots/changes", params={"since": since})
+    assert response.status_code == 200
+    changes = response.json()["changes"]
+    assert [(change["doctor_id"], change["kind"], change["free_slot"]) for change in changes] == \
+        [(sample_doctor.id, "added", free_slot)]
+    assert client.get("/api/timeslots/changes").status_code == 422
+
+
+def test_get_timeslots_by_doctor_answers_a_matching_etag_with_304(client, sample_doctor):
+    free_slot = datetime(2030, 10, 27, 8, 0, 0).isoformat()
+    client.post(f"/api/timeslots/add/{sample_doctor.id}/{free_slot}")
+
+    first = client.get(f"/api/timeslots/doctor/{sample_doctor.id}")
+    etag = first.headers["etag"]
+
+    with patch("services.timeslot_service.get_timeslots_by_doctor") as mock_get:
+        response = client.get(f"/api/timeslots/doctor/{sample_doctor.id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    mock_get.assert_not_called()
+
+
+def test_slot_change_invalidates_the_timeslots_etag(client, sample_doctor):
+    etag = client.get(f"/api/timeslots/doctor/{sample_doctor.id}").headers["etag"]
+    client.post(f"/api/timeslots/add/{sample_doctor.id}/{datetime(2030, 10, 27, 8, 0, 0).isoformat()}")
+
+    response = client.get(f"/api/timeslots/doctor/{sample_doctor.id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert len(response.json()) == 1
+    assert response.headers["etag"] != etag
+
+
+def test_timeslots_etag_from_another_worker_gets_304(client, sample_doctor, fresh_version_registry):
+    client.post(f"/api/timeslots/add/{sample_doctor.id}/{datetime(2030, 10, 27, 8, 0, 0).isoformat()}")
+    etag = client.get(f"/api/timeslots/doctor/{sample_doctor.id}").headers["etag"]
+
+    with patch("routes.timeslot_router.version_registry", VersionRegistry()):
+        response = client.get(f"/api/timeslots/doctor/{sample_doctor.id}", headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
@@ -1,5 +1,6 @@
 import pytest
-from model.models import Doctor
+from datetime import datetime
+from model.models import Doctor, DoctorTimeslot
 from repos import doctor_repo
 from sqlalchemy import exc
 
@@ -110,3 +111,23 @@ def test_get_all_empty_list(db_session):
     results = doctor_repo.get_all(db_session)
     assert isinstance(results, list)
     assert len(results) == 0
+
+
+def test_create_with_timeslots_inserts_doctor_and_slots(db_session):
+    slots = {datetime(2030, 1, 1, 8, 0), datetime(2030, 1, 1, 9, 0)}
+    created = doctor_repo.create_with_timeslots(db_session, Doctor(id=960614932, full_name="doctor iva"), slots)
+
+    assert created.full_name == "doctor iva"
+    stored = db_session.query(DoctorTimeslot).filter_by(doctor_id=960614932).all()
+    assert {slot.free_slot for slot in stored} == slots
+
+
+def test_create_with_timeslots_rolls_back_on_failure(db_session):
+    db_session.add(Doctor(id=960614932, full_name="doctor iva"))
+    db_session.commit()
+
+    with pytest.raises(exc.IntegrityError):
+        doctor_repo.create_with_timeslots(db_session, Doctor(id=960614932, full_name="duplicate"),
+                                          {datetime(2030, 1, 1, 8, 0)})
+
+    assert db_session.query(DoctorTimeslot).count() == 0
@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+from repos import lease_repo
+
+NOW = datetime(2030, 1, 1, 12, 0)
+TTL = timedelta(seconds=30)
+
+
+def test_try_acquire_creates_missing_lease(db_session):
+    assert lease_repo.try_acquire(db_session, "scheduler", "a", NOW, NOW + TTL)
+
+    lease = lease_repo.get_by_name(db_session, "scheduler")
+    assert lease.holder == "a"
+    assert lease.expires_at == NOW + TTL
+
+
+def test_try_acquire_refuses_unexpired_lease_of_another_holder(db_session):
+    lease_repo.try_acquire(db_session, "scheduler", "a", NOW, NOW + TTL)
+
+    assert not lease_repo.try_acquire(db_session, "scheduler", "b", NOW + timedelta(seconds=10),
+                                      NOW + timedelta(seconds=10) + TTL)
+    assert lease_repo.get_by_name(db_session, "scheduler").holder == "a"
+
+
+def test_try_acquire_renews_own_lease(db_session):
+    lease_repo.try_acquire(db_session, "scheduler", "a", NOW, NOW + TTL)
+    later = NOW + timedelta(seconds=10)
+
+    assert lease_repo.try_acquire(db_session, "scheduler", "a", later, later + TTL)
+    assert lease_repo.get_by_name(db_session, "scheduler").expires_at == later + TTL
+
+
+def test_try_acquire_takes_over_expired_lease(db_session):
+    lease_repo.try_acquire(db_session, "scheduler", "a", NOW, NOW + TTL)
+    later = NOW + timedelta(minutes=1)
+
+    assert lease_repo.try_acquire(db_session, "scheduler", "b", later, later + TTL)
+    assert lease_repo.get_by_name(db_session, "scheduler").holder == "b"
+
+
+def test_release_only_drops_own_lease(db_session):
+    lease_repo.try_acquire(db_session, "scheduler", "a", NOW, NOW + TTL)
+
+    lease_repo.release(db_session, "scheduler", "b")
+    assert lease_repo.get_by_name(db_session, "scheduler") is not None
+
+    lease_repo.release(db_session, "scheduler", "a")
+    assert lease_repo.get_by_name(db_session, "scheduler") is None
+
+
+def test_get_active_holders_lists_unexpired_leases_with_prefix(db_session):
+    lease_repo.try_acquire(db_session, "member:b", "b", NOW, NOW + TTL)
+    lease_repo.try_acquire(db_session, "member:a", "a", NOW, NOW + TTL)
+    lease_repo.try_acquire(db_session, "member:old", "old", NOW - timedelta(minutes=5), NOW - timedelta(minutes=4))
+    lease_repo.try_acquire(db_session, "scheduler", "a", NOW, NOW + TTL)
+
+    assert lease_repo.get_active_holders(db_session, "member:", NOW) == ["a", "b"]
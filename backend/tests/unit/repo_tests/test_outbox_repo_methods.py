@@ -0,0 +1,55 @@
+import pytest
+from datetime import datetime, timedelta
+from model.models import Doctor, EmailOutbox
+from repos import outbox_repo
+
+NOW = datetime(2030, 1, 1, 12, 0)
+
+
+@pytest.fixture
+def sample_doctor(db_session):
+    doctor = Doctor(id=960614932, full_name="doctor iva")
+    db_session.add(doctor)
+    db_session.commit()
+    return doctor
+
+
+def message(to_email, next_attempt_at=NOW, status="pending"):
+    return EmailOutbox(to_email=to_email, doctor_id=960614932, doctor_name="doctor iva", slots="[]",
+                       status=status, attempts=0, next_attempt_at=next_attempt_at, created_at=NOW)
+
+
+def test_add_many_does_not_commit(db_session, sample_doctor):
+    outbox_repo.add_many(db_session, [message("a@mail.com")])
+    db_session.rollback()
+
+    assert db_session.query(EmailOutbox).count() == 0
+
+
+def test_get_due_recipients_skips_future_and_finished_messages(db_session, sample_doctor):
+    outbox_repo.add_many(db_session, [
+        message("a@mail.com"),
+        message("a@mail.com"),
+        message("b@mail.com", next_attempt_at=NOW + timedelta(minutes=5)),
+        message("c@mail.com", status="sent"),
+        message("d@mail.com"),
+    ])
+    db_session.commit()
+
+    assert outbox_repo.get_due_recipients(db_session, NOW, 10) == ["a@mail.com", "d@mail.com"]
+    assert outbox_repo.get_due_recipients(db_session, NOW, 1) == ["a@mail.com"]
+    assert outbox_repo.count_pending(db_session) == 4
+
+
+def test_mark_sent_and_mark_failed(db_session, sample_doctor):
+    outbox_repo.add_many(db_session, [message("a@mail.com"), message("b@mail.com")])
+    db_session.commit()
+    first, second = outbox_repo.get_due_for_recipients(db_session, ["a@mail.com", "b@mail.com"], NOW)
+
+    outbox_repo.mark_sent(db_session, [first.id], NOW)
+    outbox_repo.mark_failed(db_session, [second], "boom", NOW + timedelta(minutes=1), max_attempts=1)
+
+    db_session.expire_all()
+    assert db_session.get(EmailOutbox, first.id).status == "sent"
+    assert db_session.get(EmailOutbox, second.id).status == "failed"
+    assert outbox_repo.count_pending(db_session) == 0
@@ -0,0 +1,78 @@
+import pytest
+from datetime import datetime, timedelta
+from model.models import Doctor, DoctorPollState
+from repos import poll_state_repo
+
+
+@pytest.fixture
+def sample_doctors(db_session):
+    doctors = [Doctor(id=960614932, full_name="doctor iva"), Doctor(id=1096535518, full_name="doctor ana")]
+    db_session.add_all(doctors)
+    db_session.commit()
+    return doctors
+
+
+def test_save_and_get_by_doctor(db_session, sample_doctors):
+    state = DoctorPollState(doctor_id=960614932, interval_seconds=3600, next_poll_at=datetime(2025, 11, 1, 12, 0))
+    poll_state_repo.save(db_session, state)
+
+    fetched = poll_state_repo.get_by_doctor(db_session, 960614932)
+    assert fetched is not None
+    assert fetched.interval_seconds == 3600
+    assert fetched.next_poll_at == datetime(2025, 11, 1, 12, 0)
+
+
+def test_get_by_doctor_nonexistent(db_session):
+    assert poll_state_repo.get_by_doctor(db_session, 999) is None
+
+
+def test_get_by_doctors_returns_only_requested(db_session, sample_doctors):
+    for doctor in sample_doctors:
+        poll_state_repo.save(db_session, DoctorPollState(doctor_id=doctor.id, interval_seconds=3600,
+                                                         next_poll_at=datetime(2025, 11, 1, 12, 0)))
+
+    results = poll_state_repo.get_by_doctors(db_session, [1096535518, 999])
+    assert [state.doctor_id for state in results] == [1096535518]
+
+
+def test_add_missing_keeps_existing_states(db_session, sample_doctors):
+    poll_state_repo.save(db_session, DoctorPollState(doctor_id=960614932, interval_seconds=600,
+                                                     next_poll_at=datetime(2030, 1, 1, 12, 0)))
+
+    poll_state_repo.add_missing(db_session, [
+        {"doctor_id": doctor_id, "interval_seconds": 3600, "next_poll_at": datetime(2030, 1, 1, 9, 0)}
+        for doctor_id in (960614932, 1096535518)
+    ])
+
+    states = {state.doctor_id: state for state in poll_state_repo.get_by_doctors(db_session, [960614932, 1096535518])}
+    assert states[960614932].interval_seconds == 600
+    assert states[1096535518].next_poll_at == datetime(2030, 1, 1, 9, 0)
+
+
+def test_claim_due_only_claims_doctors_still_due(db_session, sample_doctors):
+    now = datetime(2030, 1, 1, 12, 0)
+    until = now + timedelta(minutes=10)
+    poll_state_repo.save(db_session, DoctorPollState(doctor_id=960614932, interval_seconds=3600, next_poll_at=now))
+    poll_state_repo.save(db_session, DoctorPollState(doctor_id=1096535518, interval_seconds=3600,
+                                                     next_poll_at=now + timedelta(minutes=1)))
+
+    assert poll_state_repo.claim_due(db_session, [960614932, 1096535518], now, until) == [960614932]
+    # a second worker racing for the same doctor gets nothing
+    assert poll_state_repo.claim_due(db_session, [960614932], now, until) == []
+    assert poll_state_repo.get_by_doctor(db_session, 960614932).next_poll_at == until
+
+
+def test_release_claims_skips_doctors_whose_poll_was_recorded(db_session, sample_doctors):
+    now = datetime(2030, 1, 1, 12, 0)
+    until = now + timedelta(minutes=10)
+    for doctor in sample_doctors:
+        poll_state_repo.save(db_session, DoctorPollState(doctor_id=doctor.id, interval_seconds=3600, next_poll_at=now))
+    poll_state_repo.claim_due(db_session, [960614932, 1096535518], now, until)
+    recorded = poll_state_repo.get_by_doctor(db_session, 960614932)
+    recorded.next_poll_at = now + timedelta(hours=1)
+    poll_state_repo.save(db_session, recorded)
+
+    poll_state_repo.release_claims(db_session, [960614932, 1096535518], until, now)
+
+    assert poll_state_repo.get_by_doctor(db_session, 960614932).next_poll_at == now + timedelta(hours=1)
+    assert poll_state_repo.get_by_doctor(db_session, 1096535518).next_poll_at == now
@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+import pytest
+from model.models import Doctor, SlotChange
+from repos import slot_change_repo
+
+NOW = datetime(2030, 1, 1, 12, 0)
+
+
+@pytest.fixture
+def doctors(db_session):
+    db_session.add_all([Doctor(id=1, full_name="doctor iva"), Doctor(id=2, full_name="doctor ana")])
+    db_session.commit()
+
+
+def log(db_session, doctor_id, kind, created_at=NOW):
+    slot_change_repo.add_many(db_session, [
+        {"doctor_id": doctor_id, "free_slot": NOW + timedelta(days=1), "kind": kind, "created_at": created_at}
+    ])
+    db_session.commit()
+    return slot_change_repo.get_version(db_session)
+
+
+def test_version_is_zero_without_changes(db_session):
+    assert slot_change_repo.get_version(db_session) == 0
+    assert slot_change_repo.get_oldest_id(db_session) is None
+
+
+def test_versions_increase_globally_and_per_doctor(db_session, doctors):
+    first = log(db_session, 1, "added")
+    second = log(db_session, 2, "added")
+
+    assert second > first
+    assert slot_change_repo.get_version(db_session, 1) == first
+    assert slot_change_repo.get_version(db_session, 2) == second
+    assert slot_change_repo.get_oldest_id(db_session) == first
+
+
+def test_get_since_filters_by_cursor_and_doctor(db_session, doctors):
+    first = log(db_session, 1, "added")
+    log(db_session, 2, "added")
+    third = log(db_session, 1, "removed")
+
+    assert [change.id for change in slot_change_repo.get_since(db_session, first, 1)] == [third]
+    assert len(slot_change_repo.get_since(db_session, first - 1)) == 3
+    assert len(slot_change_repo.get_since(db_session, first - 1, limit=2)) == 2
+
+
+def test_cursor_is_stale_once_the_changes_after_it_are_pruned(db_session, doctors):
+    first = log(db_session, 1, "added", NOW - timedelta(days=10))
+    second = log(db_session, 1, "removed")
+    version = slot_change_repo.get_version(db_session)
+    assert not slot_change_repo.is_stale_cursor(db_session, 0, version)
+
+    slot_change_repo.prune(db_session, NOW - timedelta(days=1))
+
+    assert slot_change_repo.is_stale_cursor(db_session, 0, version)
+    assert not slot_change_repo.is_stale_cursor(db_session, first, version)
+    assert slot_change_repo.is_stale_cursor(db_session, second + 1, version)
+
+
+def test_prune_drops_old_changes_but_keeps_the_newest(db_session, doctors):
+    log(db_session, 1, "added", NOW - timedelta(days=10))
+    newest = log(db_session, 1, "removed", NOW - timedelta(days=9))
+
+    assert slot_change_repo.prune(db_session, NOW) == 1
+    assert [change.id for change in db_session.query(SlotChange)] == [newest]
+    assert slot_change_repo.get_version(db_session) == newest
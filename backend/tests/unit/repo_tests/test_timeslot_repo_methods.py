@@ -2,6 +2,8 @@ import pytest
 from datetime import datetime, timedelta, timezone
 from model.models import Doctor, DoctorTimeslot
 from repos import timeslot_repo
+from services import slot_arrays
+from sqlalchemy import text
 
 
 @pytest.fixture
@@ -12,6 +14,10 @@ def sample_doctor(db_session):
     return doctor
 
 
+def upcoming_slots(db, doctor_id, now):
+    return {slot.free_slot for slot in timeslot_repo.get_by_doctor(db, doctor_id, now)}
+
+
 def test_create_timeslot(db_session, sample_doctor):
     timeslot = DoctorTimeslot(
         id=1,
@@ -63,6 +69,19 @@ def test_get_by_doctor_returns_sorted_list(db_session, sample_doctor):
     assert [s.free_slot for s in results] == ordered_slots
 
 
+def test_get_by_doctor_skips_past_slots(db_session, sample_doctor):
+    now = datetime(2030, 1, 1, 12, 0)
+    db_session.add_all([
+        DoctorTimeslot(doctor_id=sample_doctor.id, free_slot=now - timedelta(minutes=5)),
+        DoctorTimeslot(doctor_id=sample_doctor.id, free_slot=now + timedelta(minutes=5)),
+    ])
+    db_session.commit()
+
+    results = timeslot_repo.get_by_doctor(db_session, sample_doctor.id, now)
+
+    assert [slot.free_slot for slot in results] == [now + timedelta(minutes=5)]
+
+
 def test_get_by_nonexistent_doctor(db_session):
     results = timeslot_repo.get_by_doctor(db_session, 999)
     assert results == []
@@ -110,3 +129,89 @@ def test_two_slots_with_the_same_properties_dont_have_the_same_id(db_session, sa
     assert slot1.id != slot2.id
     assert slot1.doctor == slot2.doctor
     assert slot1.free_slot == slot2.free_slot
+
+
+def test_reconcile_deletes_removed_and_inserts_added(db_session, sample_doctor):
+    now = datetime(2030, 1, 1, 12, 0)
+    kept = now + timedelta(hours=1)
+    removed = now + timedelta(hours=2)
+    added = now + timedelta(hours=3)
+    db_session.add_all([DoctorTimeslot(doctor_id=sample_doctor.id, free_slot=slot) for slot in (kept, removed)])
+    db_session.commit()
+
+    timeslot_repo.reconcile(db_session, sample_doctor.id, {removed}, {added})
+
+    assert upcoming_slots(db_session, sample_doctor.id, now) == {kept, added}
+
+
+def test_reconcile_handles_more_removed_slots_than_one_chunk(db_session, sample_doctor):
+    start = datetime(2030, 1, 1, 8, 0)
+    slots = {start + timedelta(minutes=i) for i in range(timeslot_repo.BULK_CHUNK_SIZE + 10)}
+    timeslot_repo.reconcile(db_session, sample_doctor.id, set(), slots)
+
+    timeslot_repo.reconcile(db_session, sample_doctor.id, slots, set())
+
+    assert upcoming_slots(db_session, sample_doctor.id, start) == set()
+
+
+def test_reconcile_leaves_other_doctors_untouched(db_session, sample_doctor):
+    other = Doctor(id=1096535518, full_name="doctor ana")
+    slot_time = datetime(2030, 1, 1, 9, 0)
+    db_session.add_all([other, DoctorTimeslot(doctor_id=other.id, free_slot=slot_time)])
+    db_session.commit()
+
+    timeslot_repo.reconcile(db_session, sample_doctor.id, {slot_time}, set())
+
+    assert upcoming_slots(db_session, other.id, slot_time) == {slot_time}
+
+
+def test_delete_expired_removes_only_past_slots(db_session, sample_doctor):
+    now = datetime(2030, 1, 1, 12, 0)
+    upcoming = now + timedelta(minutes=1)
+    db_session.add_all([DoctorTimeslot(doctor_id=sample_doctor.id, free_slot=slot)
+                        for slot in (now - timedelta(days=3), now - timedelta(minutes=1), now, upcoming)])
+    db_session.commit()
+
+    assert timeslot_repo.delete_expired(db_session, now) == 2
+    assert timeslot_repo.delete_expired(db_session, now) == 0
+    assert {slot.free_slot for slot in db_session.query(DoctorTimeslot)} == {now, upcoming}
+
+
+def test_expiry_uses_the_free_slot_index(db_session):
+    plan = db_session.execute(text("EXPLAIN QUERY PLAN DELETE FROM free_slots WHERE free_slot < :now"),
+                              {"now": datetime(2030, 1, 1)}).all()
+
+    assert any("ix_free_slots_free_slot" in row[-1] for row in plan)
+
+
+def test_get_slot_minutes_returns_sorted_upcoming_minutes(db_session, sample_doctor):
+    now = datetime(2030, 1, 1, 8, 0)
+    slots = [datetime(2030, 1, 1, 9, 30), datetime(2030, 1, 1, 9, 0), datetime(2030, 1, 1, 7, 0)]
+    db_session.add_all([DoctorTimeslot(doctor_id=sample_doctor.id, free_slot=slot) for slot in slots])
+    db_session.commit()
+
+    result = timeslot_repo.get_slot_minutes(db_session, sample_doctor.id, now)
+
+    assert result == [slot_arrays.to_minute(datetime(2030, 1, 1, 9, 0)), slot_arrays.to_minute(datetime(2030, 1, 1, 9, 30))]
+    assert timeslot_repo.get_slot_minutes(db_session, 999, now) == []
+
+
+def test_get_slot_minutes_by_doctors_groups_per_doctor(db_session, sample_doctor):
+    other = Doctor(id=1096535518, full_name="doctor ana")
+    now = datetime(2030, 1, 1, 8, 0)
+    db_session.add_all([
+        other,
+        DoctorTimeslot(doctor_id=sample_doctor.id, free_slot=datetime(2030, 1, 1, 10, 0)),
+        DoctorTimeslot(doctor_id=sample_doctor.id, free_slot=datetime(2030, 1, 1, 9, 0)),
+        DoctorTimeslot(doctor_id=other.id, free_slot=datetime(2030, 1, 1, 7, 0)),
+    ])
+    db_session.commit()
+
+    result = timeslot_repo.get_slot_minutes_by_doctors(db_session, [sample_doctor.id, other.id, 5], now)
+
+    assert result == {
+        sample_doctor.id: [slot_arrays.to_minute(datetime(2030, 1, 1, 9, 0)),
+                           slot_arrays.to_minute(datetime(2030, 1, 1, 10, 0))],
+        other.id: [],
+        5: [],
+    }
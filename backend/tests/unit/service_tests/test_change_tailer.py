@@ -0,0 +1,111 @@
+import json
+import threading
+from datetime import datetime
+import pytest
+from model.models import Doctor, SlotChange
+from repos import slot_change_repo
+from services import change_tailer as change_tailer_module
+from services.event_hub import EventHub
+
+SLOT = datetime(2030, 1, 7, 8, 0)
+
+
+def parse(message: str) -> tuple[str, dict]:
+    event, data = message.strip().split("\n")
+    return event.removeprefix("event: "), json.loads(data.removeprefix("data: "))
+
+
+@pytest.fixture
+def hub(monkeypatch):
+    hub = EventHub()
+    monkeypatch.setattr(change_tailer_module, "event_hub", hub)
+    return hub
+
+
+@pytest.fixture
+def doctors(db_session):
+    db_session.add_all([Doctor(id=1, full_name="doctor iva"), Doctor(id=2, full_name="doctor ana")])
+    db_session.commit()
+
+
+def log(db_session, *changes):
+    slot_change_repo.add_many(db_session, [
+        {"doctor_id": doctor_id, "free_slot": slot, "kind": kind, "created_at": datetime.now()}
+        for doctor_id, slot, kind in changes
+    ])
+    db_session.commit()
+
+
+@pytest.mark.asyncio
+async def test_tailer_starts_at_the_end_of_the_log(hub, db_session, doctors, fresh_change_tailer):
+    log(db_session, (1, SLOT, "added"))
+    subscription = hub.subscribe(None)
+
+    await fresh_change_tailer.start()
+    await fresh_change_tailer.stop()
+
+    assert fresh_change_tailer.cursor == slot_change_repo.get_version(db_session)
+    assert await subscription.next_message(0.05) is None
+
+
+@pytest.mark.asyncio
+async def test_tailer_folds_each_doctors_changes_in_a_batch(hub, db_session, doctors, fresh_change_tailer):
+    await fresh_change_tailer.start()
+    await fresh_change_tailer.stop()
+    first, second = hub.subscribe({1}), hub.subscribe({2})
+    log(db_session, (1, SLOT, "added"), (2, SLOT, "added"), (1, SLOT, "removed"))
+
+    assert not fresh_change_tailer.read()
+
+    assert parse(await first.next_message(1)) == ("slots_removed", {"doctor_id": 1, "slots": [SLOT.isoformat()]})
+    assert await first.next_message(0.05) is None
+    assert parse(await second.next_message(1)) == ("slots_added", {"doctor_id": 2, "slots": [SLOT.isoformat()]})
+    assert fresh_change_tailer.cursor == slot_change_repo.get_version(db_session)
+
+
+@pytest.mark.asyncio
+async def test_tailer_reads_a_long_backlog_in_batches(hub, db_session, doctors, fresh_change_tailer, monkeypatch):
+    monkeypatch.setattr(change_tailer_module, "TAIL_BATCH", 2)
+    await fresh_change_tailer.start()
+    await fresh_change_tailer.stop()
+    log(db_session, *((1, SLOT.replace(hour=hour), "added") for hour in range(8, 13)))
+
+    assert fresh_change_tailer.read()
+    assert fresh_change_tailer.read()
+    assert not fresh_change_tailer.read()
+    assert fresh_change_tailer.cursor == 5
+
+
+@pytest.mark.asyncio
+async def test_tailer_asks_everyone_to_resync_when_changes_were_pruned_unread(hub, db_session, doctors,
+                                                                           fresh_change_tailer):
+    await fresh_change_tailer.start()
+    await fresh_change_tailer.stop()
+    subscription = hub.subscribe({1})
+    log(db_session, (1, SLOT, "added"), (1, SLOT, "removed"))
+    db_session.query(SlotChange).filter(SlotChange.id == 1).delete()
+    db_session.commit()
+
+    fresh_change_tailer.read()
+
+    assert parse(await subscription.next_message(1)) == ("resync", {"doctor_ids": [1]})
+    assert fresh_change_tailer.cursor == 2
+
+
+@pytest.mark.asyncio
+async def test_wake_from_another_thread_reads_the_log_right_away(hub, db_session, doctors, fresh_change_tailer):
+    fresh_change_tailer.interval = 30
+    await fresh_change_tailer.start()
+    subscription = hub.subscribe({1})
+    log(db_session, (1, SLOT, "added"))
+
+    thread = threading.Thread(target=fresh_change_tailer.wake)
+    thread.start()
+    thread.join()
+
+    assert parse(await subscription.next_message(1))[0] == "slots_added"
+    await fresh_change_tailer.stop()
+
+
+def test_wake_while_not_tailing_is_a_no_op(fresh_change_tailer):
+    fresh_change_tailer.wake()
@@ -1,120 +1,249 @@
+import json
+import threading
 import pytest
-from unittest.mock import patch, MagicMock
-from fastapi import HTTPException
+from unittest.mock import patch
+from sqlalchemy import event
 from datetime import datetime, timedelta
 from services import checker_service
-from model.models import DoctorTimeslot
+from model.models import Doctor, DoctorTimeslot, EmailOutbox
+from tests.conftest import engine
+
+
+def future_payload(name, *slots):
+    return {"name": name, "timeslots": {"day": [{"term": s.isoformat(), "isAvailable": True} for s in slots]}}
 
 
 @pytest.fixture
-def mock_timeslot_service():
-    return {
-        "get_by_doctor": patch("services.timeslot_service.get_timeslots_by_doctor"),
-        "get_from_api": patch("services.timeslot_service.get_timeslots_from_api"),
-        "create": patch("services.timeslot_service.create_timeslot"),
-        "delete": patch("services.timeslot_service.delete_timeslot")
-    }
+def mock_outbox_service():
+    return patch("services.checker_service.outbox_service.stage_notifications")
 
 
 @pytest.fixture
-def mock_email_service():
-    return patch("services.email_service.send_email_notification")
+def mock_reconcile():
+    return patch("services.timeslot_service.timeslot_repo.reconcile")
 
 
 @pytest.fixture
-def mock_requests():
-    return patch("requests.get")
-
-
-def test_check_new_dates_api_not_found_raises(db_session, mock_requests, mock_timeslot_service, mock_email_service):
-    with (
-        mock_requests as mock_get,
-        mock_timeslot_service["create"] as mock_create,
-        mock_email_service as mock_send
-    ):
-        mock_response = MagicMock(status_code=404)
-        mock_get.return_value = mock_response
-
-        with pytest.raises(HTTPException) as exc:
-            checker_service.check_new_dates(db_session, 999, "user@mail.com")
-
-        assert exc.value.status_code == 404
-        assert "not found" in exc.value.detail.lower()
-        mock_send.assert_not_called()
-        mock_create.assert_not_called()
-
-
-def test_check_new_dates_no_new_slots_returns_true(db_session, mock_requests, mock_timeslot_service, mock_email_service):
-    with (
-        mock_requests as mock_get,
-        mock_timeslot_service["get_by_doctor"] as mock_get_by,
-        mock_timeslot_service["get_from_api"] as mock_from_api,
-        mock_timeslot_service["create"] as mock_create,
-        mock_email_service as mock_send
-    ):
-        now = datetime.now()
-
-        mock_response = MagicMock(status_code=200)
-        mock_response.json.return_value = {"name": "doctor iva", "timeslots": []}
-        mock_get.return_value = mock_response
-
-        slot = DoctorTimeslot(doctor_id=960614932, free_slot=now + timedelta(days=1))
-        mock_get_by.return_value = [slot]
-        mock_from_api.return_value = {slot.free_slot}
-
-        result = checker_service.check_new_dates(db_session, 960614932, "user@mail.com")
-
-        assert result is True
-        mock_send.assert_not_called()
-        mock_create.assert_not_called()
-
-
-def test_check_new_dates_with_new_slots_creates_and_sends_email(db_session, mock_requests, mock_timeslot_service, mock_email_service):
-    with (
-        mock_requests as mock_get,
-        mock_timeslot_service["get_by_doctor"] as mock_get_by,
-        mock_timeslot_service["get_from_api"] as mock_from_api,
-        mock_timeslot_service["create"] as mock_create,
-        mock_email_service as mock_send
-    ):
-        now = datetime.now()
-
-        mock_response = MagicMock(status_code=200)
-        mock_response.json.return_value = {
-            "name": "doctor iva",
-            "timeslots": [{"start": "2025-10-30T10:00:00"}]
-        }
-        mock_get.return_value = mock_response
-
-        old_slot = DoctorTimeslot(id=1, doctor_id=960614932, free_slot=now + timedelta(days=1))
-        mock_get_by.return_value = [old_slot]
-        mock_from_api.return_value = {datetime(2025, 10, 30, 10, 0)}
-
-        result = checker_service.check_new_dates(db_session, 960614932, "user@mail.com")
-
-        assert result is False
-        mock_create.assert_called_once()
-        mock_send.assert_called_once()
-
-
-def test_check_new_dates_deletes_expired_slots(db_session, mock_requests, mock_timeslot_service, mock_email_service):
-    with (
-        mock_requests as mock_get,
-        mock_timeslot_service["get_by_doctor"] as mock_get_by,
-        mock_timeslot_service["get_from_api"] as mock_from_api,
-        mock_timeslot_service["delete"] as mock_delete,
-    ):
-        now = datetime.now()
-
-        mock_response = MagicMock(status_code=200)
-        mock_response.json.return_value = {"name": "doctor iva", "timeslots": []}
-        mock_get.return_value = mock_response
-
-        expired_slot = DoctorTimeslot(id=1, doctor_id=960614932, free_slot=now - timedelta(days=1))
-        mock_get_by.return_value = [expired_slot]
-        mock_from_api.return_value = set()
-
-        result = checker_service.check_new_dates(db_session, 960614932, "old@mail.com")
-
-        assert result is True
-        mock_delete.assert_called_once_with(db_session, expired_slot.id)
+def sample_doctor(db_session):
+    doctor = Doctor(id=960614932, full_name="doctor iva")
+    db_session.add(doctor)
+    db_session.commit()
+    return doctor
+
+
+@pytest.mark.asyncio
+async def test_check_doctors_upstream_not_found_is_a_failed_check(db_session, fake_mojtermin, mock_reconcile,
+                                                                  mock_outbox_service):
+    with mock_reconcile as mock_write, mock_outbox_service as mock_stage:
+        outcomes = await checker_service.check_doctors(db_session, {999: ["user@mail.com"]},
+                                                       base_url=fake_mojtermin.base_url)
+
+    assert outcomes == {999: None}
+    mock_stage.assert_not_called()
+    mock_write.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_check_doctors_without_new_slots_returns_true(db_session, sample_doctor, fake_mojtermin,
+                                                            mock_reconcile, mock_outbox_service):
+    slot = (datetime.now() + timedelta(days=1)).replace(second=0, microsecond=0)
+    db_session.add(DoctorTimeslot(doctor_id=sample_doctor.id, free_slot=slot))
+    db_session.commit()
+    fake_mojtermin.doctors[sample_doctor.id] = future_payload("doctor iva", slot)
+
+    with mock_reconcile as mock_write, mock_outbox_service as mock_stage:
+        outcomes = await checker_service.check_doctors(db_session, {sample_doctor.id: ["user@mail.com"]},
+                                                       base_url=fake_mojtermin.base_url)
+
+    assert outcomes == {sample_doctor.id: True}
+    mock_stage.assert_not_called()
+    mock_write.assert_not_called()
+
+
+def test_update_doctor_slots_with_new_slots_reconciles_and_queues_email(db_session, sample_doctor,
+                                                                       mock_outbox_service):
+    old_slot = (datetime.now() + timedelta(days=1)).replace(second=0, microsecond=0)
+    new_slot = datetime(2030, 10, 30, 10, 0)
+    db_session.add(DoctorTimeslot(doctor_id=sample_doctor.id, free_slot=old_slot))
+    db_session.commit()
+    content = json.dumps(future_payload("doctor iva", new_slot)).encode()
+
+    with mock_outbox_service as mock_stage:
+        diff = checker_service.update_doctor_slots(db_session, sample_doctor.id, content, ["user@mail.com"])
+
+    assert diff.added_slots == [new_slot]
+    assert diff.removed_slots == [old_slot]
+    stored = db_session.query(DoctorTimeslot).filter_by(doctor_id=sample_doctor.id).all()
+    assert [slot.free_slot for slot in stored] == [new_slot]
+    mock_stage.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_check_doctors_ignores_past_slots_from_upstream(db_session, sample_doctor, fake_mojtermin,
+                                                              mock_reconcile, mock_outbox_service):
+    fake_mojtermin.doctors[sample_doctor.id] = future_payload("doctor iva", datetime.now() - timedelta(hours=1))
+
+    with mock_reconcile as mock_write, mock_outbox_service as mock_stage:
+        outcomes = await checker_service.check_doctors(db_session, {sample_doctor.id: ["old@mail.com"]},
+                                                       base_url=fake_mojtermin.base_url)
+
+    assert outcomes == {sample_doctor.id: True}
+    mock_stage.assert_not_called()
+    mock_write.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_check_doctors_notifies_every_subscriber_once(db_session, sample_doctor, fake_mojtermin,
+                                                            mock_outbox_service):
+    fake_mojtermin.doctors[sample_doctor.id] = future_payload("doctor iva", datetime(2030, 10, 30, 10, 0))
+    emails = ["first@mail.com", "second@mail.com", "third@mail.com"]
+
+    with mock_outbox_service as mock_stage:
+        outcomes = await checker_service.check_doctors(db_session, {sample_doctor.id: emails},
+                                                       base_url=fake_mojtermin.base_url)
+
+    assert outcomes == {sample_doctor.id: False}
+    assert len(fake_mojtermin.requests) == 1
+    mock_stage.assert_called_once()
+    assert mock_stage.call_args.args[4] == emails
+
+
+@pytest.mark.asyncio
+async def test_check_doctors_fetches_each_doctor_once_and_diffs_results(db_session, fake_mojtermin):
+    db_session.add_all([Doctor(id=1, full_name="doctor iva"), Doctor(id=2, full_name="doctor ana")])
+    db_session.commit()
+    future = (datetime.now() + timedelta(days=3)).replace(second=0, microsecond=0)
+    fake_mojtermin.doctors[1] = {
+        "name": "doctor iva",
+        "timeslots": {"day": [{"term": future.isoformat(), "isAvailable": True}]}
+    }
+    fake_mojtermin.doctors[2] = {"name": "doctor ana", "timeslots": {}}
+
+    outcomes = await checker_service.check_doctors(
+        db_session, {1: ["a@mail.com", "b@mail.com"], 2: ["a@mail.com"], 3: ["c@mail.com"]},
+        concurrency=2, base_url=fake_mojtermin.base_url
+    )
+
+    assert outcomes == {1: False, 2: True, 3: None}
+    assert len(fake_mojtermin.requests) == 3
+    queued = db_session.query(EmailOutbox).all()
+    assert sorted(message.to_email for message in queued) == ["a@mail.com", "b@mail.com"]
+    assert all(message.doctor_id == 1 for message in queued)
+    stored = db_session.query(DoctorTimeslot).filter_by(doctor_id=1).all()
+    assert [slot.free_slot for slot in stored] == [future]
+
+
+@pytest.mark.asyncio
+async def test_check_doctors_reports_each_outcome_as_it_completes(db_session, fake_mojtermin):
+    db_session.add(Doctor(id=1, full_name="doctor iva"))
+    db_session.commit()
+    fake_mojtermin.doctors[1] = {"name": "doctor iva", "timeslots": {}}
+    checked = []
+
+    outcomes = await checker_service.check_doctors(db_session, {1: ["a@mail.com"], 2: ["b@mail.com"]},
+                                                   base_url=fake_mojtermin.base_url,
+                                                   on_checked=lambda doctor_id, outcome: checked.append(
+                                                       (doctor_id, outcome, threading.current_thread().name)))
+
+    assert sorted((doctor_id, outcome) for doctor_id, outcome, _ in checked) == sorted(outcomes.items())
+    assert all(thread.startswith("db") for _, _, thread in checked)
+
+
+@pytest.mark.asyncio
+async def test_check_doctors_skips_diff_when_payload_is_unchanged(db_session, fake_mojtermin):
+    db_session.add(Doctor(id=1, full_name="doctor iva"))
+    db_session.commit()
+    future = (datetime.now() + timedelta(days=3)).replace(second=0, microsecond=0)
+    fake_mojtermin.doctors[1] = future_payload("doctor iva", future)
+
+    await checker_service.check_doctors(db_session, {1: ["a@mail.com"]}, base_url=fake_mojtermin.base_url)
+
+    with patch("services.checker_service.update_doctor_slots") as mock_update:
+        outcomes = await checker_service.check_doctors(db_session, {1: ["a@mail.com"]},
+                                                       base_url=fake_mojtermin.base_url)
+
+    assert outcomes == {1: True}
+    mock_update.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_check_doctors_sends_conditional_request_and_handles_304(db_session, fake_mojtermin):
+    db_session.add(Doctor(id=1, full_name="doctor iva"))
+    db_session.commit()
+    fake_mojtermin.send_etag = True
+    future = (datetime.now() + timedelta(days=3)).replace(second=0, microsecond=0)
+    fake_mojtermin.doctors[1] = future_payload("doctor iva", future)
+
+    await checker_service.check_doctors(db_session, {1: ["a@mail.com"]}, base_url=fake_mojtermin.base_url)
+
+    with patch("services.checker_service.update_doctor_slots") as mock_update:
+        outcomes = await checker_service.check_doctors(db_session, {1: ["a@mail.com"]},
+                                                       base_url=fake_mojtermin.base_url)
+
+    assert outcomes == {1: True}
+    mock_update.assert_not_called()
+    assert "If-None-Match" not in fake_mojtermin.request_headers[0]
+    assert fake_mojtermin.request_headers[1]["If-None-Match"].startswith('"')
+
+
+@pytest.mark.asyncio
+async def test_check_doctors_diffs_again_when_payload_changes(db_session, fake_mojtermin):
+    db_session.add(Doctor(id=1, full_name="doctor iva"))
+    db_session.commit()
+    first = (datetime.now() + timedelta(days=3)).replace(second=0, microsecond=0)
+    second = first + timedelta(hours=1)
+    fake_mojtermin.doctors[1] = future_payload("doctor iva", first)
+
+    await checker_service.check_doctors(db_session, {1: ["a@mail.com"]}, base_url=fake_mojtermin.base_url)
+    fake_mojtermin.doctors[1] = future_payload("doctor iva", first, second)
+    outcomes = await checker_service.check_doctors(db_session, {1: ["a@mail.com"]},
+                                                   base_url=fake_mojtermin.base_url)
+
+    assert outcomes == {1: False}
+    assert db_session.query(EmailOutbox).count() == 2
+    stored = {slot.free_slot for slot in db_session.query(DoctorTimeslot).filter_by(doctor_id=1).all()}
+    assert stored == {first, second}
+
+
+@pytest.mark.asyncio
+async def test_check_doctors_queues_notifications_with_the_slot_changes(db_session, fake_mojtermin):
+    db_session.add(Doctor(id=1, full_name="doctor iva"))
+    db_session.commit()
+    future = (datetime.now() + timedelta(days=3)).replace(second=0, microsecond=0)
+    fake_mojtermin.doctors[1] = future_payload("doctor iva", future)
+
+    with patch("services.timeslot_service.timeslot_repo.reconcile", side_effect=Exception("disk full")):
+        outcomes = await checker_service.check_doctors(db_session, {1: ["a@mail.com"]},
+                                                       base_url=fake_mojtermin.base_url)
+
+    assert outcomes == {1: None}
+    db_session.rollback()
+    assert db_session.query(EmailOutbox).count() == 0
+
+
+@pytest.mark.asyncio
+async def test_check_doctors_only_queries_on_the_db_executor(db_session, fake_mojtermin):
+    db_session.add_all([Doctor(id=1, full_name="doctor iva"), Doctor(id=2, full_name="doctor ana")])
+    db_session.commit()
+    future = (datetime.now() + timedelta(days=3)).replace(second=0, microsecond=0)
+    fake_mojtermin.doctors[1] = future_payload("doctor iva", future)
+    fake_mojtermin.doctors[2] = future_payload("doctor ana", future)
+    await checker_service.check_doctors(db_session, {1: ["a@mail.com"], 2: ["b@mail.com"]},
+                                        base_url=fake_mojtermin.base_url)
+    # doctor 1 changes, so its commit expires everything the session loaded before doctor 2 is checked
+    fake_mojtermin.doctors[1] = future_payload("doctor iva", future, future + timedelta(hours=1))
+    threads = []
+
+    def record_thread(*args):
+        threads.append(threading.current_thread().name)
+
+    event.listen(engine, "before_cursor_execute", record_thread)
+    try:
+        outcomes = await checker_service.check_doctors(db_session, {1: ["a@mail.com"], 2: ["b@mail.com"]},
+                                                       base_url=fake_mojtermin.base_url,
+                                                       on_checked=lambda doctor_id, outcome: None)
+    finally:
+        event.remove(engine, "before_cursor_execute", record_thread)
+
+    assert outcomes == {1: False, 2: True}
+    assert threads and all(thread.startswith("db") for thread in threads)
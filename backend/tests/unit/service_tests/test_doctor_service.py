@@ -1,8 +1,11 @@
+import json
+import msgspec
 import pytest
 from fastapi import HTTPException, status
 from unittest.mock import patch, MagicMock
-from model.models import Doctor
-from services import doctor_service
+from datetime import datetime
+from model.models import Doctor, DoctorTimeslot, SlotChange
+from services import doctor_service, upstream_guard
 
 
 @pytest.fixture
@@ -10,15 +13,14 @@ def mock_repo():
     return {
         "check_existence": patch("services.doctor_service.doctor_repo.check_existence"),
         "get_by_id": patch("services.doctor_service.get_doctor_by_id"),
-        "create": patch("services.doctor_service.doctor_repo.create"),
+        "create": patch("services.doctor_service.doctor_repo.create_with_timeslots"),
     }
 
 
 @pytest.fixture
 def mock_timeslot_service():
     return {
-        "get_timeslots": patch("services.doctor_service.timeslot_service.get_timeslots_from_api"),
-        "create_timeslot": patch("services.doctor_service.timeslot_service.create_timeslot"),
+        "parse_payload": patch("services.doctor_service.timeslot_service.parse_slots_payload"),
     }
 
 
@@ -32,21 +34,16 @@ def test_add_doctor_success_returns_multiple_slots(db_session, mock_repo, mock_t
         mock_repo["check_existence"] as mock_check,
         mock_repo["get_by_id"] as mock_get_by_id,
         mock_repo["create"] as mock_create,
-        mock_timeslot_service["get_timeslots"] as mock_get_timeslots,
-        mock_timeslot_service["create_timeslot"] as mock_create_timeslot,
+        mock_timeslot_service["parse_payload"] as mock_parse,
         mock_requests as mock_get
     ):
         mock_check.return_value = False
         mock_get_by_id.return_value = None
 
-        mock_response = MagicMock(status_code=200)
-        mock_response.json.return_value = {
-            "name": "doctor iva",
-            "timeslots": ["2025-10-23T10:00", "2025-10-23T11:00"]
-        }
-
+        slots = {datetime(2030, 10, 23, 10, 0), datetime(2030, 10, 23, 11, 0)}
+        mock_response = MagicMock(status_code=200, content=b'{"name": "doctor iva", "timeslots": {}}')
         mock_get.return_value = mock_response
-        mock_get_timeslots.return_value = ["2025-10-23T10:00", "2025-10-23T11:00"]
+        mock_parse.return_value = ("doctor iva", slots)
 
         doctor_instance = Doctor(id=960614932, full_name="doctor iva")
         mock_create.return_value = doctor_instance
@@ -57,9 +54,9 @@ def test_add_doctor_success_returns_multiple_slots(db_session, mock_repo, mock_t
         assert result.full_name == "doctor iva"
         mock_check.assert_called_once_with(db_session, 960614932)
         mock_get.assert_called_once()
-        mock_get_timeslots.assert_called_once_with(["2025-10-23T10:00", "2025-10-23T11:00"])
-        assert mock_create_timeslot.call_count == 2
+        mock_parse.assert_called_once_with(mock_response.content)
         mock_create.assert_called_once()
+        assert mock_create.call_args.args[2] == slots
 
 
 def test_add_doctor_with_no_available_dates_creates_doctor_only(db_session, mock_repo, mock_timeslot_service,
@@ -68,17 +65,15 @@ def test_add_doctor_with_no_available_dates_creates_doctor_only(db_session, mock
         mock_repo["check_existence"] as mock_check,
         mock_repo["get_by_id"] as mock_get_by_id,
         mock_repo["create"] as mock_create,
-        mock_timeslot_service["get_timeslots"] as mock_get_timeslots,
-        mock_timeslot_service["create_timeslot"] as mock_create_timeslot,
+        mock_timeslot_service["parse_payload"] as mock_parse,
         mock_requests as mock_get
     ):
         mock_check.return_value = False
         mock_get_by_id.return_value = None
 
-        mock_response = MagicMock(status_code=200)
-        mock_response.json.return_value = {"name": "doctor iva", "timeslots": []}
+        mock_response = MagicMock(status_code=200, content=b'{"name": "doctor iva", "timeslots": {}}')
         mock_get.return_value = mock_response
-        mock_get_timeslots.return_value = []
+        mock_parse.return_value = ("doctor iva", set())
 
         doctor_instance = Doctor(id=960614932, full_name="doctor iva")
         mock_create.return_value = doctor_instance
@@ -89,9 +84,9 @@ def test_add_doctor_with_no_available_dates_creates_doctor_only(db_session, mock
         assert result.full_name == "doctor iva"
         mock_check.assert_called_once_with(db_session, 960614932)
         mock_get.assert_called_once()
-        mock_get_timeslots.assert_called_once_with([])
-        mock_create_timeslot.assert_not_called()
+        mock_parse.assert_called_once_with(mock_response.content)
         mock_create.assert_called_once()
+        assert mock_create.call_args.args[2] == set()
 
 
 def test_add_doctor_already_exists_raises(db_session, mock_repo):
@@ -179,3 +174,78 @@ def test_get_all_doctors_returns_empty_list_when_no_doctors(db_session):
     result = doctor_service.get_all_doctors(db_session)
     assert result == []
     assert len(result) == 0
+
+
+def test_add_doctor_rejected_while_upstream_circuit_is_open(db_session, mock_repo, mock_requests):
+    with (
+        mock_repo["check_existence"] as mock_check,
+        mock_repo["create"] as mock_create,
+        mock_requests as mock_get,
+        patch("services.doctor_service.upstream_guard.circuit_breaker") as mock_breaker
+    ):
+        mock_check.return_value = False
+        mock_breaker.allow_request.return_value = False
+
+        with pytest.raises(HTTPException) as exc:
+            doctor_service.add_doctor(db_session, 960614932)
+
+        assert exc.value.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        mock_get.assert_not_called()
+        mock_create.assert_not_called()
+
+
+def test_add_doctor_stores_doctor_and_slots_together(db_session, mock_requests):
+    with mock_requests as mock_get:
+        mock_response = MagicMock(status_code=200, content=json.dumps({
+            "name": "doctor iva",
+            "timeslots": {"2030-11-01": [
+                {"term": "2030-11-07T08:15:00", "isAvailable": True},
+                {"term": "2030-11-07T08:40:00", "isAvailable": True},
+            ]}
+        }).encode())
+        mock_get.return_value = mock_response
+
+        result = doctor_service.add_doctor(db_session, 960614932)
+
+    assert result.id == 960614932
+    slots = db_session.query(DoctorTimeslot).filter_by(doctor_id=960614932).all()
+    assert sorted(slot.free_slot for slot in slots) == [datetime(2030, 11, 7, 8, 15), datetime(2030, 11, 7, 8, 40)]
+    changes = db_session.query(SlotChange).order_by(SlotChange.id).all()
+    assert [(change.kind, change.free_slot) for change in changes] == \
+        [("added", datetime(2030, 11, 7, 8, 15)), ("added", datetime(2030, 11, 7, 8, 40))]
+
+
+def half_open_breaker() -> upstream_guard.CircuitBreaker:
+    clock = [0.0]
+    breaker = upstream_guard.CircuitBreaker(error_rate=0.5, min_requests=2, window=60, cooldown=30,
+                                            clock=lambda: clock[0])
+    breaker.record_failure()
+    breaker.record_failure()
+    clock[0] = 31
+    return breaker
+
+
+def test_add_doctor_gives_back_the_half_open_probe_on_an_unexpected_error(db_session, mock_requests, monkeypatch):
+    breaker = half_open_breaker()
+    monkeypatch.setattr(upstream_guard, "circuit_breaker", breaker)
+
+    with mock_requests as mock_get:
+        mock_get.side_effect = ValueError("unexpected")
+        with pytest.raises(ValueError):
+            doctor_service.add_doctor(db_session, 960614932)
+
+    assert breaker.allow_request()
+
+
+def test_add_doctor_with_a_malformed_payload_still_settles_the_probe(db_session, mock_requests, monkeypatch):
+    breaker = half_open_breaker()
+    monkeypatch.setattr(upstream_guard, "circuit_breaker", breaker)
+
+    with mock_requests as mock_get:
+        mock_get.return_value = MagicMock(status_code=200, content=b"not json")
+        with pytest.raises(msgspec.DecodeError):
+            doctor_service.add_doctor(db_session, 960614932)
+
+    # the upstream answered, so the probe closed the circuit before the payload was parsed
+    assert breaker.allow_request() and breaker.allow_request()
+    assert db_session.query(Doctor).count() == 0
@@ -2,6 +2,7 @@ import pytest
 from unittest.mock import AsyncMock, patch
 from fastapi import HTTPException
 from services.email_service import send_email_notification
+from services.smtp_pool import SMTPPool
 
 
 @pytest.mark.asyncio
@@ -37,3 +38,17 @@ async def test_send_email_notification_missing_fields(to_email, subject, body):
 
     assert exc.value.status_code == 400
     assert "Missing required email fields" in str(exc.value.detail)
+
+
+@pytest.mark.asyncio
+async def test_send_email_notification_uses_pool_when_given(fake_smtp):
+    handler, port = fake_smtp
+
+    async with SMTPPool("127.0.0.1", port) as pool:
+        with patch("services.email_service.aiosmtplib.send", new_callable=AsyncMock) as mock_send:
+            await send_email_notification("a@example.com", "Test", "Hello", pool=pool)
+            await send_email_notification("b@example.com", "Test", "Hello", pool=pool)
+
+    mock_send.assert_not_called()
+    assert [envelope.rcpt_tos for envelope in handler.messages] == [["a@example.com"], ["b@example.com"]]
+    assert handler.connections == 1
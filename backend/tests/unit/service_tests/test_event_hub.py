@@ -0,0 +1,115 @@
+import asyncio
+import json
+import threading
+from datetime import datetime
+import pytest
+from services.event_hub import EventHub
+
+
+def parse(message: str) -> tuple[str, dict]:
+    event, data = message.strip().split("\n")
+    return event.removeprefix("event: "), json.loads(data.removeprefix("data: "))
+
+
+@pytest.mark.asyncio
+async def test_publish_reaches_only_subscribers_of_that_doctor():
+    hub = EventHub()
+    mine = hub.subscribe({1})
+    other = hub.subscribe({2})
+
+    hub.publish_slots(1, [datetime(2030, 1, 7, 8, 0)], [])
+
+    event, data = parse(await mine.next_message(1))
+    assert event == "slots_added"
+    assert data == {"doctor_id": 1, "slots": ["2030-01-07T08:00:00"]}
+    assert await other.next_message(0.05) is None
+
+
+@pytest.mark.asyncio
+async def test_publish_from_another_thread_is_delivered_on_the_subscriber_loop():
+    hub = EventHub()
+    subscription = hub.subscribe({1})
+
+    thread = threading.Thread(target=hub.publish_slots, args=(1, [], [datetime(2030, 1, 7, 8, 0)]))
+    thread.start()
+    thread.join()
+
+    event, data = parse(await subscription.next_message(1))
+    assert event == "slots_removed"
+    assert data["slots"] == ["2030-01-07T08:00:00"]
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_gets_a_resync_instead_of_blocking_publishers():
+    hub = EventHub(max_queue=2)
+    subscription = hub.subscribe({1})
+
+    for minute in range(5):
+        hub.publish_slots(1, [datetime(2030, 1, 7, 8, minute)], [])
+    await asyncio.sleep(0)
+
+    event, data = parse(await subscription.next_message(1))
+    assert event == "resync"
+    assert data == {"doctor_ids": [1]}
+    assert await subscription.next_message(0.05) is None
+
+
+@pytest.mark.asyncio
+async def test_unsubscribe_stops_delivery():
+    hub = EventHub()
+    subscription = hub.subscribe({1, 2})
+
+    hub.unsubscribe(subscription)
+    hub.publish_slots(1, [datetime(2030, 1, 7, 8, 0)], [])
+
+    assert await subscription.next_message(0.05) is None
+    assert not hub._by_doctor
+
+
+def test_publish_without_subscribers_is_a_no_op():
+    EventHub().publish_slots(1, [datetime(2030, 1, 7, 8, 0)], [datetime(2030, 1, 7, 9, 0)])
+
+
+@pytest.mark.asyncio
+async def test_subscribing_to_every_doctor_receives_all_changes():
+    hub = EventHub()
+    everything = hub.subscribe(None)
+
+    hub.publish_slots(1, [datetime(2030, 1, 7, 8, 0)], [])
+    hub.publish_slots(2, [], [datetime(2030, 1, 8, 8, 0)])
+
+    assert parse(await everything.next_message(1))[1]["doctor_id"] == 1
+    assert parse(await everything.next_message(1))[1]["doctor_id"] == 2
+
+    hub.unsubscribe(everything)
+    hub.unsubscribe(everything)
+    hub.publish_slots(1, [datetime(2030, 1, 9, 8, 0)], [])
+    assert await everything.next_message(0.05) is None
+
+
+@pytest.mark.asyncio
+async def test_resubscribe_moves_the_subscription_to_other_doctors():
+    hub = EventHub()
+    subscription = hub.subscribe({1})
+
+    hub.resubscribe(subscription, {2})
+    hub.publish_slots(1, [datetime(2030, 1, 7, 8, 0)], [])
+    hub.publish_slots(2, [datetime(2030, 1, 7, 8, 0)], [])
+
+    assert parse(await subscription.next_message(1))[1]["doctor_id"] == 2
+    assert await subscription.next_message(0.05) is None
+    hub.unsubscribe(subscription)
+    assert not hub._by_doctor
+
+
+@pytest.mark.asyncio
+async def test_publish_resync_reaches_every_subscriber_once():
+    hub = EventHub()
+    both = hub.subscribe({1, 2})
+    everything = hub.subscribe(None)
+
+    hub.publish_resync()
+
+    assert parse(await both.next_message(1)) == ("resync", {"doctor_ids": [1, 2]})
+    assert parse(await everything.next_message(1)) == ("resync", {"doctor_ids": None})
+    assert await both.next_message(0.05) is None
@@ -0,0 +1,132 @@
+import asyncio
+import httpx
+import pytest
+from services import fetcher_service, upstream_guard
+
+
+def doctor_payload(name, *terms):
+    return {"name": name, "timeslots": {"2025-11-01": [{"term": t, "isAvailable": True} for t in terms]}}
+
+
+async def collect(*args, **kwargs):
+    return [result async for result in fetcher_service.fetch_all(*args, **kwargs)]
+
+
+def test_slots_url_uses_given_base_url():
+    url = fetcher_service.slots_url(960614932, "http://localhost:9000/resources")
+    assert url == "http://localhost:9000/resources/960614932/slots_availability"
+
+
+@pytest.mark.asyncio
+async def test_fetch_all_returns_one_result_per_doctor(fake_mojtermin):
+    fake_mojtermin.doctors[1] = doctor_payload("doctor iva", "2025-11-07T08:15:00")
+    fake_mojtermin.doctors[2] = doctor_payload("doctor ana")
+
+    results = await collect([1, 2, 3], concurrency=2, base_url=fake_mojtermin.base_url)
+
+    by_id = {result.doctor_id: result for result in results}
+    assert set(by_id) == {1, 2, 3}
+    assert by_id[1].ok
+    assert by_id[1].json()["name"] == "doctor iva"
+    assert by_id[2].ok
+    assert not by_id[3].ok
+    assert by_id[3].status_code == 404
+    assert by_id[3].content is None
+
+
+@pytest.mark.asyncio
+async def test_fetch_all_respects_concurrency_limit(fake_mojtermin):
+    fake_mojtermin.delay = 0.05
+    for doctor_id in range(12):
+        fake_mojtermin.doctors[doctor_id] = doctor_payload(f"doctor {doctor_id}")
+
+    results = await collect(range(12), concurrency=3, base_url=fake_mojtermin.base_url)
+
+    assert len(results) == 12
+    assert all(result.ok for result in results)
+    assert fake_mojtermin.max_in_flight <= 3
+    assert len(fake_mojtermin.requests) == 12
+
+
+@pytest.mark.asyncio
+async def test_fetch_all_reports_timeouts_as_failed_results(fake_mojtermin):
+    fake_mojtermin.delay = 0.5
+    fake_mojtermin.doctors[1] = doctor_payload("doctor iva")
+
+    results = await collect([1], timeout=0.05, base_url=fake_mojtermin.base_url)
+
+    assert len(results) == 1
+    assert not results[0].ok
+    assert results[0].status_code is None
+    assert "Timeout" in results[0].error
+
+
+@pytest.mark.asyncio
+async def test_fetch_all_with_no_doctors_yields_nothing():
+    assert await collect([]) == []
+
+
+@pytest.mark.parametrize("etag, last_modified, expected", [
+    (None, None, {}),
+    ('"abc"', None, {"If-None-Match": '"abc"'}),
+    (None, "Wed, 21 Oct 2025 07:28:00 GMT", {"If-Modified-Since": "Wed, 21 Oct 2025 07:28:00 GMT"}),
+])
+def test_conditional_headers(etag, last_modified, expected):
+    assert fetcher_service.conditional_headers(etag, last_modified) == expected
+
+
+def test_content_hash_is_stable_for_identical_payloads():
+    first = fetcher_service.FetchResult(1, 200, content=b'{"name": "doctor iva"}')
+    second = fetcher_service.FetchResult(1, 200, content=b'{"name": "doctor iva"}')
+    assert first.content_hash == second.content_hash
+    assert fetcher_service.FetchResult(1, 404).content_hash is None
+
+
+@pytest.mark.asyncio
+async def test_fetch_all_skips_requests_while_circuit_is_open(fake_mojtermin):
+    fake_mojtermin.doctors[1] = doctor_payload("doctor iva")
+    breaker = upstream_guard.circuit_breaker
+    for _ in range(breaker.min_requests):
+        breaker.record_failure()
+
+    results = await collect([1, 2], base_url=fake_mojtermin.base_url)
+
+    assert all(result.skipped for result in results)
+    assert fake_mojtermin.requests == []
+
+
+@pytest.mark.asyncio
+async def test_fetch_all_trips_circuit_on_upstream_errors(fake_mojtermin):
+    fake_mojtermin.delay = 0.5
+    for doctor_id in range(20):
+        fake_mojtermin.doctors[doctor_id] = doctor_payload(f"doctor {doctor_id}")
+
+    results = await collect(range(20), concurrency=10, timeout=0.05, base_url=fake_mojtermin.base_url)
+
+    assert len(results) == 20
+    assert upstream_guard.circuit_breaker.is_open
+    assert any(result.skipped for result in results)
+    assert len(fake_mojtermin.requests) < 20
+
+
+@pytest.mark.asyncio
+async def test_cancelled_half_open_probe_is_given_back(fake_mojtermin, monkeypatch):
+    clock = [0.0]
+    breaker = upstream_guard.CircuitBreaker(error_rate=0.5, min_requests=2, window=60, cooldown=30,
+                                            clock=lambda: clock[0])
+    breaker.record_failure()
+    breaker.record_failure()
+    clock[0] = 31
+    monkeypatch.setattr(upstream_guard, "circuit_breaker", breaker)
+    # the probe gets stuck waiting for a rate limiter token
+    monkeypatch.setattr(upstream_guard.rate_limiter, "reserve", lambda: 60)
+
+    async with httpx.AsyncClient() as client:
+        probe = asyncio.create_task(fetcher_service.fetch_slots(client, 1, fake_mojtermin.base_url))
+        await asyncio.sleep(0.05)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+    assert fake_mojtermin.requests == []
+    assert breaker.allow_request()
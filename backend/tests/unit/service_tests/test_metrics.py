@@ -0,0 +1,69 @@
+import pytest
+from prometheus_client import REGISTRY
+from unittest.mock import AsyncMock, patch
+from database.metrics import db_timed
+from services import metrics, email_service, checker_service
+from model.models import Doctor
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_db_timed_records_each_call_even_when_it_raises():
+    @db_timed
+    def failing_lookup():
+        raise ValueError("boom")
+
+    label = f"{__name__.rsplit('.', 1)[-1]}.failing_lookup"
+    before = sample("mojtermin_db_seconds_count", function=label)
+
+    with pytest.raises(ValueError):
+        failing_lookup()
+
+    assert sample("mojtermin_db_seconds_count", function=label) == before + 1
+    assert failing_lookup.__name__ == "failing_lookup"
+
+
+def test_observe_upstream_counts_failures_by_status():
+    before_ok = sample("mojtermin_upstream_fetch_seconds_count", status="200")
+    before_failures = sample("mojtermin_upstream_failures_total", reason="429")
+
+    metrics.observe_upstream(200, 0.1)
+    metrics.observe_upstream(429, 0.2)
+    metrics.observe_upstream(404, 0.1)
+
+    assert sample("mojtermin_upstream_fetch_seconds_count", status="200") == before_ok + 1
+    assert sample("mojtermin_upstream_failures_total", reason="429") == before_failures + 1
+    assert sample("mojtermin_upstream_failures_total", reason="404") == 0
+
+
+@pytest.mark.asyncio
+async def test_email_failures_are_counted():
+    before = sample("mojtermin_email_failures_total")
+
+    with patch("services.email_service.aiosmtplib.send", new_callable=AsyncMock, side_effect=Exception("SMTP")):
+        with pytest.raises(Exception):
+            await email_service.send_email_notification("a@mail.com", "Subject", "Body")
+
+    assert sample("mojtermin_email_failures_total") == before + 1
+
+
+@pytest.mark.asyncio
+async def test_check_doctors_records_outcomes_and_diff_sizes(db_session, fake_mojtermin):
+    db_session.add(Doctor(id=1, full_name="doctor iva"))
+    db_session.commit()
+    fake_mojtermin.doctors[1] = {"name": "doctor iva", "timeslots": {"day": [
+        {"term": "2030-01-01T09:00:00", "isAvailable": True},
+        {"term": "2030-01-01T09:30:00", "isAvailable": True},
+    ]}}
+    before_changed = sample("mojtermin_doctor_checks_total", outcome="changed")
+    before_failed = sample("mojtermin_doctor_checks_total", outcome="failed")
+    before_added = sample("mojtermin_slot_diff_size_sum", kind="added")
+
+    await checker_service.check_doctors(db_session, {1: ["a@mail.com"], 2: ["b@mail.com"]},
+                                        base_url=fake_mojtermin.base_url)
+
+    assert sample("mojtermin_doctor_checks_total", outcome="changed") == before_changed + 1
+    assert sample("mojtermin_doctor_checks_total", outcome="failed") == before_failed + 1
+    assert sample("mojtermin_slot_diff_size_sum", kind="added") == before_added + 2
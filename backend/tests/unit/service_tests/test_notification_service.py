@@ -0,0 +1,25 @@
+from datetime import datetime
+from services import notification_service
+from services.notification_service import DoctorUpdate
+
+IVA = DoctorUpdate(1, "iva", {datetime(2030, 1, 5, 9, 0), datetime(2030, 1, 2, 8, 30)})
+ANA = DoctorUpdate(2, "ana", {datetime(2030, 1, 3, 10, 0)})
+
+
+def test_format_digest_for_single_doctor():
+    subject, body = notification_service.format_digest([IVA])
+
+    assert subject == "New Available Appointment Slot!"
+    assert body == ("New appointment slots are available:\n\n"
+                    "Doctor iva\n"
+                    "  - 08:30, 02 Jan 2030\n"
+                    "  - 09:00, 05 Jan 2030")
+
+
+def test_format_digest_orders_doctors_and_slots_by_date():
+    subject, body = notification_service.format_digest([ANA, IVA])
+
+    assert subject == "New Available Appointment Slots at 2 doctors!"
+    assert body.index("Doctor iva") < body.index("02 Jan 2030") < body.index("05 Jan 2030")
+    assert body.index("05 Jan 2030") < body.index("Doctor ana") < body.index("03 Jan 2030")
+
@@ -0,0 +1,138 @@
+import json
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from model.models import Doctor, EmailOutbox
+from services import outbox_service
+
+NOW = datetime(2030, 1, 1, 12, 0)
+
+
+@pytest.fixture
+def sample_doctors(db_session):
+    doctors = [Doctor(id=1, full_name="iva"), Doctor(id=2, full_name="ana")]
+    db_session.add_all(doctors)
+    db_session.commit()
+    return doctors
+
+
+@pytest.fixture
+def mock_send():
+    with patch("services.outbox_service.email_service.send_email_notification") as mock:
+        yield mock
+
+
+def stage(db_session, doctor_id, name, slots, emails):
+    outbox_service.stage_notifications(db_session, doctor_id, name, slots, emails, NOW)
+    db_session.commit()
+
+
+def test_stage_notifications_adds_one_row_per_subscriber_without_committing(db_session, sample_doctors):
+    slots = {datetime(2030, 1, 2, 9, 0), datetime(2030, 1, 2, 8, 0)}
+    outbox_service.stage_notifications(db_session, 1, "iva", slots, ["a@mail.com", "b@mail.com"], NOW)
+
+    assert len(db_session.new) == 2
+    db_session.commit()
+
+    rows = db_session.query(EmailOutbox).order_by(EmailOutbox.to_email).all()
+    assert [row.to_email for row in rows] == ["a@mail.com", "b@mail.com"]
+    assert json.loads(rows[0].slots) == ["2030-01-02T08:00:00", "2030-01-02T09:00:00"]
+    assert rows[0].status == "pending"
+    assert rows[0].next_attempt_at == NOW
+
+
+@pytest.mark.asyncio
+async def test_drain_outbox_sends_one_digest_per_recipient(db_session, sample_doctors, mock_send):
+    stage(db_session, 1, "iva", {datetime(2030, 1, 2, 9, 0)}, ["a@mail.com", "b@mail.com"])
+    stage(db_session, 2, "ana", {datetime(2030, 1, 3, 9, 0)}, ["a@mail.com"])
+
+    sent, failed = await outbox_service.drain_outbox(db_session, now=NOW)
+
+    assert (sent, failed) == (2, 0)
+    bodies = {call.kwargs["to_email"]: call.kwargs["body"] for call in mock_send.await_args_list}
+    assert "Doctor iva" in bodies["a@mail.com"] and "Doctor ana" in bodies["a@mail.com"]
+    assert "Doctor ana" not in bodies["b@mail.com"]
+    assert {row.status for row in db_session.query(EmailOutbox)} == {"sent"}
+
+
+@pytest.mark.asyncio
+async def test_drain_outbox_merges_rows_for_the_same_doctor(db_session, sample_doctors, mock_send):
+    stage(db_session, 1, "iva", {datetime(2030, 1, 2, 9, 0)}, ["a@mail.com"])
+    stage(db_session, 1, "iva", {datetime(2030, 1, 4, 9, 0)}, ["a@mail.com"])
+
+    await outbox_service.drain_outbox(db_session, now=NOW)
+
+    body = mock_send.await_args.kwargs["body"]
+    assert body.count("Doctor iva") == 1
+    assert "02 Jan 2030" in body and "04 Jan 2030" in body
+
+
+@pytest.mark.asyncio
+async def test_drain_outbox_processes_multiple_batches(db_session, sample_doctors, mock_send):
+    emails = [f"user{i}@mail.com" for i in range(5)]
+    stage(db_session, 1, "iva", {datetime(2030, 1, 2, 9, 0)}, emails)
+
+    sent, failed = await outbox_service.drain_outbox(db_session, batch_size=2, now=NOW)
+
+    assert sent == 5
+    assert mock_send.await_count == 5
+
+
+@pytest.mark.asyncio
+async def test_drain_outbox_retries_failed_messages_later(db_session, sample_doctors, mock_send):
+    stage(db_session, 1, "iva", {datetime(2030, 1, 2, 9, 0)}, ["a@mail.com"])
+    mock_send.side_effect = Exception("SMTP error")
+
+    sent, failed = await outbox_service.drain_outbox(db_session, now=NOW)
+
+    assert (sent, failed) == (0, 1)
+    row = db_session.query(EmailOutbox).one()
+    assert row.status == "pending"
+    assert row.attempts == 1
+    assert row.last_error == "SMTP error"
+    assert row.next_attempt_at > NOW
+
+    mock_send.side_effect = None
+    sent, failed = await outbox_service.drain_outbox(db_session, now=row.next_attempt_at)
+    assert (sent, failed) == (1, 0)
+
+
+@pytest.mark.asyncio
+async def test_drain_outbox_gives_up_after_max_attempts(db_session, sample_doctors, mock_send):
+    stage(db_session, 1, "iva", {datetime(2030, 1, 2, 9, 0)}, ["a@mail.com"])
+    mock_send.side_effect = Exception("SMTP error")
+
+    now = NOW
+    for _ in range(outbox_service.OUTBOX_MAX_ATTEMPTS):
+        await outbox_service.drain_outbox(db_session, now=now)
+        now += timedelta(seconds=outbox_service.RETRY_MAX_SECONDS)
+
+    row = db_session.query(EmailOutbox).one()
+    assert row.status == "failed"
+    assert row.attempts == outbox_service.OUTBOX_MAX_ATTEMPTS
+    assert await outbox_service.drain_outbox(db_session, now=now) == (0, 0)
+
+
+@pytest.mark.asyncio
+async def test_drain_outbox_ignores_messages_not_yet_due(db_session, sample_doctors, mock_send):
+    stage(db_session, 1, "iva", {datetime(2030, 1, 2, 9, 0)}, ["a@mail.com"])
+
+    assert await outbox_service.drain_outbox(db_session, now=NOW - timedelta(minutes=1)) == (0, 0)
+    mock_send.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_drain_outbox_reuses_pooled_smtp_connections(db_session, sample_doctors, fake_smtp):
+    handler, port = fake_smtp
+    emails = [f"user{i}@mail.com" for i in range(25)]
+    stage(db_session, 1, "iva", {datetime(2030, 1, 2, 9, 0)}, emails)
+
+    with patch("services.email_service.SMTP_HOSTNAME", "127.0.0.1"), \
+            patch("services.email_service.SMTP_PORT", port), \
+            patch("services.email_service.SMTP_USERNAME", None), \
+            patch("services.email_service.SMTP_PASSWORD", None):
+        sent, failed = await outbox_service.drain_outbox(db_session, batch_size=10, now=NOW)
+
+    assert (sent, failed) == (25, 0)
+    assert len(handler.messages) == 25
+    assert handler.connections <= 2
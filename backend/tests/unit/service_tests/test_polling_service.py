@@ -0,0 +1,91 @@
+import pytest
+from datetime import datetime, timedelta
+from model.models import Doctor, DoctorPollState
+from services import polling_service
+from services.polling_service import (DEFAULT_POLL_INTERVAL, MIN_POLL_INTERVAL, MAX_POLL_INTERVAL,
+                                      next_base_interval, effective_interval)
+
+NOW = datetime(2025, 11, 1, 12, 0)
+
+
+@pytest.fixture
+def sample_doctor(db_session):
+    doctor = Doctor(id=960614932, full_name="doctor iva")
+    db_session.add(doctor)
+    db_session.commit()
+    return doctor
+
+
+def test_interval_shrinks_when_slots_change():
+    assert next_base_interval(DEFAULT_POLL_INTERVAL, True, NOW, NOW) == DEFAULT_POLL_INTERVAL // 2
+
+
+def test_interval_never_drops_below_minimum():
+    assert next_base_interval(MIN_POLL_INTERVAL, True, NOW, NOW) == MIN_POLL_INTERVAL
+
+
+def test_interval_recovers_towards_default_while_recently_changed():
+    recently = NOW - timedelta(hours=2)
+    assert next_base_interval(600, False, recently, NOW) == 750
+    assert next_base_interval(DEFAULT_POLL_INTERVAL, False, recently, NOW) == DEFAULT_POLL_INTERVAL
+
+
+def test_interval_grows_for_static_doctors_up_to_maximum():
+    days_ago = NOW - timedelta(days=3)
+    assert next_base_interval(DEFAULT_POLL_INTERVAL, False, days_ago, NOW) == int(DEFAULT_POLL_INTERVAL * 1.5)
+    assert next_base_interval(MAX_POLL_INTERVAL, False, days_ago, NOW) == MAX_POLL_INTERVAL
+
+
+@pytest.mark.parametrize("subscriber_count, expected", [
+    (0, DEFAULT_POLL_INTERVAL),
+    (1, DEFAULT_POLL_INTERVAL),
+    (2, DEFAULT_POLL_INTERVAL),
+    (16, DEFAULT_POLL_INTERVAL // 4),
+])
+def test_effective_interval_scales_with_subscribers(subscriber_count, expected):
+    assert effective_interval(DEFAULT_POLL_INTERVAL, subscriber_count) == expected
+
+
+def test_effective_interval_never_drops_below_minimum():
+    assert effective_interval(MIN_POLL_INTERVAL * 2, 1000) == MIN_POLL_INTERVAL
+
+
+def test_record_poll_creates_state_and_schedules_next_poll(db_session, sample_doctor):
+    state = polling_service.record_poll(db_session, sample_doctor.id, True, 1, NOW)
+
+    assert state.interval_seconds == DEFAULT_POLL_INTERVAL // 2
+    assert state.last_checked_at == NOW
+    assert state.last_changed_at == NOW
+    assert state.next_poll_at == NOW + timedelta(seconds=DEFAULT_POLL_INTERVAL // 2)
+    assert db_session.query(DoctorPollState).count() == 1
+
+
+def test_record_failed_poll_keeps_interval(db_session, sample_doctor):
+    polling_service.record_poll(db_session, sample_doctor.id, True, 1, NOW)
+    later = NOW + timedelta(minutes=30)
+
+    state = polling_service.record_poll(db_session, sample_doctor.id, None, 1, later)
+
+    assert state.interval_seconds == DEFAULT_POLL_INTERVAL // 2
+    assert state.last_checked_at == NOW
+    assert state.next_poll_at <= later + timedelta(seconds=DEFAULT_POLL_INTERVAL // 2)
+
+
+def test_repeated_failures_back_off_exponentially(db_session, sample_doctor):
+    polling_service.record_poll(db_session, sample_doctor.id, False, 1, NOW)
+
+    delays = []
+    for _ in range(3):
+        state = polling_service.record_poll(db_session, sample_doctor.id, None, 1, NOW)
+        delays.append((state.next_poll_at - NOW).total_seconds())
+
+    assert state.failure_count == 3
+    assert DEFAULT_POLL_INTERVAL / 2 <= delays[0] <= DEFAULT_POLL_INTERVAL
+    assert DEFAULT_POLL_INTERVAL * 2 <= delays[2] <= DEFAULT_POLL_INTERVAL * 4
+
+
+def test_successful_poll_resets_failure_count(db_session, sample_doctor):
+    polling_service.record_poll(db_session, sample_doctor.id, None, 1, NOW)
+    state = polling_service.record_poll(db_session, sample_doctor.id, False, 1, NOW)
+
+    assert state.failure_count == 0
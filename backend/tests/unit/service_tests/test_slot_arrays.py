@@ -0,0 +1,57 @@
+import numpy as np
+from datetime import datetime, timedelta, timezone
+from services import slot_arrays
+
+BASE = datetime(2030, 1, 1, 8, 0)
+
+
+def minutes(*offsets):
+    return np.array([slot_arrays.to_minute(BASE) + offset for offset in offsets], dtype=np.int64)
+
+
+def test_minute_round_trip():
+    slot = datetime(2030, 5, 17, 14, 45)
+
+    assert slot_arrays.from_minute(slot_arrays.to_minute(slot)) == slot
+    assert slot_arrays.to_minute(slot.replace(second=59)) == slot_arrays.to_minute(slot)
+    assert slot_arrays.to_minute(slot.replace(tzinfo=timezone.utc)) == slot_arrays.to_minute(slot)
+
+
+def test_to_array_sorts_and_deduplicates():
+    slots = [BASE + timedelta(minutes=30), BASE, BASE + timedelta(minutes=30)]
+
+    array = slot_arrays.to_array(slots)
+
+    assert array.dtype == np.int64
+    assert slot_arrays.to_datetimes(array) == [BASE, BASE + timedelta(minutes=30)]
+    assert slot_arrays.to_array([]).size == 0
+
+
+def test_upcoming_keeps_slots_from_now_on():
+    array = minutes(0, 10, 20, 30)
+
+    assert slot_arrays.upcoming(array, slot_arrays.to_minute(BASE) + 10).tolist() == minutes(10, 20, 30).tolist()
+    assert slot_arrays.upcoming(array, slot_arrays.to_minute(BASE) + 31).size == 0
+
+
+def test_isin_sorted():
+    assert slot_arrays.isin_sorted(minutes(0, 5, 10, 99), minutes(5, 10, 20)).tolist() == [False, True, True, False]
+    assert slot_arrays.isin_sorted(minutes(0, 5), slot_arrays.EMPTY).tolist() == [False, False]
+
+
+def test_diff_sorted():
+    added, removed = slot_arrays.diff_sorted(minutes(0, 10, 20), minutes(10, 20, 30, 40))
+
+    assert added.tolist() == minutes(30, 40).tolist()
+    assert removed.tolist() == minutes(0).tolist()
+
+
+def test_diff_sorted_matches_set_difference_on_large_calendars():
+    rng = np.random.default_rng(7)
+    old = np.unique(rng.integers(0, 200_000, 20_000)).astype(np.int64)
+    new = np.unique(rng.integers(0, 200_000, 20_000)).astype(np.int64)
+
+    added, removed = slot_arrays.diff_sorted(old, new)
+
+    assert set(added.tolist()) == set(new.tolist()) - set(old.tolist())
+    assert set(removed.tolist()) == set(old.tolist()) - set(new.tolist())
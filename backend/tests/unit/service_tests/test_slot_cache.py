@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from services.slot_cache import SlotCache
+
+
+def test_get_returns_none_on_miss_and_counts_it():
+    cache = SlotCache(maxsize=2)
+
+    assert cache.get(1) is None
+    assert (cache.hits, cache.misses) == (0, 1)
+
+
+def test_put_and_get():
+    cache = SlotCache(maxsize=2)
+    minutes = np.array([1, 2, 3], dtype=np.int64)
+
+    cache.put(1, minutes)
+
+    assert cache.get(1) is minutes
+    assert 1 in cache
+    assert cache.hits == 1
+
+
+def test_cached_arrays_are_read_only():
+    cache = SlotCache(maxsize=2)
+    minutes = np.array([1, 2, 3], dtype=np.int64)
+    cache.put(1, minutes)
+
+    with pytest.raises(ValueError):
+        cache.get(1)[0] = 5
+
+
+def test_evicts_least_recently_used_doctor():
+    cache = SlotCache(maxsize=2)
+    cache.put(1, np.array([1], dtype=np.int64))
+    cache.put(2, np.array([2], dtype=np.int64))
+    cache.get(1)
+
+    cache.put(3, np.array([3], dtype=np.int64))
+
+    assert len(cache) == 2
+    assert 1 in cache and 3 in cache
+    assert 2 not in cache
+
+
+def test_invalidate_and_clear():
+    cache = SlotCache(maxsize=5)
+    cache.put(1, np.array([1], dtype=np.int64))
+    cache.put(2, np.array([2], dtype=np.int64))
+
+    cache.invalidate(1)
+    cache.invalidate(99)
+    assert 1 not in cache and 2 in cache
+
+    cache.clear()
+    assert len(cache) == 0
@@ -0,0 +1,62 @@
+import asyncio
+import pytest
+from email.message import EmailMessage
+from services.smtp_pool import SMTPPool
+
+
+def make_message(to_email: str) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = "your.termin.notifier@example.com"
+    message["To"] = to_email
+    message["Subject"] = "New Available Appointment Slot!"
+    message.set_content("New appointment slots are available.")
+    return message
+
+
+@pytest.mark.asyncio
+async def test_pool_sends_many_messages_over_one_connection(fake_smtp):
+    handler, port = fake_smtp
+
+    async with SMTPPool("127.0.0.1", port, size=1) as pool:
+        for i in range(20):
+            await pool.send(make_message(f"user{i}@mail.com"))
+
+    assert len(handler.messages) == 20
+    assert handler.connections == 1
+    assert pool.connections_opened == 1
+
+
+@pytest.mark.asyncio
+async def test_pool_never_opens_more_connections_than_its_size(fake_smtp):
+    handler, port = fake_smtp
+
+    async with SMTPPool("127.0.0.1", port, size=3) as pool:
+        await asyncio.gather(*(pool.send(make_message(f"user{i}@mail.com")) for i in range(30)))
+
+    assert len(handler.messages) == 30
+    assert handler.connections <= 3
+
+
+@pytest.mark.asyncio
+async def test_pool_reconnects_when_the_server_drops_the_connection(fake_smtp):
+    handler, port = fake_smtp
+    handler.drop_after_data = True
+
+    async with SMTPPool("127.0.0.1", port, size=1) as pool:
+        for i in range(3):
+            await pool.send(make_message(f"user{i}@mail.com"))
+            await asyncio.sleep(0.05)
+
+    assert [envelope.rcpt_tos for envelope in handler.messages] == [
+        ["user0@mail.com"], ["user1@mail.com"], ["user2@mail.com"]
+    ]
+    assert pool.connections_opened == 3
+
+
+@pytest.mark.asyncio
+async def test_pool_raises_when_the_server_is_unreachable(fake_smtp):
+    _, port = fake_smtp
+
+    async with SMTPPool("127.0.0.1", port + 1 if port < 65535 else port - 1, size=1, timeout=1) as pool:
+        with pytest.raises(Exception):
+            await pool.send(make_message("user@mail.com"))
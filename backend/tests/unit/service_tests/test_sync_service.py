@@ -0,0 +1,157 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from fastapi import HTTPException
+from model.models import Doctor, SlotChange
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from repos import slot_change_repo, doctor_repo
+from services import sync_service, timeslot_service
+from services.event_hub import EventHub
+from tests.conftest import SQLALCHEMY_DATABASE_URL, TestingSessionLocal
+
+SLOT = datetime(2030, 1, 7, 8, 0)
+
+
+@pytest.fixture
+def sample_doctor(db_session):
+    doctor = Doctor(id=960614932, full_name="doctor iva")
+    db_session.add(doctor)
+    db_session.commit()
+    return doctor
+
+
+@pytest.fixture(autouse=True)
+def recheck_database(monkeypatch):
+    monkeypatch.setattr(sync_service, "SessionLocal", TestingSessionLocal)
+
+
+@pytest.fixture
+def hub(monkeypatch):
+    hub = EventHub()
+    monkeypatch.setattr(sync_service, "event_hub", hub)
+    monkeypatch.setattr("services.change_tailer.event_hub", hub)
+    return hub
+
+
+def test_doctor_changes_without_cursor_is_a_snapshot(db_session, sample_doctor):
+    timeslot_service.create_timeslot(db_session, sample_doctor.id, SLOT)
+
+    result = sync_service.doctor_changes(db_session, sample_doctor.id, None)
+
+    assert result["reset"]
+    assert result["slots"] == [SLOT.isoformat()]
+    assert result["version"] == slot_change_repo.get_version(db_session)
+
+
+def test_doctor_changes_folds_the_delta_since_the_cursor(db_session, sample_doctor):
+    kept, flipped = SLOT, SLOT + timedelta(hours=1)
+    since = sync_service.doctor_changes(db_session, sample_doctor.id, None)["version"]
+    timeslot_service.create_timeslot(db_session, sample_doctor.id, kept)
+    flipped_slot = timeslot_service.create_timeslot(db_session, sample_doctor.id, flipped)
+    timeslot_service.delete_timeslot(db_session, flipped_slot.id)
+
+    result = sync_service.doctor_changes(db_session, sample_doctor.id, since)
+
+    assert not result["reset"]
+    assert result["added"] == [kept.isoformat()]
+    assert result["removed"] == [flipped.isoformat()]
+    assert sync_service.doctor_changes(db_session, sample_doctor.id, result["version"])["added"] == []
+
+
+def test_pruned_or_unknown_cursor_gets_a_snapshot(db_session, sample_doctor):
+    timeslot_service.create_timeslot(db_session, sample_doctor.id, SLOT)
+    first = slot_change_repo.get_version(db_session)
+    timeslot_service.create_timeslot(db_session, sample_doctor.id, SLOT + timedelta(hours=1))
+    db_session.query(SlotChange).filter(SlotChange.id == first).delete()
+    db_session.commit()
+
+    assert sync_service.doctor_changes(db_session, sample_doctor.id, first - 1)["reset"]
+    assert not sync_service.doctor_changes(db_session, sample_doctor.id, first)["reset"]
+    assert sync_service.doctor_changes(db_session, sample_doctor.id, first + 100)["reset"]
+
+
+def test_doctor_changes_for_unknown_doctor_is_404(db_session):
+    with pytest.raises(HTTPException) as exc_info:
+        sync_service.doctor_changes(db_session, 999, None)
+    assert exc_info.value.status_code == 404
+
+
+def test_changes_since_pages_through_the_feed(db_session, sample_doctor):
+    since = slot_change_repo.get_version(db_session)
+    for hour in range(3):
+        timeslot_service.create_timeslot(db_session, sample_doctor.id, SLOT + timedelta(hours=hour))
+
+    page = sync_service.changes_since(db_session, since, limit=2)
+    assert page["more"] and len(page["changes"]) == 2
+    rest = sync_service.changes_since(db_session, page["version"], limit=2)
+    assert not rest["more"]
+    assert [change["free_slot"] for change in rest["changes"]] == [(SLOT + timedelta(hours=2)).isoformat()]
+    assert rest["version"] == slot_change_repo.get_version(db_session)
+
+
+@pytest.mark.asyncio
+async def test_long_poll_returns_as_soon_as_a_change_is_published(db_session, sample_doctor, hub,
+                                                                  fresh_change_tailer):
+    fresh_change_tailer.interval = 30
+    await fresh_change_tailer.start()
+    since = sync_service.doctor_changes(db_session, sample_doctor.id, None)["version"]
+
+    async def change_later():
+        await asyncio.sleep(0.1)
+        await asyncio.to_thread(timeslot_service.create_timeslot, db_session, sample_doctor.id, SLOT)
+
+    writer = asyncio.create_task(change_later())
+    result = await sync_service.long_poll(db_session, sync_service.doctor_changes, sample_doctor.id, since,
+                                          doctor_ids={sample_doctor.id}, wait=5)
+    await writer
+    await fresh_change_tailer.stop()
+
+    assert result["added"] == [SLOT.isoformat()]
+    assert not hub._by_doctor
+
+
+@pytest.mark.asyncio
+async def test_long_poll_gives_up_after_the_wait(db_session, sample_doctor, hub):
+    since = sync_service.doctor_changes(db_session, sample_doctor.id, None)["version"]
+
+    result = await sync_service.long_poll(db_session, sync_service.doctor_changes, sample_doctor.id, since,
+                                          doctor_ids={sample_doctor.id}, wait=0.2)
+
+    assert not result["reset"] and result["added"] == [] and result["removed"] == []
+
+
+@pytest.mark.asyncio
+async def test_parked_long_polls_hold_no_database_connection(db_session, sample_doctor, hub, monkeypatch):
+    engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False},
+                           pool_size=2, max_overflow=0, pool_timeout=1)
+    small_pool = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+    monkeypatch.setattr(sync_service, "SessionLocal", small_pool)
+    since = sync_service.doctor_changes(db_session, sample_doctor.id, None)["version"]
+
+    polls = [asyncio.create_task(sync_service.long_poll(small_pool(), sync_service.doctor_changes, sample_doctor.id,
+                                                        since, doctor_ids={sample_doctor.id}, wait=5))
+             for _ in range(5)]
+    await asyncio.sleep(0.2)
+
+    # more polls are parked than the pool has connections, and another request still gets one
+    other = small_pool()
+    try:
+        assert await asyncio.to_thread(doctor_repo.check_existence, other, sample_doctor.id)
+    finally:
+        other.close()
+
+    timeslot_service.create_timeslot(db_session, sample_doctor.id, SLOT)
+    hub.publish_slots(sample_doctor.id, [SLOT], [])
+    results = await asyncio.wait_for(asyncio.gather(*polls), 5)
+    engine.dispose()
+
+    assert all(result["added"] == [SLOT.isoformat()] for result in results)
+
+
+def test_prune_changes_keeps_the_retention_window(db_session, sample_doctor):
+    timeslot_service.create_timeslot(db_session, sample_doctor.id, SLOT)
+    timeslot_service.create_timeslot(db_session, sample_doctor.id, SLOT + timedelta(hours=1))
+
+    assert sync_service.prune_changes(db_session, datetime.now()) == 0
+    assert sync_service.prune_changes(db_session, datetime.now() + sync_service.CHANGE_LOG_RETENTION * 2) == 1
@@ -1,8 +1,12 @@
+import json
+import msgspec
+import numpy as np
 import pytest
 from fastapi import HTTPException, status
-from model.models import Doctor, DoctorTimeslot
-from services import timeslot_service
+from model.models import Doctor, DoctorTimeslot, SlotChange
+from services import timeslot_service, slot_arrays
 from datetime import datetime, timedelta
+from unittest.mock import patch
 
 
 @pytest.fixture
@@ -13,9 +17,15 @@ def sample_doctor(db_session):
     return doctor
 
 
+def diff_and_apply(db, doctor_id, new_minutes, now):
+    diff = timeslot_service.diff_timeslots(db, doctor_id, new_minutes, now)
+    timeslot_service.apply_diff(db, doctor_id, diff)
+    return diff
+
+
 @pytest.fixture
 def sample_timeslot(db_session):
-    timeslot = DoctorTimeslot(doctor_id=960614932, free_slot=datetime(2025, 11, 7, 8, 15))
+    timeslot = DoctorTimeslot(doctor_id=960614932, free_slot=datetime(2030, 11, 7, 8, 15))
     db_session.add(timeslot)
     db_session.commit()
     return timeslot
@@ -98,42 +108,207 @@ def test_delete_timeslot_not_found(db_session):
     assert result is False
 
 
-#  graph coverage tests for the get_timeslots_from_api
-def test_graph_empty_timeslots():
-    timeslots = {}
-    result = timeslot_service.get_timeslots_from_api(timeslots)
-    assert result == set()
+def test_parse_slots_payload_returns_name_and_available_slots():
+    content = json.dumps({
+        "name": "doctor iva",
+        "specialty": "cardiology",
+        "timeslots": {
+            "2025-11-01": [
+                {"term": "2025-11-07T08:15:00", "isAvailable": True, "timeslotType": 2},
+                {"term": "2025-11-07T08:40:00", "isAvailable": False, "timeslotType": 2},
+            ],
+            "2025-12-01": [
+                {"term": "2025-12-01T09:00:00", "isAvailable": True, "timeslotType": 1},
+            ],
+        }
+    }).encode()
 
+    name, slots = timeslot_service.parse_slots_payload(content)
 
-def test_graph_no_slot_info_available_timeslots():
-    timeslots = {
-        "2025-12-01": [],
-        "2025-10-01": []
-    }
-    result = timeslot_service.get_timeslots_from_api(timeslots)
-    assert result == set()
+    assert name == "doctor iva"
+    assert slots == {datetime(2025, 11, 7, 8, 15), datetime(2025, 12, 1, 9, 0)}
 
 
-def test_graph_no_slots_available_timeslots():
+def test_parse_slots_payload_keeps_only_available_slots():
     timeslots = {
         "2025-11-01": [
-            {"term": "2025-11-07T08:15:00", "isAvailable": False, "timeslotType": 2},
-            {"term": "2025-11-07T08:40:00", "isAvailable": False, "timeslotType": 2},
+            {"term": f"2025-11-{day:02d}T{hour:02d}:00:00", "isAvailable": (day + hour) % 3 == 0}
+            for day in range(1, 29) for hour in range(8, 16)
         ]
     }
-    result = timeslot_service.get_timeslots_from_api(timeslots)
-    assert result == set()
+    content = json.dumps({"name": "doctor iva", "timeslots": timeslots}).encode()
 
+    expected = {datetime.fromisoformat(slot["term"]) for slot in timeslots["2025-11-01"] if slot["isAvailable"]}
+    assert timeslot_service.parse_slots_payload(content)[1] == expected
 
-def test_graph_slots_available_timeslots():
-    timeslots = {
-        "2025-11-01": [
-            {"term": "2025-11-07T08:15:00", "isAvailable": True, "timeslotType": 2},
-            {"term": "2025-11-07T08:40:00", "isAvailable": True, "timeslotType": 2},
+
+def test_parse_slots_payload_without_timeslots():
+    assert timeslot_service.parse_slots_payload(b'{"name": "doctor iva"}') == ("doctor iva", set())
+
+
+@pytest.mark.parametrize("content", [b"not json", b'{"timeslots": {}}', b'{"name": "x", "timeslots": []}'])
+def test_parse_slots_payload_rejects_malformed_payloads(content):
+    with pytest.raises(msgspec.DecodeError):
+        timeslot_service.parse_slots_payload(content)
+
+
+def test_parse_slot_minutes_returns_sorted_unique_minutes():
+    content = json.dumps({"name": "doctor iva", "timeslots": {
+        "2030-01-01": [
+            {"term": "2030-01-01T09:00:00", "isAvailable": True},
+            {"term": "2030-01-01T08:00:00", "isAvailable": True},
+            {"term": "2030-01-01T08:30:00", "isAvailable": False},
         ],
-        "2025-12-01": []
-    }
-    expected = {datetime(2025, 11, 7, 8, 15), datetime(2025, 11, 7, 8, 40)}
+        "2030-01-02": [{"term": "2030-01-01T09:00:00", "isAvailable": True}],
+    }}).encode()
+
+    name, minutes = timeslot_service.parse_slot_minutes(content)
+
+    assert name == "doctor iva"
+    assert minutes.dtype == np.int64
+    assert slot_arrays.to_datetimes(minutes) == [datetime(2030, 1, 1, 8, 0), datetime(2030, 1, 1, 9, 0)]
+
+
+def test_diff_timeslots_drops_past_slots_from_the_payload(db_session, sample_doctor):
+    now = datetime(2030, 1, 1, 12, 0)
+    new = slot_arrays.to_array({now - timedelta(hours=1), now, now + timedelta(hours=1)})
+
+    diff = timeslot_service.diff_timeslots(db_session, sample_doctor.id, new, now)
+
+    assert diff.added_slots == [now, now + timedelta(hours=1)]
+    assert diff.removed.size == 0
+
+
+def test_parse_term_memoizes_repeated_terms():
+    timeslot_service.parse_term.cache_clear()
+    content = json.dumps({"name": "doctor iva", "timeslots": {
+        "2025-11-01": [{"term": "2025-11-07T08:15:00", "isAvailable": True}]
+    }}).encode()
+
+    timeslot_service.parse_slots_payload(content)
+    timeslot_service.parse_slots_payload(content)
+
+    info = timeslot_service.parse_term.cache_info()
+    assert (info.hits, info.misses) == (1, 1)
+
+
+def test_apply_diff_updates_db(db_session, sample_doctor):
+    now = datetime(2030, 1, 1, 12, 0)
+    expired = now - timedelta(days=1)
+    kept = now + timedelta(days=1)
+    gone = now + timedelta(days=2)
+    new = now + timedelta(days=3)
+    db_session.add_all([DoctorTimeslot(doctor_id=sample_doctor.id, free_slot=slot) for slot in (expired, kept, gone)])
+    db_session.commit()
+
+    diff = diff_and_apply(db_session, sample_doctor.id, slot_arrays.to_array({kept, new}), now)
+
+    assert diff.added_slots == [new]
+    assert diff.removed_slots == [gone]
+    assert diff.changed
+    stored = {slot.free_slot for slot in db_session.query(DoctorTimeslot).filter_by(doctor_id=sample_doctor.id)}
+    assert stored == {expired, kept, new}
+
+
+def test_expire_slots_deletes_past_slots_of_every_doctor(db_session, sample_doctor):
+    other = Doctor(id=1096535518, full_name="doctor ana")
+    now = datetime(2030, 1, 1, 12, 0)
+    db_session.add_all([
+        other,
+        DoctorTimeslot(doctor_id=sample_doctor.id, free_slot=now - timedelta(days=1)),
+        DoctorTimeslot(doctor_id=other.id, free_slot=now - timedelta(minutes=1)),
+        DoctorTimeslot(doctor_id=other.id, free_slot=now + timedelta(minutes=1)),
+    ])
+    db_session.commit()
+
+    assert timeslot_service.expire_slots(db_session, now) == 2
+    assert [slot.free_slot for slot in db_session.query(DoctorTimeslot)] == [now + timedelta(minutes=1)]
+
+
+def test_diff_timeslots_reads_the_database_only_on_a_cache_miss(db_session, sample_doctor, fresh_slot_cache):
+    now = datetime(2030, 1, 1, 12, 0)
+    slot = now + timedelta(hours=1)
+    db_session.add(DoctorTimeslot(doctor_id=sample_doctor.id, free_slot=slot))
+    db_session.commit()
+
+    first = timeslot_service.diff_timeslots(db_session, sample_doctor.id, slot_arrays.to_array({slot}), now)
+    with patch("services.timeslot_service.timeslot_repo.get_slot_minutes") as mock_get_minutes:
+        second = timeslot_service.diff_timeslots(db_session, sample_doctor.id, slot_arrays.to_array({slot}), now)
+
+    assert not first.changed and not second.changed
+    mock_get_minutes.assert_not_called()
+    assert (fresh_slot_cache.hits, fresh_slot_cache.misses) == (1, 1)
+
+
+def test_apply_diff_updates_the_cache(db_session, sample_doctor, fresh_slot_cache):
+    now = datetime(2030, 1, 1, 12, 0)
+    first, second = now + timedelta(hours=1), now + timedelta(hours=2)
+
+    diff_and_apply(db_session, sample_doctor.id, slot_arrays.to_array({first}), now)
+    diff_and_apply(db_session, sample_doctor.id, slot_arrays.to_array({first, second}), now)
+
+    assert slot_arrays.to_datetimes(fresh_slot_cache.get(sample_doctor.id)) == [first, second]
+    assert fresh_slot_cache.misses == 1
+
+
+def test_failed_apply_diff_drops_the_cached_slots(db_session, sample_doctor, fresh_slot_cache):
+    now = datetime(2030, 1, 1, 12, 0)
+    new = slot_arrays.to_array({now + timedelta(hours=1)})
+
+    with patch("services.timeslot_service.timeslot_repo.reconcile", side_effect=Exception("disk full")):
+        with pytest.raises(Exception):
+            diff_and_apply(db_session, sample_doctor.id, new, now)
+
+    assert sample_doctor.id not in fresh_slot_cache
+
+
+def test_apply_diff_wakes_the_change_tailer_only_after_commit(db_session, sample_doctor):
+    now = datetime(2030, 1, 1, 12, 0)
+    gone, new = now + timedelta(days=1), now + timedelta(days=2)
+    db_session.add(DoctorTimeslot(doctor_id=sample_doctor.id, free_slot=gone))
+    db_session.commit()
+
+    with patch("services.timeslot_service.change_tailer") as mock_tailer:
+        diff_and_apply(db_session, sample_doctor.id, slot_arrays.to_array({new}), now)
+        mock_tailer.wake.assert_called_once()
+
+        mock_tailer.reset_mock()
+        with patch("services.timeslot_service.timeslot_repo.reconcile", side_effect=Exception("disk full")):
+            with pytest.raises(Exception):
+                diff_and_apply(db_session, sample_doctor.id, slot_arrays.EMPTY, now)
+        mock_tailer.wake.assert_not_called()
+
+
+def test_manual_slot_changes_invalidate_the_cache(db_session, sample_doctor, fresh_slot_cache):
+    fresh_slot_cache.put(sample_doctor.id, slot_arrays.EMPTY)
+    slot = timeslot_service.create_timeslot(db_session, sample_doctor.id, datetime(2030, 1, 1, 9, 0))
+    assert sample_doctor.id not in fresh_slot_cache
+
+    fresh_slot_cache.put(sample_doctor.id, slot_arrays.EMPTY)
+    timeslot_service.delete_timeslot(db_session, slot.id)
+    assert sample_doctor.id not in fresh_slot_cache
+
+
+def test_warm_slot_cache_loads_missing_doctors(db_session, sample_doctor, fresh_slot_cache):
+    now = datetime(2030, 1, 1, 12, 0)
+    slot = now + timedelta(hours=1)
+    db_session.add_all([Doctor(id=2, full_name="doctor ana"), DoctorTimeslot(doctor_id=sample_doctor.id, free_slot=slot)])
+    db_session.commit()
+
+    timeslot_service.warm_slot_cache(db_session, [sample_doctor.id, 2], now)
+
+    assert slot_arrays.to_datetimes(fresh_slot_cache.get(sample_doctor.id)) == [slot]
+    assert fresh_slot_cache.get(2).size == 0
+
+
+def test_apply_diff_logs_the_changes_with_the_slots(db_session, sample_doctor):
+    now = datetime(2030, 1, 1, 12, 0)
+    gone, new = now + timedelta(days=1), now + timedelta(days=2)
+    db_session.add(DoctorTimeslot(doctor_id=sample_doctor.id, free_slot=gone))
+    db_session.commit()
+
+    diff_and_apply(db_session, sample_doctor.id, slot_arrays.to_array({new}), now)
+    db_session.rollback()
 
-    result = timeslot_service.get_timeslots_from_api(timeslots)
-    assert result == expected
+    changes = db_session.query(SlotChange).order_by(SlotChange.id).all()
+    assert [(change.kind, change.free_slot) for change in changes] == [("removed", gone), ("added", new)]
@@ -0,0 +1,126 @@
+import pytest
+from services import upstream_guard
+from services.upstream_guard import TokenBucket, CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_token_bucket_allows_burst_then_spaces_requests(clock):
+    bucket = TokenBucket(rate=2, capacity=3, clock=clock)
+
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.reserve() == pytest.approx(0.5)
+    assert bucket.reserve() == pytest.approx(1.0)
+
+
+def test_token_bucket_refills_over_time(clock):
+    bucket = TokenBucket(rate=2, capacity=2, clock=clock)
+    bucket.reserve()
+    bucket.reserve()
+
+    clock.now = 1.0
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() > 0
+
+
+def test_circuit_stays_closed_below_min_requests(clock):
+    breaker = CircuitBreaker(error_rate=0.5, min_requests=4, window=60, cooldown=30, clock=clock)
+    for _ in range(3):
+        breaker.record_failure()
+
+    assert not breaker.is_open
+    assert breaker.allow_request()
+
+
+def test_circuit_opens_when_error_rate_spikes(clock):
+    breaker = CircuitBreaker(error_rate=0.5, min_requests=4, window=60, cooldown=30, clock=clock)
+    breaker.record_success()
+    for _ in range(3):
+        breaker.record_failure()
+
+    assert breaker.is_open
+    assert not breaker.allow_request()
+
+
+def test_circuit_ignores_outcomes_outside_window(clock):
+    breaker = CircuitBreaker(error_rate=0.5, min_requests=4, window=60, cooldown=30, clock=clock)
+    for _ in range(3):
+        breaker.record_failure()
+
+    clock.now = 120
+    for _ in range(3):
+        breaker.record_success()
+    breaker.record_failure()
+
+    assert not breaker.is_open
+
+
+def test_circuit_half_opens_after_cooldown_with_single_probe(clock):
+    breaker = CircuitBreaker(error_rate=0.5, min_requests=2, window=60, cooldown=30, clock=clock)
+    breaker.record_failure()
+    breaker.record_failure()
+
+    clock.now = 31
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+    assert not breaker.is_open
+    assert breaker.allow_request()
+
+
+def test_circuit_reopens_when_probe_fails(clock):
+    breaker = CircuitBreaker(error_rate=0.5, min_requests=2, window=60, cooldown=30, clock=clock)
+    breaker.record_failure()
+    breaker.record_failure()
+
+    clock.now = 31
+    assert breaker.allow_request()
+    breaker.record_failure()
+
+    assert breaker.is_open
+    assert not breaker.allow_request()
+
+
+@pytest.mark.parametrize("status_code, failure", [
+    (None, True),
+    (200, False),
+    (304, False),
+    (404, False),
+    (403, True),
+    (429, True),
+    (503, True),
+])
+def test_is_upstream_failure(status_code, failure):
+    assert upstream_guard.is_upstream_failure(status_code) is failure
+
+
+def test_backoff_delay_grows_exponentially_and_is_capped():
+    for failures, upper in [(1, 60), (2, 120), (3, 240), (10, 1000)]:
+        delay = upstream_guard.backoff_delay(failures, base=60, cap=1000)
+        assert upper / 2 <= delay <= upper
+
+
+def test_released_probe_lets_the_next_one_through(clock):
+    breaker = CircuitBreaker(error_rate=0.5, min_requests=2, window=60, cooldown=30, clock=clock)
+    breaker.record_failure()
+    breaker.record_failure()
+
+    clock.now = 31
+    assert breaker.allow_request()
+    breaker.release_probe()
+
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
@@ -0,0 +1,106 @@
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
+import pytest
+from starlette.requests import Request
+from model.models import Doctor
+from services import timeslot_service
+from services.version_registry import VersionRegistry, etag_matches
+
+SLOT = datetime(2030, 1, 7, 8, 0)
+
+
+@pytest.fixture
+def sample_doctor(db_session):
+    doctor = Doctor(id=960614932, full_name="doctor iva")
+    db_session.add(doctor)
+    db_session.commit()
+    return doctor
+
+
+def request_with(if_none_match: str) -> Request:
+    return Request({"type": "http", "headers": [(b"if-none-match", if_none_match.encode())]})
+
+
+def test_slot_version_follows_the_change_log(db_session, sample_doctor, fresh_version_registry):
+    registry = fresh_version_registry
+    before = registry.slot_version(db_session, sample_doctor.id)
+
+    timeslot_service.create_timeslot(db_session, sample_doctor.id, SLOT)
+
+    after = registry.slot_version(db_session, sample_doctor.id)
+    assert after > before
+    assert registry.slot_version(db_session, 1) == before
+
+
+def test_writes_from_another_process_show_up_after_the_sync_interval(db_session, sample_doctor):
+    registry = VersionRegistry(sync_seconds=60)
+    before = registry.slot_version(db_session, sample_doctor.id)
+    # not through timeslot_service, so nothing marks this registry stale
+    timeslot_service.log_changes(db_session, sample_doctor.id, [SLOT], [])
+    db_session.commit()
+
+    assert registry.slot_version(db_session, sample_doctor.id) == before
+    with patch("services.version_registry.time.monotonic", return_value=time.monotonic() + 61):
+        assert registry.slot_version(db_session, sample_doctor.id) > before
+
+
+def test_served_slots_etag_needs_the_same_version_and_no_passed_slot(fresh_version_registry):
+    registry = fresh_version_registry
+    upcoming = [SimpleNamespace(free_slot=datetime.now() + timedelta(hours=1))]
+    passed = [SimpleNamespace(free_slot=datetime.now() - timedelta(minutes=1))]
+
+    assert registry.served_slots_etag(1, 5) is None
+    etag = registry.remember_slots(1, 5, upcoming)
+    assert registry.served_slots_etag(1, 5) == etag
+    assert registry.served_slots_etag(1, 6) is None
+
+    registry.remember_slots(1, 5, passed)
+    assert registry.served_slots_etag(1, 5) is None
+    assert registry.remember_slots(2, 5, []) == registry.served_slots_etag(2, 5)
+
+
+def test_doctors_etag_counts_the_doctors(db_session, fresh_version_registry):
+    empty = fresh_version_registry.doctors_etag(db_session)
+    db_session.add(Doctor(id=1, full_name="doctor iva"))
+    db_session.commit()
+    fresh_version_registry.mark_stale()
+
+    assert fresh_version_registry.doctors_etag(db_session) != empty
+
+
+@pytest.mark.parametrize("header, matches", [
+    ('"a"', True),
+    ('"b", "a"', True),
+    ('W/"a"', True),
+    ("*", True),
+    ('"b"', False),
+])
+def test_etag_matches_if_none_match_lists(header, matches):
+    assert etag_matches(request_with(header), '"a"') is matches
+
+
+def test_workers_agree_on_the_version_of_an_unchanged_doctor(db_session, sample_doctor):
+    timeslot_service.create_timeslot(db_session, sample_doctor.id, SLOT)
+    first_worker = VersionRegistry()
+    first_worker.slot_version(db_session, sample_doctor.id)
+
+    timeslot_service.create_timeslot(db_session, sample_doctor.id, SLOT + timedelta(hours=1))
+    db_session.add(Doctor(id=1, full_name="doctor ana"))
+    db_session.commit()
+    timeslot_service.create_timeslot(db_session, 1, SLOT)
+    second_worker = VersionRegistry()
+    first_worker.mark_stale()
+
+    for doctor_id in (sample_doctor.id, 1, 2):
+        assert first_worker.slot_version(db_session, doctor_id) == second_worker.slot_version(db_session, doctor_id)
+    assert second_worker.slot_version(db_session, 2) == 0
+
+
+def test_doctor_etag_is_only_given_for_doctors_found_before(db_session, fresh_version_registry):
+    assert fresh_version_registry.doctor_etag(db_session, 1) is None
+
+    etag = fresh_version_registry.remember_doctor(db_session, 1)
+
+    assert fresh_version_registry.doctor_etag(db_session, 1) == etag
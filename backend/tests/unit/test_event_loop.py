@@ -0,0 +1,66 @@
+import asyncio
+import threading
+import pytest
+from scheduler.event_loop import LoopRunner
+
+
+@pytest.fixture()
+def runner():
+    runner = LoopRunner(name="test-loop")
+    yield runner
+    runner.stop()
+
+
+def test_run_returns_coroutine_result(runner):
+    async def add(a, b):
+        await asyncio.sleep(0)
+        return a + b
+
+    assert runner.run(add(1, 2)) == 3
+
+
+def test_run_reuses_the_same_loop_and_thread(runner):
+    async def current():
+        return asyncio.get_running_loop(), threading.current_thread()
+
+    first = runner.run(current())
+    second = runner.run(current())
+
+    assert first == second
+    assert first[1] is not threading.current_thread()
+
+
+def test_run_propagates_exceptions(runner):
+    async def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        runner.run(fail())
+
+    assert runner.running
+
+
+def test_concurrent_callers_overlap_on_the_loop(runner):
+    async def wait():
+        await asyncio.sleep(0.2)
+
+    threads = [threading.Thread(target=runner.run, args=(wait(),)) for _ in range(5)]
+    loop = runner.start()
+    started = loop.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert loop.time() - started < 0.6
+
+
+def test_stop_and_restart(runner):
+    async def value():
+        return 1
+
+    runner.run(value())
+    runner.stop()
+    assert not runner.running
+
+    assert runner.run(value()) == 1
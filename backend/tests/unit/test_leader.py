@@ -0,0 +1,65 @@
+import time
+from unittest.mock import MagicMock
+from scheduler.leader import LeaderLease
+from tests.conftest import TestingSessionLocal
+
+
+def make_lease(holder: str, ttl_seconds: int = 30) -> LeaderLease:
+    return LeaderLease("scheduler", ttl_seconds, holder=holder, session_factory=TestingSessionLocal)
+
+
+def test_only_one_process_becomes_leader():
+    first, second = make_lease("a"), make_lease("b")
+
+    assert first.renew()
+    assert not second.renew()
+    assert first.is_leader
+    assert not second.is_leader
+
+
+def test_another_process_takes_over_once_the_leader_stops_renewing():
+    first, second = make_lease("a", ttl_seconds=1), make_lease("b", ttl_seconds=1)
+    first.renew()
+
+    time.sleep(1.1)
+
+    assert not first.is_leader
+    assert second.renew()
+    assert not first.renew()
+
+
+def test_release_hands_over_immediately():
+    first, second = make_lease("a"), make_lease("b")
+    first.renew()
+
+    first.release()
+
+    assert not first.is_leader
+    assert second.renew()
+
+
+def test_term_increases_each_time_leadership_is_gained():
+    first, second = make_lease("a"), make_lease("b")
+
+    first.renew()
+    first.renew()
+    assert first.term == 1
+
+    first.release()
+    second.renew()
+    second.release()
+    first.renew()
+    assert first.term == 2
+
+
+def test_database_errors_keep_leadership_until_the_lease_runs_out():
+    lease = make_lease("a")
+    lease.renew()
+    broken = MagicMock()
+    broken.get.side_effect = Exception("database is locked")
+    broken.execute.side_effect = Exception("database is locked")
+    lease._session_factory = lambda: broken
+
+    assert lease.renew()
+    assert lease.is_leader
+    broken.close.assert_called_once()
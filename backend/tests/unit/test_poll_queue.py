@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+from scheduler.poll_queue import PollQueue
+
+
+def test_pop_due_returns_doctors_in_due_order():
+    now = datetime(2025, 11, 1, 12, 0)
+    queue = PollQueue()
+    queue.schedule(1, now - timedelta(minutes=1))
+    queue.schedule(2, now - timedelta(minutes=5))
+    queue.schedule(3, now + timedelta(minutes=5))
+
+    assert queue.pop_due(now) == [2, 1]
+    assert len(queue) == 1
+    assert 3 in queue
+
+
+def test_pop_due_respects_limit():
+    now = datetime(2025, 11, 1, 12, 0)
+    queue = PollQueue()
+    for doctor_id in range(5):
+        queue.schedule(doctor_id, now - timedelta(minutes=doctor_id))
+
+    assert queue.pop_due(now, limit=2) == [4, 3]
+    assert len(queue) == 3
+
+
+def test_rescheduling_replaces_previous_entry():
+    now = datetime(2025, 11, 1, 12, 0)
+    queue = PollQueue()
+    queue.schedule(1, now - timedelta(minutes=1))
+    queue.schedule(1, now + timedelta(hours=1))
+
+    assert queue.pop_due(now) == []
+    assert len(queue) == 1
+    assert queue.pop_due(now + timedelta(hours=1)) == [1]
+
+
+def test_removed_doctor_is_never_popped():
+    now = datetime(2025, 11, 1, 12, 0)
+    queue = PollQueue()
+    queue.schedule(1, now)
+    queue.remove(1)
+
+    assert queue.pop_due(now) == []
+    assert len(queue) == 0
+    assert 1 not in queue
@@ -1,8 +1,48 @@
+import json
+import asyncio
+import threading
 import pytest
-from unittest.mock import patch, MagicMock
+from datetime import datetime, timedelta
+from unittest.mock import patch, MagicMock, AsyncMock
 from apscheduler.schedulers.background import BackgroundScheduler
-from model.models import User, Doctor, DoctorSubscription
-from scheduler.scheduler import job, start_scheduler
+from prometheus_client import REGISTRY
+from model.models import User, Doctor, DoctorSubscription, DoctorPollState, DoctorTimeslot, EmailOutbox
+from scheduler import scheduler as scheduler_module
+from scheduler.poll_queue import PollQueue
+from scheduler.scheduler import job, start_scheduler, group_subscribers_by_doctor, send_outbox_job, smtp_pool
+from services import slot_arrays
+from services.slot_cache import SlotCache
+from tests.conftest import TestingSessionLocal
+
+
+@pytest.fixture(autouse=True)
+def fresh_poll_queue():
+    with patch("scheduler.scheduler.poll_queue", PollQueue()) as queue:
+        yield queue
+
+
+@pytest.fixture(autouse=True)
+def leader():
+    with patch("scheduler.scheduler.leader", MagicMock(is_leader=True, term=0)) as lease, \
+            patch("scheduler.scheduler.queue_term", 0):
+        yield lease
+
+
+@pytest.fixture()
+def mock_record_poll():
+    with patch("scheduler.scheduler.polling_service.record_poll") as mock_record:
+        mock_record.return_value = MagicMock(next_poll_at=datetime.now() + timedelta(hours=1))
+        yield mock_record
+
+
+def checking(outcomes: dict):
+    """A check_doctors stand-in that reports each outcome the way the real one does."""
+    async def fake_check(db, subscribers, on_checked=None):
+        for doctor_id, outcome in outcomes.items():
+            if on_checked is not None:
+                on_checked(doctor_id, outcome)
+        return outcomes
+    return AsyncMock(side_effect=fake_check)
 
 
 @pytest.fixture()
@@ -15,7 +55,7 @@ def sample_data(db_session):
     return user, doctor, subscription
 
 
-def test_job_calls_check_new_dates(db_session, sample_data):
+def test_job_calls_check_doctors(mock_record_poll):
     mock_db = MagicMock()
     mock_sub = MagicMock()
     mock_sub.user = MagicMock(email="test@example.com")
@@ -23,10 +63,13 @@ def test_job_calls_check_new_dates(db_session, sample_data):
     mock_db.query.return_value.all.return_value = [mock_sub]
 
     with patch("scheduler.scheduler.SessionLocal", return_value=mock_db), \
-            patch("scheduler.scheduler.check_new_dates") as mock_check:
+            patch("scheduler.scheduler.check_doctors", checking({960614932: True})) as mock_check:
         job()
 
-    mock_check.assert_called_once_with(mock_db, doctor_id=960614932, user_email="test@example.com")
+    mock_check.assert_awaited_once()
+    assert mock_check.call_args.args == (mock_db, {960614932: ["test@example.com"]})
+    mock_record_poll.assert_called_once()
+    assert mock_record_poll.call_args.args[1:4] == (960614932, False, 1)
 
 
 def test_job_skips_missing_user_or_doctor():
@@ -36,13 +79,13 @@ def test_job_skips_missing_user_or_doctor():
     mock_db.query.return_value.all.return_value = [mock_sub1, mock_sub2]
 
     with patch("scheduler.scheduler.SessionLocal", return_value=mock_db), \
-            patch("scheduler.scheduler.check_new_dates") as mock_check:
+            patch("scheduler.scheduler.check_doctors") as mock_check:
         job()
 
     mock_check.assert_not_called()
 
 
-def test_job_handles_exceptions_gracefully(capsys):
+def test_job_closes_session_when_check_fails():
     mock_db = MagicMock()
     mock_sub = MagicMock()
     mock_sub.user = MagicMock(email="user@example.com")
@@ -50,11 +93,311 @@ def test_job_handles_exceptions_gracefully(capsys):
     mock_db.query.return_value.all.return_value = [mock_sub]
 
     with patch("scheduler.scheduler.SessionLocal", return_value=mock_db), \
-            patch("scheduler.scheduler.check_new_dates", side_effect=Exception("Simulated error")):
+            patch("scheduler.scheduler.check_doctors", side_effect=Exception("Simulated error")):
+        with pytest.raises(Exception):
+            job()
+
+    mock_db.close.assert_called_once()
+
+
+def test_job_checks_each_doctor_once_for_all_subscribers(mock_record_poll):
+    mock_db = MagicMock()
+    mock_sub1 = MagicMock(user=MagicMock(email="a@example.com"), doctor=MagicMock(id=1))
+    mock_sub2 = MagicMock(user=MagicMock(email="b@example.com"), doctor=MagicMock(id=1))
+    mock_sub3 = MagicMock(user=MagicMock(email="a@example.com"), doctor=MagicMock(id=2))
+    mock_db.query.return_value.all.return_value = [mock_sub1, mock_sub2, mock_sub3]
+
+    with patch("scheduler.scheduler.SessionLocal", return_value=mock_db), \
+            patch("scheduler.scheduler.check_doctors", checking({})) as mock_check:
+        job()
+
+    assert mock_check.call_args.args == (mock_db, {1: ["a@example.com", "b@example.com"], 2: ["a@example.com"]})
+
+
+def test_job_records_failed_poll_without_outcome(mock_record_poll):
+    mock_db = MagicMock()
+    mock_sub = MagicMock(user=MagicMock(email="a@example.com"), doctor=MagicMock(id=7))
+    mock_db.query.return_value.all.return_value = [mock_sub]
+
+    with patch("scheduler.scheduler.SessionLocal", return_value=mock_db), \
+            patch("scheduler.scheduler.check_doctors", checking({7: None})):
+        job()
+
+    assert mock_record_poll.call_args.args[1:3] == (7, None)
+
+
+def test_job_requeues_doctors_skipped_by_open_circuit(mock_record_poll, fresh_poll_queue):
+    mock_db = MagicMock()
+    mock_sub = MagicMock(user=MagicMock(email="a@example.com"), doctor=MagicMock(id=7))
+    mock_db.query.return_value.all.return_value = [mock_sub]
+
+    with patch("scheduler.scheduler.SessionLocal", return_value=mock_db), \
+            patch("scheduler.scheduler.check_doctors") as mock_check:
+        mock_check.return_value = {}
+        job()
+
+    mock_record_poll.assert_not_called()
+    assert fresh_poll_queue.pop_due(datetime.now()) == [7]
+
+
+def test_job_does_nothing_while_circuit_is_open():
+    with patch("scheduler.scheduler.upstream_guard.circuit_breaker") as mock_breaker, \
+            patch("scheduler.scheduler.SessionLocal") as mock_session, \
+            patch("scheduler.scheduler.check_doctors") as mock_check:
+        mock_breaker.is_open = True
+        job()
+
+    mock_session.assert_not_called()
+    mock_check.assert_not_called()
+
+
+def test_job_only_polls_doctors_that_are_due(sample_data, fresh_poll_queue):
+    with patch("scheduler.scheduler.SessionLocal", TestingSessionLocal), \
+            patch("scheduler.scheduler.check_doctors", checking({960614932: False})) as mock_check:
+        job()
+        job()
+
+    mock_check.assert_awaited_once()
+    assert 960614932 in fresh_poll_queue
+
+    db = TestingSessionLocal()
+    state = db.query(DoctorPollState).filter_by(doctor_id=960614932).first()
+    db.close()
+    assert state is not None
+    assert state.last_checked_at is not None
+    assert state.next_poll_at > datetime.now()
+
+
+def test_job_resumes_from_persisted_next_poll_time(db_session, sample_data, fresh_poll_queue):
+    db_session.add(DoctorPollState(doctor_id=960614932, interval_seconds=3600,
+                                   next_poll_at=datetime.now() + timedelta(minutes=30)))
+    db_session.commit()
+
+    with patch("scheduler.scheduler.SessionLocal", TestingSessionLocal), \
+            patch("scheduler.scheduler.check_doctors") as mock_check:
+        job()
+
+    mock_check.assert_not_called()
+    assert 960614932 in fresh_poll_queue
+    assert fresh_poll_queue.pop_due(datetime.now()) == []
+
+
+def test_job_checkpoints_each_doctor_before_the_run_finishes(sample_data, fresh_poll_queue):
+    db = TestingSessionLocal()
+    db.add_all([Doctor(id=1, full_name="doctor one"),
+                DoctorSubscription(user_id=sample_data[0].id, doctor_id=1)])
+    db.commit()
+    db.close()
+
+    async def crash_after_first(db, subscribers, on_checked=None):
+        on_checked(960614932, True)
+        raise RuntimeError("process killed")
+
+    with patch("scheduler.scheduler.SessionLocal", TestingSessionLocal), \
+            patch("scheduler.scheduler.check_doctors", side_effect=crash_after_first):
+        with pytest.raises(RuntimeError):
+            job()
+
+    db = TestingSessionLocal()
+    states = {state.doctor_id: state for state in db.query(DoctorPollState).all()}
+    db.close()
+    assert states[960614932].last_checked_at is not None
+    assert states[960614932].next_poll_at > datetime.now()
+    assert 1 not in states
+
+    # a fresh process only polls the doctor the interrupted run never reached
+    with patch("scheduler.scheduler.poll_queue", PollQueue()), \
+            patch("scheduler.scheduler.SessionLocal", TestingSessionLocal), \
+            patch("scheduler.scheduler.check_doctors", checking({1: True})) as mock_check:
+        job()
+
+    assert list(mock_check.call_args.args[1]) == [1]
+
+
+def test_job_skips_run_while_previous_one_is_still_going():
+    started, release = threading.Event(), threading.Event()
+    before = REGISTRY.get_sample_value("mojtermin_scheduler_runs_skipped_total", {"job": "check"}) or 0
+
+    def slow_expire(db, now):
+        started.set()
+        release.wait(5)
+        return 0
+
+    mock_db = MagicMock()
+    mock_db.query.return_value.all.return_value = []
+    with patch("scheduler.scheduler.SessionLocal", return_value=mock_db), \
+            patch("scheduler.scheduler.timeslot_service.expire_slots", side_effect=slow_expire) as mock_expire:
+        first = threading.Thread(target=job)
+        first.start()
+        started.wait(5)
         job()
+        release.set()
+        first.join()
 
-    captured = capsys.readouterr()
-    assert "Failed for doctor 42: Simulated error" in captured.out
+    assert mock_expire.call_count == 1
+    assert REGISTRY.get_sample_value("mojtermin_scheduler_runs_skipped_total", {"job": "check"}) == before + 1
+
+
+def test_jobs_do_nothing_unless_this_process_is_leader(leader):
+    leader.is_leader = False
+
+    with patch("scheduler.scheduler.SessionLocal") as mock_session, \
+            patch("scheduler.scheduler.outbox_service.drain_outbox") as mock_drain:
+        job()
+        send_outbox_job()
+
+    mock_session.assert_not_called()
+    mock_drain.assert_not_called()
+
+
+def test_job_rebuilds_poll_queue_after_regaining_leadership(leader, fresh_poll_queue):
+    fresh_poll_queue.schedule(42, datetime.now() + timedelta(hours=1))
+    leader.term = 2
+    mock_db = MagicMock()
+    mock_db.query.return_value.all.return_value = []
+
+    with patch("scheduler.scheduler.SessionLocal", return_value=mock_db):
+        job()
+
+    assert 42 not in fresh_poll_queue
+
+
+def slots_payload(*slots):
+    return {"name": "doctor iva", "timeslots": {"day": [{"term": slot.isoformat(), "isAvailable": True}
+                                                         for slot in slots]}}
+
+
+def make_due(doctor_id):
+    db = TestingSessionLocal()
+    db.query(DoctorPollState).filter_by(doctor_id=doctor_id).update({"next_poll_at": datetime.now()})
+    db.commit()
+    db.close()
+
+
+def run_as_another_worker():
+    # its own process, so its own queue and slot cache
+    with patch("scheduler.scheduler.poll_queue", PollQueue()), \
+            patch("services.timeslot_service.slot_cache", SlotCache(maxsize=100)):
+        job()
+
+
+def stored_slots_and_notifications():
+    db = TestingSessionLocal()
+    stored = sorted(slot.free_slot for slot in db.query(DoctorTimeslot))
+    notified = [json.loads(message.slots) for message in db.query(EmailOutbox).order_by(EmailOutbox.id)]
+    db.close()
+    return stored, notified
+
+
+@pytest.fixture()
+def upstream(fake_mojtermin, monkeypatch):
+    monkeypatch.setattr("services.fetcher_service.MOJTERMIN_RESOURCES_URL", fake_mojtermin.base_url)
+    monkeypatch.setattr("scheduler.scheduler.SessionLocal", TestingSessionLocal)
+    return fake_mojtermin
+
+
+def test_job_reloads_cached_slots_after_regaining_leadership(sample_data, leader, upstream):
+    doctor_id = sample_data[1].id
+    first = (datetime.now() + timedelta(days=2)).replace(second=0, microsecond=0)
+    second = first + timedelta(hours=1)
+    upstream.doctors[doctor_id] = slots_payload()
+    job()
+
+    # the other worker leads for a while and sees the first slot appear
+    leader.term = 1
+    upstream.doctors[doctor_id] = slots_payload(first)
+    make_due(doctor_id)
+    run_as_another_worker()
+
+    leader.term = 2
+    upstream.doctors[doctor_id] = slots_payload(first, second)
+    make_due(doctor_id)
+    job()
+
+    stored, notified = stored_slots_and_notifications()
+    assert stored == [first, second]
+    assert notified == [[first.isoformat()], [second.isoformat()]]
+
+
+@pytest.fixture()
+def sharded(sample_data):
+    db = TestingSessionLocal()
+    db.add_all([Doctor(id=1, full_name="doctor one"), DoctorSubscription(user_id=sample_data[0].id, doctor_id=1)])
+    db.commit()
+    db.close()
+    membership = MagicMock(is_member=True, term=0)
+    membership.owns.side_effect = lambda doctor_id: doctor_id == 960614932
+    with patch("scheduler.scheduler.SHARDED", True), patch("scheduler.scheduler.shards", membership), \
+            patch("scheduler.scheduler.SessionLocal", TestingSessionLocal):
+        yield membership
+
+
+def test_sharded_job_polls_only_doctors_this_worker_owns(sharded, leader):
+    leader.is_leader = False
+
+    with patch("scheduler.scheduler.check_doctors", checking({960614932: True})) as mock_check:
+        job()
+
+    assert list(mock_check.call_args.args[1]) == [960614932]
+
+
+def test_sharded_job_skips_doctor_claimed_by_another_worker(sharded, fresh_poll_queue, fresh_slot_cache):
+    # this worker still thinks the doctor is due, but another one claimed it in the database first
+    fresh_poll_queue.schedule(960614932, datetime.now() - timedelta(minutes=1))
+    claimed_until = datetime.now() + timedelta(minutes=10)
+    db = TestingSessionLocal()
+    db.add(DoctorPollState(doctor_id=960614932, interval_seconds=3600, next_poll_at=claimed_until))
+    db.commit()
+    db.close()
+    fresh_slot_cache.put(960614932, slot_arrays.EMPTY)
+
+    with patch("scheduler.scheduler.check_doctors", checking({})) as mock_check:
+        job()
+
+    mock_check.assert_not_called()
+    assert fresh_poll_queue.pop_due(claimed_until - timedelta(seconds=1)) == []
+    assert fresh_poll_queue.pop_due(claimed_until) == [960614932]
+    # the other worker's poll will change the slots, so they're reloaded before this worker polls again
+    assert 960614932 not in fresh_slot_cache
+
+
+def test_sharded_job_reloads_cached_slots_after_rejoining(sharded, upstream):
+    doctor_id = 960614932
+    first = (datetime.now() + timedelta(days=2)).replace(second=0, microsecond=0)
+    second = first + timedelta(hours=1)
+    upstream.doctors[doctor_id] = slots_payload()
+    job()
+
+    # this worker's membership lapses and another worker polls its doctor meanwhile
+    upstream.doctors[doctor_id] = slots_payload(first)
+    make_due(doctor_id)
+    run_as_another_worker()
+
+    sharded.term = 1
+    upstream.doctors[doctor_id] = slots_payload(first, second)
+    make_due(doctor_id)
+    job()
+
+    stored, notified = stored_slots_and_notifications()
+    assert stored == [first, second]
+    assert notified == [[first.isoformat()], [second.isoformat()]]
+
+
+def test_sharded_job_releases_claims_it_could_not_poll(sharded):
+    with patch("scheduler.scheduler.check_doctors", checking({})):
+        job()
+
+    db = TestingSessionLocal()
+    state = db.query(DoctorPollState).filter_by(doctor_id=960614932).first()
+    db.close()
+    assert state.next_poll_at <= datetime.now()
+
+
+def test_group_subscribers_by_doctor_ignores_duplicate_emails():
+    sub1 = MagicMock(user=MagicMock(email="a@example.com"), doctor=MagicMock(id=1))
+    sub2 = MagicMock(user=MagicMock(email="a@example.com"), doctor=MagicMock(id=1))
+
+    assert group_subscribers_by_doctor([sub1, sub2]) == {1: ["a@example.com"]}
 
 
 def test_start_scheduler_adds_and_starts_job(monkeypatch):
@@ -63,5 +406,68 @@ def test_start_scheduler_adds_and_starts_job(monkeypatch):
 
     start_scheduler()
 
-    scheduler_mock.add_job.assert_called_once()
+    jobs = [call.args[0] for call in scheduler_mock.add_job.call_args_list]
+    assert jobs[1:] == [job, send_outbox_job]
+    assert jobs[0] == scheduler_module.leader.renew
+    for call in scheduler_mock.add_job.call_args_list:
+        assert call.kwargs["max_instances"] == 1
+        assert call.kwargs["coalesce"] is True
     scheduler_mock.start.assert_called_once()
+
+
+def test_send_outbox_job_drains_outbox_and_closes_session():
+    mock_db = MagicMock()
+
+    with patch("scheduler.scheduler.SessionLocal", return_value=mock_db), \
+            patch("scheduler.scheduler.outbox_service.drain_outbox") as mock_drain:
+        mock_drain.return_value = (1, 0)
+        send_outbox_job()
+
+    mock_drain.assert_awaited_once_with(mock_db, pool=smtp_pool)
+    mock_db.close.assert_called_once()
+
+
+def test_jobs_share_one_event_loop():
+    loops = []
+
+    async def fake_check(db, subscribers, on_checked=None):
+        loops.append(asyncio.get_running_loop())
+        return {}
+
+    mock_db = MagicMock()
+    mock_db.query.return_value.all.return_value = [
+        MagicMock(user=MagicMock(email="a@example.com"), doctor=MagicMock(id=1))
+    ]
+
+    with patch("scheduler.scheduler.SessionLocal", return_value=mock_db), \
+            patch("scheduler.scheduler.check_doctors", side_effect=fake_check):
+        job()
+        job()
+
+    assert len(loops) == 2
+    assert loops[0] is loops[1]
+    assert not loops[0].is_closed()
+
+
+def test_job_expires_past_slots_once_per_cycle():
+    mock_db = MagicMock()
+    mock_db.query.return_value.all.return_value = []
+
+    with patch("scheduler.scheduler.SessionLocal", return_value=mock_db), \
+            patch("scheduler.scheduler.timeslot_service.expire_slots", return_value=3) as mock_expire, \
+            patch("scheduler.scheduler.check_doctors") as mock_check:
+        job()
+
+    mock_expire.assert_called_once()
+    assert mock_expire.call_args.args[0] is mock_db
+    mock_check.assert_not_called()
+
+
+def test_job_failures_are_counted():
+    before = REGISTRY.get_sample_value("mojtermin_scheduler_run_failures_total", {"job": "check"}) or 0
+
+    with patch("scheduler.scheduler.SessionLocal", side_effect=Exception("db down")):
+        with pytest.raises(Exception):
+            job()
+
+    assert REGISTRY.get_sample_value("mojtermin_scheduler_run_failures_total", {"job": "check"}) == before + 1
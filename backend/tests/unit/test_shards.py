@@ -0,0 +1,82 @@
+import time
+from collections import Counter
+from scheduler.shards import HashRing, ShardMembership
+from tests.conftest import TestingSessionLocal
+
+
+def test_ring_spreads_doctors_roughly_evenly():
+    ring = HashRing(["a", "b", "c", "d"])
+
+    shares = Counter(ring.owner(doctor_id) for doctor_id in range(20000))
+
+    assert set(shares) == {"a", "b", "c", "d"}
+    assert all(3500 < count < 6500 for count in shares.values())
+
+
+def test_joining_worker_only_takes_doctors_from_others():
+    before = HashRing(["a", "b", "c"])
+    after = HashRing(["a", "b", "c", "d"])
+
+    moved = [doctor_id for doctor_id in range(20000) if before.owner(doctor_id) != after.owner(doctor_id)]
+
+    assert all(after.owner(doctor_id) == "d" for doctor_id in moved)
+    assert len(moved) < 20000 * 0.4
+
+
+def test_empty_ring_owns_nothing():
+    assert HashRing([]).owner(1) is None
+
+
+def test_members_split_the_doctors_between_them():
+    first = ShardMembership("a", 30, session_factory=TestingSessionLocal)
+    second = ShardMembership("b", 30, session_factory=TestingSessionLocal)
+    first.heartbeat()
+    second.heartbeat()
+    first.heartbeat()
+
+    owners = [(first.owns(doctor_id), second.owns(doctor_id)) for doctor_id in range(1000)]
+
+    assert all(mine != theirs for mine, theirs in owners)
+    assert any(mine for mine, _ in owners) and any(theirs for _, theirs in owners)
+
+
+def test_doctors_rebalance_when_a_member_stops_heartbeating():
+    first = ShardMembership("a", 30, session_factory=TestingSessionLocal)
+    second = ShardMembership("b", 1, session_factory=TestingSessionLocal)
+    second.heartbeat()
+    first.heartbeat()
+
+    time.sleep(1.1)
+    first.heartbeat()
+
+    assert first.ring.members == ["a"]
+    assert all(first.owns(doctor_id) for doctor_id in range(100))
+    assert not second.owns(1)
+
+
+def test_leaving_member_hands_its_share_over():
+    first = ShardMembership("a", 30, session_factory=TestingSessionLocal)
+    second = ShardMembership("b", 30, session_factory=TestingSessionLocal)
+    first.heartbeat()
+    second.heartbeat()
+
+    second.leave()
+    first.heartbeat()
+
+    assert first.ring.members == ["a"]
+    assert not second.is_member
+
+
+def test_term_goes_up_only_when_rejoining():
+    member = ShardMembership("a", 1, session_factory=TestingSessionLocal)
+    member.heartbeat()
+    member.heartbeat()
+    assert member.term == 1
+
+    time.sleep(1.1)
+    member.heartbeat()
+    assert member.term == 2
+
+    member.leave()
+    member.heartbeat()
+    assert member.term == 3
@@ -0,0 +1,79 @@
+import threading
+from unittest.mock import MagicMock
+import pytest
+from scheduler import scheduler, worker
+from services import fetcher_service
+
+
+@pytest.fixture()
+def started(monkeypatch):
+    background = MagicMock()
+    monkeypatch.setattr(fetcher_service, "FETCH_CONCURRENCY", fetcher_service.FETCH_CONCURRENCY)
+    monkeypatch.setattr(scheduler, "TICK_SECONDS", scheduler.TICK_SECONDS)
+    monkeypatch.setattr(scheduler, "OUTBOX_SECONDS", scheduler.OUTBOX_SECONDS)
+    monkeypatch.setattr(scheduler, "SHARDED", scheduler.SHARDED)
+    monkeypatch.setattr(scheduler, "shards", MagicMock())
+    monkeypatch.setattr(scheduler, "start_scheduler", MagicMock(return_value=background))
+    monkeypatch.setattr(scheduler, "leader", MagicMock(holder="test-worker"))
+    monkeypatch.setattr(scheduler, "loop_runner", MagicMock(running=False))
+    monkeypatch.setattr(worker, "create_tables", MagicMock())
+    monkeypatch.setattr(worker, "db_executor", MagicMock())
+    monkeypatch.setattr(worker, "start_http_server", MagicMock())
+    return background
+
+
+def test_worker_applies_its_own_settings_and_starts_the_scheduler(started):
+    stop = threading.Event()
+    stop.set()
+
+    worker.main(["--concurrency", "7", "--tick", "5", "--outbox", "3"], stop=stop)
+
+    assert fetcher_service.FETCH_CONCURRENCY == 7
+    assert scheduler.TICK_SECONDS == 5
+    assert scheduler.OUTBOX_SECONDS == 3
+    worker.create_tables.assert_called_once()
+    scheduler.start_scheduler.assert_called_once()
+
+
+def test_worker_shuts_down_cleanly_when_stopped(started):
+    stop = threading.Event()
+    thread = threading.Thread(target=worker.main, args=([],), kwargs={"stop": stop})
+    thread.start()
+
+    stop.set()
+    thread.join(5)
+
+    assert not thread.is_alive()
+    started.shutdown.assert_called_once_with(wait=True)
+    scheduler.leader.release.assert_called_once()
+    worker.db_executor.shutdown.assert_called_once()
+
+
+def test_sharded_worker_leaves_the_shard_on_shutdown(started):
+    stop = threading.Event()
+    stop.set()
+
+    worker.main(["--sharded"], stop=stop)
+
+    assert scheduler.SHARDED is True
+    scheduler.shards.leave.assert_called_once()
+
+
+def test_worker_serves_metrics_by_default(started):
+    stop = threading.Event()
+    stop.set()
+
+    worker.main([], stop=stop)
+
+    worker.start_http_server.assert_called_once_with(worker.METRICS_PORT)
+    assert worker.METRICS_PORT != 0
+
+
+def test_worker_warns_when_metrics_are_disabled(started, capsys):
+    stop = threading.Event()
+    stop.set()
+
+    worker.main(["--metrics-port", "0"], stop=stop)
+
+    worker.start_http_server.assert_not_called()
+    assert "metrics are disabled" in capsys.readouterr().out
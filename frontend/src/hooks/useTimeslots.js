@@ -6,21 +6,46 @@ const initialState = {
     "loading": true,
 };
 
+const bySlotTime = (a, b) => a.free_slot.localeCompare(b.free_slot);
+
 const useTimeslots = (doc_id) => {
     const [state, setState] = useState(initialState);
 
     useEffect(() => {
-        timeslotRepository
+        const load = () => timeslotRepository
             .getByDoctor(doc_id)
             .then((response) => {
                 setState({
                     "slots": response.data,
                     "loading": false,
                 });
-            })
+            });
+
+        load();
+
+        // the stream is live once "ready" arrives, so reload then to catch changes made in between
+        const source = timeslotRepository.streamByDoctor(doc_id, {
+            ready: load,
+            resync: load,
+            slots_added: ({slots}) => setState((s) => ({
+                ...s,
+                "slots": [
+                    ...s.slots,
+                    ...slots
+                        .filter((free_slot) => !s.slots.some((slot) => slot.free_slot === free_slot))
+                        .map((free_slot) => ({free_slot, doctor_id: doc_id})),
+                ].sort(bySlotTime),
+            })),
+            slots_removed: ({slots}) => setState((s) => ({
+                ...s,
+                "slots": s.slots.filter((slot) => !slots.includes(slot.free_slot)),
+            })),
+        });
+
+        return () => source?.close();
     }, [doc_id]);
 
     return state;
 };
 
-export default useTimeslots;
\ No newline at end of file
+export default useTimeslots;
@@ -4,5 +4,16 @@ const timeslotRepository = {
     getByDoctor: async (doc_id) => {
         return await axiosInstance.get(`/timeslots/doctor/${doc_id}`);
     },
+    // Server-Sent Events with the doctor's slot changes; returns null where EventSource isn't available.
+    streamByDoctor: (doc_id, handlers) => {
+        if (typeof EventSource === "undefined") {
+            return null;
+        }
+        const source = new EventSource(`${axiosInstance.defaults.baseURL}/events/doctor/${doc_id}`);
+        Object.entries(handlers).forEach(([event, handler]) => {
+            source.addEventListener(event, (e) => handler(JSON.parse(e.data)));
+        });
+        return source;
+    },
 };
-export default timeslotRepository;
\ No newline at end of file
+export default timeslotRepository;
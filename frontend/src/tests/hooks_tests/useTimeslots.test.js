@@ -1,9 +1,9 @@
-import { renderHook, waitFor } from "@testing-library/react";
+import { act, renderHook, waitFor } from "@testing-library/react";
 import useTimeslots from "../../hooks/useTimeslots";
 import timeslotRepository from "../../repository/timeslotRepository";
 
 vi.mock("../../repository/timeslotRepository", () => ({
-  default: { getByDoctor: vi.fn() },
+  default: { getByDoctor: vi.fn(), streamByDoctor: vi.fn() },
 }));
 
 const slotsDoctor1 = [
@@ -16,8 +16,16 @@ const slotsDoctor2 = [
 ];
 
 describe("useTimeslots hook tests", () => {
+  let handlers;
+  let source;
+
   beforeEach(() => {
     vi.clearAllMocks();
+    source = { close: vi.fn() };
+    timeslotRepository.streamByDoctor.mockImplementation((id, h) => {
+      handlers = h;
+      return source;
+    });
   });
 
   it("returns initial state on first render", () => {
@@ -95,4 +103,57 @@ describe("useTimeslots hook tests", () => {
 
     expect(timeslotRepository.getByDoctor).toHaveBeenCalledWith(null);
   });
+
+  it("applies pushed slot changes without refetching", async () => {
+    timeslotRepository.getByDoctor.mockResolvedValue({ data: slotsDoctor1 });
+
+    const { result } = renderHook(() => useTimeslots(1096535518));
+    await waitFor(() => expect(result.current.slots).toEqual(slotsDoctor1));
+
+    act(() => {
+      handlers.slots_added({ doctor_id: 1096535518, slots: ["2025-08-04T08:20:00"] });
+      handlers.slots_removed({ doctor_id: 1096535518, slots: ["2025-08-04T09:00:00"] });
+    });
+
+    expect(result.current.slots.map((slot) => slot.free_slot)).toEqual([
+      "2025-08-04T08:20:00",
+      "2025-08-04T08:40:00",
+    ]);
+    expect(timeslotRepository.getByDoctor).toHaveBeenCalledTimes(1);
+  });
+
+  it("reloads the slots when the stream is ready or asks for a resync", async () => {
+    timeslotRepository.getByDoctor.mockResolvedValue({ data: slotsDoctor1 });
+
+    renderHook(() => useTimeslots(1096535518));
+
+    await act(async () => {
+      handlers.ready({ doctor_ids: [1096535518] });
+      handlers.resync({ doctor_ids: [1096535518] });
+    });
+
+    expect(timeslotRepository.getByDoctor).toHaveBeenCalledTimes(3);
+  });
+
+  it("closes the stream when the doctor changes or on unmount", async () => {
+    timeslotRepository.getByDoctor.mockResolvedValue({ data: [] });
+
+    const { rerender, unmount } = renderHook(({ id }) => useTimeslots(id), { initialProps: { id: 1 } });
+    rerender({ id: 2 });
+    expect(source.close).toHaveBeenCalledTimes(1);
+    expect(timeslotRepository.streamByDoctor).toHaveBeenLastCalledWith(2, expect.any(Object));
+
+    unmount();
+    expect(source.close).toHaveBeenCalledTimes(2);
+  });
+
+  it("still loads the slots where streaming is unavailable", async () => {
+    timeslotRepository.streamByDoctor.mockReturnValue(null);
+    timeslotRepository.getByDoctor.mockResolvedValue({ data: slotsDoctor2 });
+
+    const { result, unmount } = renderHook(() => useTimeslots(891281366));
+
+    await waitFor(() => expect(result.current.slots).toEqual(slotsDoctor2));
+    unmount();
+  });
 });
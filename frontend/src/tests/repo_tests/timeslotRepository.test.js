@@ -96,4 +96,32 @@ describe("timeslotRepository", () => {
     });
 
   });
+
+  describe("streamByDoctor", () => {
+    afterEach(() => {
+      vi.unstubAllGlobals();
+    });
+
+    it("opens an event stream for the doctor and parses event data", () => {
+      const listeners = {};
+      const EventSourceMock = vi.fn(function (url) {
+        this.url = url;
+        this.addEventListener = (event, listener) => { listeners[event] = listener; };
+      });
+      vi.stubGlobal("EventSource", EventSourceMock);
+      const onAdded = vi.fn();
+
+      const source = timeslotRepository.streamByDoctor(3783958400, { slots_added: onAdded });
+      listeners.slots_added({ data: JSON.stringify({ doctor_id: 3783958400, slots: ["2025-08-04T09:00:00"] }) });
+
+      expect(source.url).toBe("http://127.0.0.1:8000/api/events/doctor/3783958400");
+      expect(onAdded).toHaveBeenCalledWith({ doctor_id: 3783958400, slots: ["2025-08-04T09:00:00"] });
+    });
+
+    it("returns null where EventSource is unavailable", () => {
+      vi.stubGlobal("EventSource", undefined);
+
+      expect(timeslotRepository.streamByDoctor(3783958400, {})).toBeNull();
+    });
+  });
 });